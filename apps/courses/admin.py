@@ -1,5 +1,16 @@
 from django.contrib import admin
-from .models import Category, Course, Module, Lesson, Review, UserLessonProgress
+from .admin_tools import CourseFilter, LargeTableAdmin
+from .models import ArchivedLessonProgress, Category, Course, Module, Lesson, Review, UserLessonProgress
+
+# Bảng User/Course/Lesson có thể rất lớn: các ô chọn khóa ngoại dùng autocomplete (tìm theo search_fields
+# của model đích) hoặc raw_id_fields (nhập id) thay cho <select> liệt kê toàn bộ bảng.
+# Bộ lọc theo khóa học là ô nhập id/slug (CourseFilter) thay cho danh sách mọi khóa học.
+
+class LessonCourseFilter(CourseFilter):
+    course_field = 'module__course'
+
+class ProgressCourseFilter(CourseFilter):
+    course_field = 'lesson__module__course'
 
 # Dùng StackedInline để hiện Bài học ngay trong trang sửa Module
 class LessonInline(admin.StackedInline):
@@ -20,29 +31,61 @@ class CategoryAdmin(admin.ModelAdmin):
 class CourseAdmin(admin.ModelAdmin):
     list_display = ['title', 'instructor', 'price', 'status', 'created_at']
     list_filter = ['status', 'category', 'level']
+    list_select_related = ['instructor']
     search_fields = ['title', 'description']
     prepopulated_fields = {'slug': ('title',)}
+    raw_id_fields = ['instructor']
     inlines = [ModuleInline] # Cho phép thêm Module ngay trong Course
 
 @admin.register(Module)
 class ModuleAdmin(admin.ModelAdmin):
     list_display = ['title', 'course', 'order']
-    list_filter = ['course']
+    list_filter = [CourseFilter]
+    list_select_related = ['course']
+    search_fields = ['title', 'course__title']
+    autocomplete_fields = ['course']
     inlines = [LessonInline] # Cho phép thêm Lesson ngay trong Module
 
+    def get_queryset(self, request):
+        # __str__ của Module đọc course.title (kết quả autocomplete của LessonAdmin, link trong trang sửa...)
+        return super().get_queryset(request).select_related('course')
+
 @admin.register(Lesson)
-class LessonAdmin(admin.ModelAdmin):
+class LessonAdmin(LargeTableAdmin):
     list_display = ['title', 'module', 'lesson_type', 'is_preview', 'order']
-    list_filter = ['module__course', 'lesson_type']
+    list_filter = [LessonCourseFilter, 'lesson_type']
+    list_select_related = ['module__course']
     search_fields = ['title']
+    autocomplete_fields = ['module']
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(LargeTableAdmin):
     list_display = ['user', 'course', 'rating', 'created_at']
+    list_filter = [CourseFilter, 'rating']
+    list_select_related = ['user', 'course']
+    raw_id_fields = ['user']
+    autocomplete_fields = ['course']
 
 @admin.register(UserLessonProgress)
-class UserLessonProgressAdmin(admin.ModelAdmin):
+class UserLessonProgressAdmin(LargeTableAdmin):
     list_display = ['user', 'lesson', 'is_completed', 'last_watched_position', 'updated_at']
-    list_filter = ['is_completed', 'lesson__module__course']
+    list_filter = ['is_completed', ProgressCourseFilter]
+    list_select_related = ['user', 'lesson']
     search_fields = ['user__username', 'lesson__title']
+    raw_id_fields = ['user']
+    autocomplete_fields = ['lesson']
     readonly_fields = ['created_at', 'updated_at']
+
+@admin.register(ArchivedLessonProgress)
+class ArchivedLessonProgressAdmin(LargeTableAdmin):
+    """Chỉ xem: dữ liệu được ghi bởi lệnh archive_progress"""
+    list_display = ['user', 'course', 'lesson', 'completed_at', 'archived_at']
+    list_filter = [CourseFilter]
+    list_select_related = ['user', 'course', 'lesson']
+    search_fields = ['user__username']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
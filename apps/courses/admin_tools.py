@@ -0,0 +1,86 @@
+"""
+Công cụ cho trang Admin trên các bảng lớn (tiến độ học, đăng ký học...).
+
+- EstimatedCountPaginator: không COUNT(*) chính xác trên bảng hàng triệu dòng.
+  * Không lọc + PostgreSQL: dùng số dòng ước lượng của planner (pg_class.reltuples, cập nhật bởi ANALYZE).
+  * Có lọc/tìm kiếm (hoặc DB khác): đếm nhưng dừng ở MAX_EXACT_COUNT dòng -> thời gian có giới hạn.
+- InputFilter: bộ lọc dạng ô nhập (gõ id/slug) thay cho danh sách chọn liệt kê toàn bộ bảng (VD: mọi khóa học).
+- LargeTableAdmin: ModelAdmin dùng 2 thứ trên và tắt đếm tổng số dòng không lọc (show_full_result_count).
+"""
+from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import QueryDict
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    # Bảng nhỏ hơn ngưỡng này thì đếm chính xác (ước lượng của planner sai số lớn với bảng nhỏ)
+    ESTIMATE_THRESHOLD = 10000
+    MAX_EXACT_COUNT = 10000
+
+    @cached_property
+    def count(self):
+        estimate = self.estimated_count()
+        if estimate is not None and estimate >= self.ESTIMATE_THRESHOLD:
+            return estimate
+        # COUNT(*) trên subquery có LIMIT: quét tối đa MAX_EXACT_COUNT + 1 dòng
+        return self.object_list[:self.MAX_EXACT_COUNT + 1].count()
+
+    def estimated_count(self):
+        """Số dòng ước lượng của cả bảng (chỉ PostgreSQL, chỉ khi queryset không lọc), None nếu không có."""
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [connection.ops.quote_name(queryset.model._meta.db_table)],
+            )
+            row = cursor.fetchone()
+        # reltuples = -1: bảng chưa được ANALYZE lần nào
+        if row is None or row[0] < 0:
+            return None
+        return row[0]
+
+
+class InputFilter(admin.SimpleListFilter):
+    template = 'admin/input_filter.html'
+    placeholder = ''
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        # Chỉ 1 lựa chọn "Tất cả" (xóa bộ lọc) kèm các tham số khác của trang để giữ lại khi submit form
+        all_choice = next(super().choices(changelist))
+        query = QueryDict(changelist.get_query_string(remove=[self.parameter_name, PAGE_VAR])[1:])
+        all_choice['query_parts'] = [(key, value) for key, values in query.lists() for value in values]
+        yield all_choice
+
+
+class CourseFilter(InputFilter):
+    """Lọc theo khóa học: nhập id hoặc slug."""
+    title = 'khóa học'
+    parameter_name = 'course'
+    placeholder = 'ID hoặc slug'
+    # Đường dẫn tới Course từ model của trang (VD: 'lesson__module__course')
+    course_field = 'course'
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        lookup = 'pk' if value.isdigit() else 'slug'
+        return queryset.filter(**{f'{self.course_field}__{lookup}': value})
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Bỏ câu COUNT(*) thứ 2 (tổng số dòng không lọc) của trang danh sách
+    show_full_result_count = False
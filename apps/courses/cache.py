@@ -0,0 +1,78 @@
+"""
+Cache cho trang chi tiết khóa học (CourseDetailSerializer).
+
+- Chỉ lưu phần KHÔNG phụ thuộc user (cây module/lesson/review đầy đủ, kể cả video_url).
+  Phần theo từng user (is_completed, ẩn video_url) được áp lại sau khi đọc cache.
+- Key gồm slug + id khóa học + số version. Mỗi khi Course/Module/Lesson/Review thay đổi,
+  version của khóa học được tăng -> key cũ tự động không còn được dùng (không cần xóa từng key).
+- Bộ đếm hit/miss được lưu trong cache để gộp số liệu của tất cả worker.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'courses:detail:version:{course_id}'
+DETAIL_KEY = 'courses:detail:{slug}:{course_id}:v{version}'
+HITS_KEY = 'courses:detail:hits'
+MISSES_KEY = 'courses:detail:misses'
+
+
+def _new_version():
+    # Khởi tạo bằng timestamp (ns) thay vì 1: nếu cache bị xóa/evict, version mới luôn lớn hơn
+    # mọi version cũ -> không bao giờ đọc nhầm bản cache (hay ETag) của version trước.
+    return time.time_ns()
+
+
+def get_course_version(course_id):
+    key = VERSION_KEY.format(course_id=course_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_course_version(course_id):
+    key = VERSION_KEY.format(course_id=course_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Chưa có version (hoặc đã bị evict) -> tạo version mới
+        cache.set(key, _new_version(), timeout=None)
+
+
+def _incr_counter(key):
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def get_cached_course_detail(course, build):
+    """
+    Trả về dữ liệu chi tiết (dùng chung cho mọi user) của khóa học.
+    `build` là hàm không tham số, chỉ được gọi khi cache miss để serialize lại từ DB.
+    """
+    key = DETAIL_KEY.format(slug=course.slug, course_id=course.pk, version=get_course_version(course.pk))
+    data = cache.get(key)
+    if data is not None:
+        _incr_counter(HITS_KEY)
+        return data
+
+    _incr_counter(MISSES_KEY)
+    data = build()
+    cache.set(key, data, timeout=settings.COURSE_DETAIL_CACHE_TIMEOUT)
+    return data
+
+
+def get_cache_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else None,
+    }
@@ -0,0 +1,41 @@
+"""
+Hỗ trợ Conditional GET (ETag) cho API khóa học.
+
+View tính ETag từ các mốc thời gian/bộ đếm rẻ (không serialize),
+nếu client gửi If-None-Match khớp thì trả 304 ngay, bỏ qua serializer.
+
+Không gửi Last-Modified: nội dung còn thay đổi khi không có mốc updated_at nào tăng (user đăng ký khóa học,
+xóa module/bài học/review, khóa học bị ẩn khỏi danh sách...), If-Modified-Since sẽ trả 304 sai.
+ETag gồm cả các trạng thái đó (version cache, số dòng, trạng thái đăng ký...).
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+
+def make_etag(*parts):
+    """ETag mạnh (strong) = hash của các thành phần quyết định nội dung response."""
+    raw = '|'.join(str(part) for part in parts)
+    return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+
+def latest(*timestamps):
+    """Mốc thời gian mới nhất trong các giá trị (bỏ qua None)."""
+    values = [ts for ts in timestamps if ts is not None]
+    return max(values) if values else None
+
+
+def not_modified_response(request, etag):
+    """Trả về response 304 nếu client đã có bản mới nhất, ngược lại trả về None."""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        set_validators(response, etag)
+    return response
+
+
+def set_validators(response, etag):
+    response['ETag'] = etag
+    # Nội dung phụ thuộc user đang đăng nhập (is_completed, video_url, khóa học nháp của Admin)
+    patch_vary_headers(response, ['Authorization'])
+    return response
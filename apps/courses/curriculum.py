@@ -0,0 +1,81 @@
+"""
+Mục lục (curriculum) của khóa học dạng stream: GET /api/courses/{slug}/curriculum/.
+
+Khác với trang chi tiết (CourseDetailSerializer dựng cả cây dict rồi mới render), ở đây:
+- Module và Lesson được đọc bằng values() trong 2 query phẳng đã sắp xếp sẵn (không tạo model instance),
+  Lesson được đọc dần theo lô bằng iterator() -> bộ nhớ không tăng theo số bài học.
+- JSON được ghi dần từng đoạn (StreamingHttpResponse), byte đầu tiên được gửi ngay sau khi đọc xong module.
+- Quyền xem video giống apply_user_state/LessonSerializer: chỉ trả video_url/video_source của bài học thử,
+  hoặc của mọi bài khi user là Admin/đã đăng ký.
+
+Định dạng giống phần "modules" của trang chi tiết:
+{"id", "slug", "title", "modules": [{"id", "title", "description", "order", "lessons": [...]}]}
+"""
+import json
+
+from django.utils.duration import duration_string
+
+from .models import Lesson, Module
+
+# Gom các đoạn JSON nhỏ thành chunk ~16KB trước khi gửi (tránh mỗi bài học 1 lần write)
+CHUNK_SIZE = 16 * 1024
+LESSON_BATCH_SIZE = 2000
+
+MODULE_FIELDS = ('id', 'title', 'description', 'order')
+LESSON_FIELDS = (
+    'id', 'title', 'slug', 'lesson_type', 'duration', 'is_preview',
+    'video_source', 'video_url', 'order', 'module_id',
+)
+
+
+def _dumps(value):
+    # Cùng định dạng với JSONRenderer của DRF (UTF-8, không khoảng trắng thừa)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _lesson_json(lesson, allow_all, completed_lesson_ids):
+    del lesson['module_id']
+    if lesson['duration'] is not None:
+        lesson['duration'] = duration_string(lesson['duration'])
+    if not (allow_all or lesson['is_preview']):
+        lesson.pop('video_url')
+        lesson.pop('video_source')
+    lesson['is_completed'] = lesson['id'] in completed_lesson_ids
+    return _dumps(lesson)
+
+
+def iter_curriculum(course, allow_all, completed_lesson_ids):
+    """Sinh các đoạn JSON (str) của mục lục. Query chạy lười khi response được gửi đi."""
+    modules = list(
+        Module.objects.filter(course_id=course.pk).order_by('order', 'id').values(*MODULE_FIELDS)
+    )
+    # Bài học sắp xếp theo đúng thứ tự module ở trên -> ghép 2 danh sách trong 1 lượt duyệt
+    lessons = Lesson.objects.filter(module__course_id=course.pk) \
+                            .order_by('module__order', 'module_id', 'order', 'id') \
+                            .values(*LESSON_FIELDS) \
+                            .iterator(chunk_size=LESSON_BATCH_SIZE)
+    lesson = next(lessons, None)
+
+    yield _dumps({'id': course.pk, 'slug': course.slug, 'title': course.title})[:-1] + ',"modules":['
+    for index, module in enumerate(modules):
+        yield ('{' if index == 0 else ',{') + _dumps(module)[1:-1] + ',"lessons":['
+        first = True
+        while lesson is not None and lesson['module_id'] == module['id']:
+            yield ('' if first else ',') + _lesson_json(lesson, allow_all, completed_lesson_ids)
+            first = False
+            lesson = next(lessons, None)
+        yield ']}'
+    yield ']}'
+
+
+def chunked(parts, size=CHUNK_SIZE):
+    """Gom các đoạn str thành bytes có kích thước ~size."""
+    buffer, length = [], 0
+    for part in parts:
+        buffer.append(part)
+        length += len(part)
+        if length >= size:
+            yield ''.join(buffer).encode()
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer).encode()
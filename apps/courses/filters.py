@@ -0,0 +1,119 @@
+"""
+Lọc, sắp xếp và tìm kiếm khóa học phía server (CourseViewSet.list).
+
+Tham số hỗ trợ:
+- category=<slug>, level=beginner,intermediate, is_featured=true, instructor=<username>
+- min_price / max_price, min_old_price / max_old_price
+- q=<từ khóa>: PostgreSQL dùng full-text search trên cột search_vector (GIN index),
+  SQLite (dev) fallback về icontains trên title/description/about.
+- ordering=created_at|price|title|rating (thêm dấu - để sắp giảm dần). Với q, mặc định sắp theo độ liên quan.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+# Cấu hình 'simple' (không stemming) vì nội dung chủ yếu là tiếng Việt, PostgreSQL không có từ điển tiếng Việt
+SEARCH_CONFIG = 'simple'
+
+ORDERING_FIELDS = {
+    'created_at': 'created_at',
+    'price': 'price',
+    'title': 'title',
+    'rating': 'average_rating',
+}
+
+
+def _parse_decimal(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: 'Giá trị không hợp lệ.'})
+
+
+def _parse_bool(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValidationError({name: 'Giá trị không hợp lệ.'})
+
+
+def search_courses(queryset, query):
+    """Tìm kiếm full-text. Trả về (queryset, has_rank)."""
+    if connections[queryset.db].vendor == 'postgresql':
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        queryset = queryset.filter(search_vector=search_query) \
+                           .annotate(rank=SearchRank(F('search_vector'), search_query))
+        return queryset, True
+
+    # Fallback (SQLite/dev): mỗi từ khóa phải xuất hiện ở ít nhất 1 trong các cột văn bản
+    for term in query.split():
+        queryset = queryset.filter(
+            Q(title__icontains=term) | Q(description__icontains=term) | Q(about__icontains=term)
+        )
+    return queryset, False
+
+
+class CourseFilterBackend(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        if getattr(view, 'action', None) != 'list':
+            return queryset
+
+        params = request.query_params
+        filters = {}
+
+        if params.get('category'):
+            filters['category__slug'] = params['category']
+        if params.get('level'):
+            filters['level__in'] = params['level'].split(',')
+        if params.get('instructor'):
+            filters['instructor__username'] = params['instructor']
+
+        is_featured = _parse_bool(params, 'is_featured')
+        if is_featured is not None:
+            filters['is_featured'] = is_featured
+
+        for param, lookup in (
+            ('min_price', 'price__gte'),
+            ('max_price', 'price__lte'),
+            ('min_old_price', 'old_price__gte'),
+            ('max_old_price', 'old_price__lte'),
+        ):
+            value = _parse_decimal(params, param)
+            if value is not None:
+                filters[lookup] = value
+
+        queryset = queryset.filter(**filters)
+
+        has_rank = False
+        query = params.get('q', '').strip()
+        if query:
+            queryset, has_rank = search_courses(queryset, query)
+
+        ordering = params.get('ordering')
+        if ordering:
+            field = ORDERING_FIELDS.get(ordering.lstrip('-'))
+            if field is None:
+                raise ValidationError({'ordering': f"Chỉ hỗ trợ: {', '.join(ORDERING_FIELDS)}."})
+            if field == 'average_rating' and 'average_rating' not in queryset.query.annotations:
+                # ?fields=... không gồm average_rating -> vẫn cần annotate để sắp xếp
+                queryset = queryset.annotate(average_rating=view.get_stats_annotations()['average_rating'])
+            if ordering.startswith('-'):
+                expression = F(field).desc(nulls_last=True)
+            else:
+                expression = F(field).asc(nulls_last=True)
+            queryset = queryset.order_by(expression, '-id')
+        elif has_rank:
+            queryset = queryset.order_by('-rank', '-id')
+
+        return queryset
@@ -0,0 +1,110 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+
+from apps.courses.models import Course, UserLessonProgress
+from apps.courses.progress import archive_progress_batch
+
+
+class Command(BaseCommand):
+    """
+    Chuyển tiến độ học cũ từ UserLessonProgress sang bảng lưu trữ ArchivedLessonProgress
+    (chỉ giữ các bài đã hoàn thành), theo từng lô nhỏ, mỗi lô 1 transaction ngắn.
+    Trạng thái hoàn thành vẫn được trả về như cũ ở trang chi tiết/tiến độ (đọc cả 2 bảng).
+
+    Tiến độ được lưu trữ:
+    - của các khóa học có status='archived',
+    - của các user đã bị khóa (is_active=False),
+    - với --inactive-days N: của các user không có tiến độ nào được cập nhật trong N ngày gần nhất.
+
+    VD:
+        python manage.py archive_progress --dry-run
+        python manage.py archive_progress --inactive-days 365 --batch-size 2000 --sleep 0.1
+    """
+    help = 'Move progress rows of archived courses and inactive users into the compact archive table.'
+
+    USER_CHUNK_SIZE = 500
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--inactive-days', type=int,
+            help='Lưu trữ cả tiến độ của user không học gì trong N ngày.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Số dòng tiến độ mỗi transaction (mặc định 1000).',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0.0,
+            help='Nghỉ giữa các lô (giây) để giảm tải cho DB/replica.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Chỉ đếm số dòng sẽ được lưu trữ, không ghi vào DB.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size phải lớn hơn 0.')
+        if options['inactive_days'] is not None and options['inactive_days'] < 1:
+            raise CommandError('--inactive-days phải lớn hơn 0.')
+        self.options = options
+        self.moved = self.archived = 0
+
+        for course_id in Course.objects.filter(status='archived').values_list('pk', flat=True).order_by('pk'):
+            self.archive(UserLessonProgress.objects.filter(lesson__module__course_id=course_id), f"course {course_id}")
+
+        user_ids = self.inactive_user_ids()
+        for start in range(0, len(user_ids), self.USER_CHUNK_SIZE):
+            chunk = user_ids[start:start + self.USER_CHUNK_SIZE]
+            progress = UserLessonProgress.objects.filter(user_id__in=chunk) \
+                                                 .exclude(lesson__module__course__status='archived')
+            self.archive(progress, f"{len(chunk)} inactive users")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"{self.moved} progress rows would be archived."))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {self.moved} progress rows ({self.archived} completed lessons kept)."
+        ))
+
+    def inactive_user_ids(self):
+        """Id các user bị khóa hoặc không học gì trong --inactive-days ngày (chỉ những user còn tiến độ)."""
+        with_progress = UserLessonProgress.objects.order_by().values('user_id')
+        user_ids = set(
+            User.objects.filter(is_active=False, pk__in=with_progress).values_list('pk', flat=True)
+        )
+        if self.options['inactive_days'] is not None:
+            cutoff = timezone.now() - timedelta(days=self.options['inactive_days'])
+            user_ids.update(
+                with_progress.annotate(last_activity=Max('updated_at'))
+                             .filter(last_activity__lt=cutoff)
+                             .values_list('user_id', flat=True)
+            )
+        return sorted(user_ids)
+
+    def archive(self, queryset, label):
+        if self.options['dry_run']:
+            count = queryset.count()
+            if count:
+                self.stdout.write(f"{label}: {count} rows")
+            self.moved += count
+            return
+
+        after_pk = moved = 0
+        while True:
+            result = archive_progress_batch(queryset, after_pk, self.options['batch_size'])
+            if result is None:
+                break
+            after_pk, deleted, archived = result
+            moved += deleted
+            self.archived += archived
+            if self.options['sleep']:
+                time.sleep(self.options['sleep'])
+        if moved:
+            self.stdout.write(f"{label}: {moved} rows")
+        self.moved += moved
@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from apps.courses.models import CourseStats
+
+
+class Command(BaseCommand):
+    """
+    Tính lại bảng CourseStats từ dữ liệu gốc và báo cáo các khóa học bị sai lệch (drift).
+
+    VD:
+        python manage.py rebuild_course_stats            # Sửa toàn bộ
+        python manage.py rebuild_course_stats --check    # Chỉ kiểm tra, exit code != 0 nếu có sai lệch
+        python manage.py rebuild_course_stats --course 12 --course 15
+    """
+    help = 'Rebuild denormalized CourseStats rows and report drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Chỉ kiểm tra sai lệch, không ghi vào DB.',
+        )
+        parser.add_argument(
+            '--course', action='append', type=int, dest='course_ids',
+            help='Chỉ xử lý các khóa học có id này (có thể lặp lại).',
+        )
+
+    def handle(self, *args, **options):
+        expected = CourseStats.compute(options['course_ids'])
+        current = {
+            stats.course_id: stats
+            for stats in CourseStats.objects.filter(course_id__in=expected.keys())
+        }
+
+        drifted = []
+        for course_id, values in expected.items():
+            stats = current.get(course_id)
+            if stats is None:
+                drifted.append((course_id, None))
+                continue
+            fields = [f for f in CourseStats.COUNTER_FIELDS if getattr(stats, f) != values[f]]
+            if fields:
+                drifted.append((course_id, fields))
+
+        for course_id, fields in drifted:
+            if fields is None:
+                self.stdout.write(f"Course {course_id}: missing stats row")
+            else:
+                self.stdout.write(f"Course {course_id}: drift in {', '.join(fields)}")
+
+        if options['check']:
+            if drifted:
+                raise CommandError(f"{len(drifted)}/{len(expected)} course stats rows are out of date.")
+            self.stdout.write(self.style.SUCCESS(f"All {len(expected)} course stats rows are up to date."))
+            return
+
+        now = timezone.now()
+        with transaction.atomic():
+            to_create = []
+            for course_id, values in expected.items():
+                stats = current.get(course_id)
+                if stats is None:
+                    to_create.append(CourseStats(course_id=course_id, **values))
+                    continue
+                for field, value in values.items():
+                    setattr(stats, field, value)
+                stats.updated_at = now
+            CourseStats.objects.bulk_create(to_create, batch_size=500)
+            CourseStats.objects.bulk_update(
+                current.values(), list(CourseStats.COUNTER_FIELDS) + ['updated_at'], batch_size=500,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(expected)} course stats rows ({len(drifted)} had drifted)."
+        ))
@@ -0,0 +1,199 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+from django.db.models import Max
+
+from apps.courses.models import Category, Course, Lesson, Module, Review, UserLessonProgress
+from apps.enrollments.models import Enrollment
+from apps.users.models import Profile
+
+WORDS = (
+    'python', 'django', 'react', 'docker', 'sql', 'marketing', 'design', 'excel', 'tiếng anh',
+    'nhiếp ảnh', 'kế toán', 'machine learning', 'javascript', 'figma', 'kubernetes', 'linux',
+)
+
+
+class Command(BaseCommand):
+    """
+    Sinh dữ liệu giả lập quy mô production để đo hiệu năng ở máy local.
+
+    Mọi bảng được ghi bằng bulk_create theo lô (không chạy signal), sau đó CourseStats được tính lại
+    và cache trang chi tiết được xóa. Cùng --seed trên cùng 1 DB -> cùng dữ liệu.
+    Chạy nhiều lần sẽ thêm dữ liệu mới (slug/username đánh số tiếp), không ghi đè dữ liệu cũ.
+
+    VD:
+        python manage.py seed_data --courses 2000 --users 5000 --seed 42
+        python manage.py seed_data --courses 50 --modules 3 --lessons 5 --users 100
+    Mọi user sinh ra dùng chung mật khẩu --password (mặc định: benchmark123) để chạy scripts/benchmark.py.
+    """
+    help = 'Bulk-generate synthetic categories, courses, lessons, users, enrollments, progress and reviews.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--courses', type=int, default=200)
+        parser.add_argument('--modules', type=int, default=5, help='Số chương mỗi khóa học.')
+        parser.add_argument('--lessons', type=int, default=8, help='Số bài học mỗi chương.')
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--enrollments', type=int, default=5, help='Số khóa học mỗi user đăng ký.')
+        parser.add_argument(
+            '--progress', type=float, default=0.5,
+            help='Tỉ lệ bài học (0-1) trong khóa đã đăng ký mà user đã xem.',
+        )
+        parser.add_argument(
+            '--reviews', type=float, default=0.3,
+            help='Tỉ lệ lượt đăng ký (0-1) có kèm review.',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--password', default='benchmark123')
+
+    def handle(self, *args, **options):
+        for name in ('categories', 'courses', 'modules', 'lessons', 'users', 'enrollments'):
+            if options[name] < 0:
+                raise CommandError(f"--{name} must be >= 0.")
+        if not 0 <= options['progress'] <= 1 or not 0 <= options['reviews'] <= 1:
+            raise CommandError("--progress and --reviews must be between 0 and 1.")
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+        with transaction.atomic():
+            categories = self.create_categories(options['categories'])
+            instructors = self.create_users(
+                max(1, options['courses'] // 20) if options['courses'] else 0, options['password'], 'giangvien',
+            )
+            courses = self.create_courses(options['courses'], categories, instructors)
+            lessons_by_course = self.create_curriculum(courses, options['modules'], options['lessons'])
+            students = self.create_users(options['users'], options['password'], 'hocvien')
+            self.create_learning_data(
+                students, courses, lessons_by_course,
+                options['enrollments'], options['progress'], options['reviews'],
+            )
+            self.update_search_vectors(courses)
+
+        call_command('rebuild_course_stats', stdout=self.stdout if options['verbosity'] > 1 else StringIO())
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(f"Seeded {len(courses)} courses and {len(students)} users."))
+
+    def bulk_create(self, model, objects, **kwargs):
+        """
+        Ghi theo lô, trả về queryset các dòng vừa tạo (id > id lớn nhất trước đó):
+        tránh filter(pk__in=[...]) với hàng nghìn tham số.
+        """
+        last_id = model.objects.aggregate(last_id=Max('pk'))['last_id'] or 0
+        model.objects.bulk_create(objects, batch_size=self.batch_size, **kwargs)
+        self.stdout.write(f"{model.__name__}: +{len(objects)}")
+        return model.objects.filter(pk__gt=last_id).order_by('pk')
+
+    def next_index(self, queryset, field, prefix):
+        """Số thứ tự tiếp theo cho slug/username dạng '<prefix>-<n>' (chạy lại lệnh không bị trùng khóa unique)."""
+        return queryset.filter(**{f'{field}__startswith': f'{prefix}-'}).count()
+
+    def create_categories(self, count):
+        start = self.next_index(Category.objects, 'slug', 'seed-category')
+        self.bulk_create(Category, [
+            Category(title=f'Danh mục {WORDS[(start + i) % len(WORDS)]} {start + i}', slug=f'seed-category-{start + i}')
+            for i in range(count)
+        ])
+        categories = list(Category.objects.order_by('id'))
+        if not categories:
+            raise CommandError("At least one category is required (--categories).")
+        return categories
+
+    def create_users(self, count, password, prefix):
+        start = self.next_index(User.objects, 'username', prefix)
+        # Hash 1 lần rồi dùng chung: PBKDF2 cho hàng nghìn user sẽ mất vài phút
+        hashed = make_password(password)
+        usernames = [f'{prefix}-{start + i}' for i in range(count)]
+        users = list(self.bulk_create(User, [
+            User(username=username, email=f'{username}@example.com', password=hashed)
+            for username in usernames
+        ]))
+        # bulk_create không chạy signal tạo Profile (API /auth/me/ cần Profile)
+        self.bulk_create(Profile, [Profile(user=user) for user in users])
+        return users
+
+    def create_courses(self, count, categories, instructors):
+        start = self.next_index(Course.objects, 'slug', 'seed-course')
+        courses = []
+        for i in range(count):
+            topic = self.rng.choice(WORDS)
+            price = Decimal(self.rng.choice((0, 199000, 299000, 499000, 999000)))
+            courses.append(Course(
+                instructor=self.rng.choice(instructors),
+                category=self.rng.choice(categories),
+                title=f'Khóa học {topic} {start + i}',
+                slug=f'seed-course-{start + i}',
+                description=f'Học {topic} từ cơ bản đến nâng cao.',
+                about=f'Nội dung chi tiết về {topic}. ' * 20,
+                thumbnail='courses/thumbnails/seed.jpg',
+                price=price,
+                old_price=price * 2 if price and self.rng.random() < 0.5 else None,
+                level=self.rng.choice(Course.LEVEL_CHOICES)[0],
+                status='published' if self.rng.random() < 0.9 else 'draft',
+                is_featured=self.rng.random() < 0.05,
+            ))
+        return list(self.bulk_create(Course, courses))
+
+    def create_curriculum(self, courses, modules_per_course, lessons_per_module):
+        modules = self.bulk_create(Module, [
+            Module(course=course, title=f'Chương {m + 1}', order=m)
+            for course in courses for m in range(modules_per_course)
+        ])
+        lessons = self.bulk_create(Lesson, [
+            Lesson(
+                module=module,
+                title=f'Bài {n + 1}',
+                slug=f'bai-{n + 1}',
+                order=n,
+                video_url=f'https://example.com/videos/{module.pk}-{n}.mp4',
+                duration=timedelta(seconds=self.rng.randint(120, 1800)),
+                is_preview=(module.order == 0 and n == 0),
+            )
+            for module in modules for n in range(lessons_per_module)
+        ])
+
+        lessons_by_course = {course.pk: [] for course in courses}
+        for lesson_id, course_id in lessons.order_by('module__order', 'order').values_list('id', 'module__course_id'):
+            lessons_by_course[course_id].append(lesson_id)
+        return lessons_by_course
+
+    def create_learning_data(self, students, courses, lessons_by_course, per_user, progress_ratio, review_ratio):
+        if not courses:
+            return
+        enrollments, progress, reviews = [], [], []
+        for user in students:
+            for course in self.rng.sample(courses, min(per_user, len(courses))):
+                enrollments.append(Enrollment(user=user, course=course))
+                lessons = lessons_by_course[course.pk]
+                # Học viên học theo thứ tự: xem k bài đầu, bài cuối cùng đang xem dở
+                watched = lessons[:round(len(lessons) * progress_ratio * self.rng.random() * 2)]
+                for position, lesson_id in enumerate(watched, start=1):
+                    progress.append(UserLessonProgress(
+                        user=user,
+                        lesson_id=lesson_id,
+                        is_completed=position < len(watched),
+                        last_watched_position=self.rng.randint(0, 1800),
+                    ))
+                if self.rng.random() < review_ratio:
+                    reviews.append(Review(
+                        user=user, course=course, rating=self.rng.choices((1, 2, 3, 4, 5), (1, 1, 2, 4, 6))[0],
+                        comment='Khóa học hữu ích.',
+                    ))
+        self.bulk_create(Enrollment, enrollments, ignore_conflicts=True)
+        self.bulk_create(UserLessonProgress, progress, ignore_conflicts=True)
+        self.bulk_create(Review, reviews, ignore_conflicts=True)
+
+    def update_search_vectors(self, courses):
+        using = router.db_for_write(Course)
+        if courses and connections[using].vendor == 'postgresql':
+            Course.objects.using(using).filter(pk__gte=courses[0].pk, pk__lte=courses[-1].pk) \
+                .update(search_vector=Course.SEARCH_VECTOR)
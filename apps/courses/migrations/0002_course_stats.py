@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:04
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_course_stats(apps, schema_editor):
+    """Tạo CourseStats cho các khóa học đã có sẵn trước migration này."""
+    Course = apps.get_model('courses', 'Course')
+    Lesson = apps.get_model('courses', 'Lesson')
+    Review = apps.get_model('courses', 'Review')
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+    CourseStats = apps.get_model('courses', 'CourseStats')
+
+    stats = {pk: CourseStats(course_id=pk) for pk in Course.objects.values_list('pk', flat=True)}
+    for row in Lesson.objects.order_by().values('module__course').annotate(
+        c=models.Count('id'), d=models.Sum('duration'),
+    ):
+        stats[row['module__course']].lesson_count = row['c']
+        stats[row['module__course']].total_duration = row['d'] or datetime.timedelta(0)
+    for row in Enrollment.objects.order_by().values('course').annotate(c=models.Count('id')):
+        stats[row['course']].enrollment_count = row['c']
+    for row in Review.objects.order_by().values('course').annotate(
+        c=models.Count('id'), s=models.Sum('rating'),
+    ):
+        stats[row['course']].review_count = row['c']
+        stats[row['course']].rating_sum = row['s']
+    CourseStats.objects.bulk_create(stats.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+        ('enrollments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='courses.course')),
+                ('lesson_count', models.PositiveIntegerField(default=0)),
+                ('total_duration', models.DurationField(default=datetime.timedelta(0))),
+                ('enrollment_count', models.PositiveIntegerField(default=0)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Course stats',
+            },
+        ),
+        migrations.RunPython(build_course_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:12
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+
+# GIN index + dữ liệu ban đầu cho search_vector chỉ áp dụng cho PostgreSQL
+# (SQLite không hỗ trợ GIN, tìm kiếm dùng fallback icontains).
+GIN_INDEX_NAME = 'course_search_vector_gin'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Course = apps.get_model('courses', 'Course')
+    Course.objects.using(schema_editor.connection.alias).update(
+        search_vector=(
+            SearchVector('title', weight='A', config='simple')
+            + SearchVector('description', weight='B', config='simple')
+            + SearchVector('about', weight='C', config='simple')
+        )
+    )
+    schema_editor.execute(
+        f'CREATE INDEX {GIN_INDEX_NAME} ON courses_course USING gin (search_vector)'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {GIN_INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_course_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['status', 'category', 'level'], name='course_status_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['status', 'level'], name='course_status_level_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['status', 'is_featured'], name='course_status_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['status', 'price'], name='course_status_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['status', 'old_price'], name='course_status_old_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['instructor', 'status'], name='course_instructor_status_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
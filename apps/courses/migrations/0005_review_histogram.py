@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:37
+
+from django.db import migrations, models
+
+
+def build_rating_histogram(apps, schema_editor):
+    """Điền phân bố số sao cho các khóa học đã có review trước migration này."""
+    Review = apps.get_model('courses', 'Review')
+    CourseStats = apps.get_model('courses', 'CourseStats')
+
+    fields = [f'rating_{star}_count' for star in range(1, 6)]
+    stats = {row.course_id: row for row in CourseStats.objects.all()}
+    for row in Review.objects.order_by().values('course', 'rating').annotate(c=models.Count('id')):
+        if row['course'] in stats and 1 <= row['rating'] <= 5:
+            setattr(stats[row['course']], f"rating_{row['rating']}_count", row['c'])
+    CourseStats.objects.bulk_update(stats.values(), fields, batch_size=500)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursestats',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='coursestats',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='coursestats',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='coursestats',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='coursestats',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['course', 'created_at', 'id'], name='review_course_created_idx'),
+        ),
+        migrations.RunPython(build_rating_histogram, migrations.RunPython.noop),
+    ]
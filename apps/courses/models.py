@@ -1,7 +1,15 @@
-from django.db import models
+from datetime import timedelta
+
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import models, connections, router
 from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.text import slugify
 
+from .cache import bump_course_version
+
 # 1. Abstract Base Class: Giúp tái sử dụng fields created_at/updated_at
 class TimeStampedModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
@@ -60,10 +68,46 @@ class Course(TimeStampedModel):
     level = models.CharField(max_length=20, choices=LEVEL_CHOICES, default='beginner')
     is_featured = models.BooleanField(default=False) # Khóa học nổi bật lên trang chủ
 
+    # Vector tìm kiếm full-text (PostgreSQL) được lưu sẵn + GIN index (tạo trong migration 0003),
+    # cập nhật mỗi khi save(). Trên SQLite cột này không được dùng.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Các bộ lọc của trang danh sách luôn đi kèm status='published'
+            models.Index(fields=['status', 'category', 'level'], name='course_status_category_idx'),
+            models.Index(fields=['status', 'level'], name='course_status_level_idx'),
+            models.Index(fields=['status', 'is_featured'], name='course_status_featured_idx'),
+            models.Index(fields=['status', 'price'], name='course_status_price_idx'),
+            models.Index(fields=['status', 'old_price'], name='course_status_old_price_idx'),
+            models.Index(fields=['instructor', 'status'], name='course_instructor_status_idx'),
+            # Trang danh sách mặc định: khóa học đã Public, mới nhất trước (partial index, chỉ chứa bản published)
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='course_published_created_idx',
+                condition=models.Q(status='published'),
+            ),
+            # Admin/staff xem mọi trạng thái theo thứ tự mới nhất
+            models.Index(fields=['status', '-created_at', '-id'], name='course_status_created_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
         super().save(*args, **kwargs)
+        self.update_search_vector()
+
+    # Trọng số: tiêu đề (A) > mô tả ngắn (B) > nội dung chi tiết (C)
+    SEARCH_VECTOR = (
+        SearchVector('title', weight='A', config='simple')
+        + SearchVector('description', weight='B', config='simple')
+        + SearchVector('about', weight='C', config='simple')
+    )
+
+    def update_search_vector(self):
+        using = router.db_for_write(Course, instance=self)
+        if connections[using].vendor == 'postgresql':
+            Course.objects.using(using).filter(pk=self.pk).update(search_vector=self.SEARCH_VECTOR)
 
     def __str__(self):
         return self.title
@@ -77,6 +121,10 @@ class Module(TimeStampedModel):
 
     class Meta:
         ordering = ['order']
+        indexes = [
+            # Prefetch module của khóa học theo đúng thứ tự hiển thị
+            models.Index(fields=['course', 'order'], name='module_course_order_idx'),
+        ]
 
     def __str__(self):
         return f"{self.course.title} - {self.title}"
@@ -116,6 +164,9 @@ class Lesson(TimeStampedModel):
     class Meta:
         ordering = ['order']
         unique_together = ['module', 'slug'] # Slug chỉ cần duy nhất trong 1 module (hoặc course)
+        indexes = [
+            models.Index(fields=['module', 'order'], name='lesson_module_order_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -129,6 +180,10 @@ class UserLessonProgress(TimeStampedModel):
 
     class Meta:
         unique_together = ('user', 'lesson')
+        indexes = [
+            # Tập bài đã hoàn thành của 1 user (trang chi tiết, tiến độ khóa học)
+            models.Index(fields=['user', 'is_completed'], name='progress_user_completed_idx'),
+        ]
 
 # 7. Review: Đánh giá khóa học
 class Review(TimeStampedModel):
@@ -138,4 +193,286 @@ class Review(TimeStampedModel):
     comment = models.TextField()
 
     class Meta:
-        unique_together = ('user', 'course') # Mỗi người chỉ review 1 lần/khóa
\ No newline at end of file
+        unique_together = ('user', 'course') # Mỗi người chỉ review 1 lần/khóa
+        indexes = [
+            # Review mới nhất của khóa học (trang chi tiết, phân trang keyset của /reviews/)
+            models.Index(fields=['course', 'created_at', 'id'], name='review_course_created_idx'),
+        ]
+
+# 8. CourseStats: Số liệu thống kê tính sẵn (denormalized) cho trang danh sách
+# Được cập nhật tăng dần (incremental) qua signal mỗi khi Lesson/Module/Enrollment/Review thay đổi,
+# nhờ đó trang danh sách chỉ cần JOIN theo khóa chính thay vì đếm lại trên các bảng lớn.
+class CourseStats(models.Model):
+    course = models.OneToOneField(Course, related_name='stats', on_delete=models.CASCADE, primary_key=True)
+    lesson_count = models.PositiveIntegerField(default=0)
+    total_duration = models.DurationField(default=timedelta(0))
+    enrollment_count = models.PositiveIntegerField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0) # Lưu tổng điểm để tính trung bình mà không cần đọc lại Review
+    # Phân bố số review theo số sao (histogram 1-5 sao trên trang chi tiết)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Course stats"
+
+    RATING_COUNT_FIELDS = tuple(f'rating_{star}_count' for star in range(1, 6))
+    REVIEW_FIELDS = ('review_count', 'rating_sum') + RATING_COUNT_FIELDS
+    # Danh sách các cột được so sánh khi kiểm tra sai lệch (drift)
+    COUNTER_FIELDS = ('lesson_count', 'total_duration', 'enrollment_count') + REVIEW_FIELDS
+
+    def __str__(self):
+        return f"Stats of {self.course_id}"
+
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return None
+        return self.rating_sum / self.review_count
+
+    @property
+    def rating_histogram(self):
+        """{số sao: số review}, VD: {'1': 0, '2': 1, '3': 4, '4': 10, '5': 25}"""
+        return {str(star): getattr(self, f'rating_{star}_count') for star in range(1, 6)}
+
+    @classmethod
+    def bump(cls, course_id, **deltas):
+        """
+        Cộng/trừ các bộ đếm bằng F() expression -> 1 câu UPDATE, an toàn khi nhiều request ghi đồng thời.
+        VD: CourseStats.bump(course_id, lesson_count=1, total_duration=timedelta(minutes=5))
+        """
+        changes = {field: models.F(field) + delta for field, delta in deltas.items() if delta}
+        if not changes:
+            return
+        # update() không kích hoạt auto_now nên phải gán updated_at thủ công
+        cls.objects.filter(course_id=course_id).update(updated_at=timezone.now(), **changes)
+
+    @classmethod
+    def compute(cls, course_ids=None):
+        """
+        Tính lại số liệu từ dữ liệu gốc (Lesson, Enrollment, Review).
+        Trả về dict {course_id: {field: value}} cho mọi khóa học (hoặc chỉ các course_ids được chỉ định).
+        Mỗi nhóm số liệu là 1 câu GROUP BY riêng để các bảng không nhân chéo số dòng.
+        """
+        from apps.enrollments.models import Enrollment
+
+        courses = Course.objects.all()
+        lessons = Lesson.objects.all()
+        enrollments = Enrollment.objects.all()
+        reviews = Review.objects.all()
+        if course_ids is not None:
+            courses = courses.filter(pk__in=course_ids)
+            lessons = lessons.filter(module__course__in=course_ids)
+            enrollments = enrollments.filter(course__in=course_ids)
+            reviews = reviews.filter(course__in=course_ids)
+
+        result = {
+            pk: {
+                'lesson_count': 0, 'total_duration': timedelta(0),
+                'enrollment_count': 0, 'review_count': 0, 'rating_sum': 0,
+                **{field: 0 for field in cls.RATING_COUNT_FIELDS},
+            }
+            for pk in courses.values_list('pk', flat=True)
+        }
+
+        def merge(rows, key):
+            for row in rows:
+                course_id = row.pop(key)
+                if course_id in result:
+                    result[course_id].update({k: v for k, v in row.items() if v is not None})
+
+        merge(
+            lessons.order_by().values('module__course').annotate(
+                lesson_count=models.Count('id'), total_duration=models.Sum('duration'),
+            ),
+            'module__course',
+        )
+        merge(
+            enrollments.order_by().values('course').annotate(enrollment_count=models.Count('id')),
+            'course',
+        )
+        merge(
+            reviews.order_by().values('course').annotate(
+                review_count=models.Count('id'), rating_sum=models.Sum('rating'),
+                **{
+                    f'rating_{star}_count': models.Count('id', filter=models.Q(rating=star))
+                    for star in range(1, 6)
+                },
+            ),
+            'course',
+        )
+        return result
+
+    @classmethod
+    def refresh(cls, course_id, fields=None):
+        """Tính lại (một phần) số liệu của 1 khóa học, dùng khi bản ghi bị sửa chứ không chỉ thêm/xóa."""
+        values = cls.compute([course_id]).get(course_id)
+        if values is None:
+            return
+        if fields is not None:
+            values = {field: values[field] for field in fields}
+        cls.objects.update_or_create(course_id=course_id, defaults=values)
+
+    @classmethod
+    def refresh_many(cls, course_ids, fields):
+        """Như refresh() cho nhiều khóa học: 1 lượt compute + bulk_update (dùng sau các thao tác bulk không có signal)."""
+        expected = cls.compute(course_ids)
+        now = timezone.now()
+        stats = list(cls.objects.filter(course_id__in=expected.keys()))
+        for row in stats:
+            for field in fields:
+                setattr(row, field, expected[row.course_id][field])
+            row.updated_at = now
+        cls.objects.bulk_update(stats, list(fields) + ['updated_at'], batch_size=500)
+
+# 9. ArchivedLessonProgress: Bài học đã hoàn thành của tiến độ đã lưu trữ (lệnh archive_progress)
+# Tiến độ của khóa học đã lưu trữ / user không còn hoạt động được chuyển khỏi bảng UserLessonProgress để
+# bảng này (đọc/ghi liên tục) không phình theo user x bài học mãi mãi. Bảng lưu trữ gọn hơn: chỉ giữ bài đã
+# hoàn thành (vị trí xem dở bị bỏ), có sẵn course_id để tra theo (user, khóa học) không cần JOIN Lesson/Module.
+# Các chỗ đọc trạng thái hoàn thành đọc cả 2 bảng (xem views.get_learning_context, progress.course_progress_queryset).
+class ArchivedLessonProgress(models.Model):
+    user = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE, db_index=False)
+    course = models.ForeignKey(Course, related_name='+', on_delete=models.CASCADE)
+    lesson = models.ForeignKey(Lesson, related_name='+', on_delete=models.CASCADE)
+    completed_at = models.DateTimeField() # updated_at của dòng tiến độ gốc
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Cũng là index tra theo (user, khóa học)
+            models.UniqueConstraint(fields=['user', 'course', 'lesson'], name='archived_progress_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.lesson_id} (archived)"
+
+
+# --- Signals: Ghi nhớ khóa học cũ khi Module/Lesson/Review được sửa (có thể bị chuyển sang khóa khác) ---
+
+def _remember_course(instance, queryset, field):
+    instance._previous_course_id = None
+    if not instance._state.adding and instance.pk is not None:
+        instance._previous_course_id = queryset.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+def previous_course_id(instance, course_id):
+    """Khóa học trước khi lưu nếu bản ghi vừa bị chuyển khỏi nó (course_id: khóa học hiện tại), ngược lại None."""
+    previous = getattr(instance, '_previous_course_id', None)
+    return previous if previous is not None and previous != course_id else None
+
+@receiver(pre_save, sender=Module)
+@receiver(pre_save, sender=Review)
+def remember_course_of_child(sender, instance, **kwargs):
+    _remember_course(instance, sender.objects, 'course_id')
+
+@receiver(pre_save, sender=Lesson)
+def remember_course_of_lesson(sender, instance, **kwargs):
+    _remember_course(instance, Lesson.objects, 'module__course_id')
+
+
+# --- Signals: Giữ CourseStats luôn đồng bộ ---
+
+@receiver(post_save, sender=Course)
+def create_course_stats(sender, instance, created, **kwargs):
+    if created:
+        CourseStats.objects.get_or_create(course=instance)
+
+@receiver(post_save, sender=Module)
+def update_stats_on_module_save(sender, instance, created, **kwargs):
+    # Module mới chưa có bài học. Module bị sửa (có thể chuyển sang khóa khác) -> tính lại phần bài học
+    # của khóa hiện tại và của khóa cũ
+    if not created:
+        CourseStats.refresh(instance.course_id, fields=['lesson_count', 'total_duration'])
+        previous = previous_course_id(instance, instance.course_id)
+        if previous is not None:
+            CourseStats.refresh(previous, fields=['lesson_count', 'total_duration'])
+
+@receiver(post_save, sender=Lesson)
+def update_stats_on_lesson_save(sender, instance, created, **kwargs):
+    course_id = Module.objects.filter(pk=instance.module_id).values_list('course_id', flat=True).first()
+    if course_id is None:
+        return
+    if created:
+        CourseStats.bump(course_id, lesson_count=1, total_duration=instance.duration)
+    else:
+        # Thời lượng cũ không còn biết được -> tính lại phần bài học của khóa này (và của khóa cũ nếu bị chuyển)
+        CourseStats.refresh(course_id, fields=['lesson_count', 'total_duration'])
+        previous = previous_course_id(instance, course_id)
+        if previous is not None:
+            CourseStats.refresh(previous, fields=['lesson_count', 'total_duration'])
+
+@receiver(post_delete, sender=Lesson)
+def update_stats_on_lesson_delete(sender, instance, **kwargs):
+    # Khi xóa Module/Course, Django xóa dây chuyền từng Lesson và gửi signal này cho mỗi bài
+    course_id = Module.objects.filter(pk=instance.module_id).values_list('course_id', flat=True).first()
+    if course_id is None:
+        return
+    CourseStats.bump(
+        course_id,
+        lesson_count=-1,
+        total_duration=-instance.duration if instance.duration else None,
+    )
+
+@receiver(post_save, sender=Review)
+def update_stats_on_review_save(sender, instance, created, **kwargs):
+    if created:
+        CourseStats.bump(
+            instance.course_id, review_count=1, rating_sum=instance.rating, **{f'rating_{instance.rating}_count': 1},
+        )
+    else:
+        # Điểm cũ không còn biết được -> tính lại phần review của khóa này (và của khóa cũ nếu bị chuyển)
+        CourseStats.refresh(instance.course_id, fields=CourseStats.REVIEW_FIELDS)
+        previous = previous_course_id(instance, instance.course_id)
+        if previous is not None:
+            CourseStats.refresh(previous, fields=CourseStats.REVIEW_FIELDS)
+
+@receiver(post_delete, sender=Review)
+def update_stats_on_review_delete(sender, instance, **kwargs):
+    CourseStats.bump(
+        instance.course_id, review_count=-1, rating_sum=-instance.rating, **{f'rating_{instance.rating}_count': -1},
+    )
+
+# Enrollment nằm ở app khác -> tham chiếu bằng chuỗi 'app_label.Model' để tránh import vòng
+@receiver(post_save, sender='enrollments.Enrollment')
+def update_stats_on_enrollment_save(sender, instance, created, **kwargs):
+    if created:
+        CourseStats.bump(instance.course_id, enrollment_count=1)
+
+@receiver(post_delete, sender='enrollments.Enrollment')
+def update_stats_on_enrollment_delete(sender, instance, **kwargs):
+    CourseStats.bump(instance.course_id, enrollment_count=-1)
+
+
+# --- Signals: Tăng version cache trang chi tiết khi nội dung khóa học thay đổi ---
+
+@receiver([post_save, post_delete], sender=Course)
+def bump_version_on_course_change(sender, instance, **kwargs):
+    bump_course_version(instance.pk)
+
+@receiver([post_save, post_delete], sender=Module)
+@receiver([post_save, post_delete], sender=Review)
+def bump_version_on_child_change(sender, instance, **kwargs):
+    bump_course_version(instance.course_id)
+    # Bị chuyển sang khóa khác -> trang chi tiết của khóa cũ cũng thay đổi
+    previous = previous_course_id(instance, instance.course_id)
+    if previous is not None:
+        bump_course_version(previous)
+
+@receiver([post_save, post_delete], sender=Lesson)
+def bump_version_on_lesson_change(sender, instance, **kwargs):
+    course_id = Module.objects.filter(pk=instance.module_id).values_list('course_id', flat=True).first()
+    if course_id is not None:
+        bump_course_version(course_id)
+    previous = previous_course_id(instance, course_id)
+    if previous is not None:
+        bump_course_version(previous)
+
+@receiver(post_save, sender=Category)
+def bump_version_on_category_change(sender, instance, created, **kwargs):
+    # Category được lồng trong trang chi tiết -> làm mới cache của mọi khóa học thuộc danh mục
+    if not created:
+        for course_id in instance.courses.values_list('pk', flat=True):
+            bump_course_version(course_id)
@@ -0,0 +1,44 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+
+
+class CourseCursorPagination(CursorPagination):
+    """
+    Phân trang theo con trỏ (keyset) cho danh sách khóa học - dùng cho infinite scroll.
+    Không cần COUNT(*) và không quét OFFSET lớn: mỗi trang là 1 lần đọc theo thứ tự (created_at, id).
+    Kích hoạt bằng ?pagination=cursor (các link next/previous tự mang theo tham số cursor).
+
+    ?ordering=created_at|price|title (có thể thêm dấu -) được giữ nguyên, id là tiêu chí phụ.
+    Con trỏ cần cột sắp xếp không NULL -> ?ordering=rating và ?q= (sắp theo độ liên quan) trả 400,
+    client dùng phân trang theo trang cho 2 trường hợp này.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ORDERING_FIELDS = ('created_at', 'price', 'title')
+
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params
+        if params.get('q', '').strip():
+            raise ValidationError({'q': 'Không hỗ trợ tìm kiếm cùng pagination=cursor.'})
+        ordering = params.get('ordering')
+        if not ordering:
+            return self.ordering
+        field = ordering.lstrip('-')
+        if field not in self.ORDERING_FIELDS:
+            raise ValidationError(
+                {'ordering': f"pagination=cursor chỉ hỗ trợ: {', '.join(self.ORDERING_FIELDS)}."}
+            )
+        prefix = '-' if ordering.startswith('-') else ''
+        return (f'{prefix}{field}', f'{prefix}id')
+
+
+class ReviewCursorPagination(CursorPagination):
+    """
+    Phân trang keyset cho review của 1 khóa học (mới nhất trước), dùng index (course, created_at, id).
+    Khóa học nhiều review vẫn đọc mỗi trang với chi phí như nhau, không COUNT(*).
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,270 @@
+"""
+Ghi nhận tiến độ xem video (heartbeat) theo lô.
+
+Mỗi user đang xem video gửi vị trí xem vài giây 1 lần. Thay vì ghi DB cho từng heartbeat,
+ProgressBuffer giữ vị trí mới nhất của mỗi cặp (user, lesson) trong bộ nhớ và định kỳ ghi
+cả lô bằng 1 câu INSERT ... ON CONFLICT DO UPDATE (upsert_progress).
+
+- Nhiều heartbeat của cùng (user, lesson) trong 1 chu kỳ được gộp thành giá trị cuối cùng.
+- Chu kỳ flush: settings.PROGRESS_FLUSH_INTERVAL (giây). Buffer đầy (PROGRESS_BUFFER_MAX_SIZE) -> flush ngay.
+- Khi tiến trình tắt (atexit), phần còn lại trong buffer luôn được flush.
+
+Ngoài ra module cung cấp các hàm upsert tiến độ nguyên tử, queryset tổng hợp tiến độ theo khóa học
+và hàm chuyển tiến độ cũ sang bảng lưu trữ (archive_progress_batch, dùng bởi lệnh archive_progress).
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, router, transaction
+from django.db.models import Count, Exists, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ArchivedLessonProgress, Course, Lesson, UserLessonProgress
+
+logger = logging.getLogger(__name__)
+
+
+def _progress_table():
+    connection = connections[router.db_for_write(UserLessonProgress)]
+    return connection, connection.ops.quote_name(UserLessonProgress._meta.db_table)
+
+
+def upsert_progress(rows):
+    """
+    Ghi nhiều dòng tiến độ bằng 1 câu INSERT ... ON CONFLICT DO UPDATE cho mỗi batch.
+    rows: danh sách (user_id, lesson_id, is_completed, last_watched_position).
+
+    - Cặp (user, lesson) chưa có -> tạo mới. Đã có -> cập nhật vị trí xem.
+    - is_completed = giá_trị_cũ OR giá_trị_mới: không bao giờ đưa bài đã hoàn thành về chưa hoàn thành.
+    - Nguyên tử ở phía DB nên nhiều request song song không gây lỗi trùng khóa unique (user, lesson).
+    Cú pháp ON CONFLICT dùng được cho cả PostgreSQL và SQLite (>= 3.24).
+    """
+    if not rows:
+        return 0
+
+    connection, table = _progress_table()
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    max_params = connection.features.max_query_params
+    batch_size = min(500, max_params // 6) if max_params else 500
+
+    total = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            values = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(batch))
+            params = []
+            for user_id, lesson_id, is_completed, position in batch:
+                params.extend([user_id, lesson_id, is_completed, position, now, now])
+            cursor.execute(
+                f"INSERT INTO {table} "
+                f"(user_id, lesson_id, is_completed, last_watched_position, created_at, updated_at) "
+                f"VALUES {values} "
+                f"ON CONFLICT (user_id, lesson_id) DO UPDATE SET "
+                f"is_completed = {table}.is_completed OR excluded.is_completed, "
+                f"last_watched_position = excluded.last_watched_position, "
+                f"updated_at = excluded.updated_at",
+                params,
+            )
+            total += len(batch)
+    return total
+
+
+def mark_completed(user_id, lesson_id):
+    """
+    Đánh dấu hoàn thành bằng 1 câu lệnh duy nhất (INSERT ... SELECT ... ON CONFLICT DO UPDATE).
+    Giữ nguyên vị trí xem nếu đã có tiến độ.
+    Trả về True nếu trạng thái thay đổi (tạo mới hoặc chuyển sang hoàn thành),
+    False nếu bài đã hoàn thành từ trước HOẶC lesson không tồn tại (SELECT không trả về dòng nào).
+    """
+    connection, table = _progress_table()
+    lesson_table = connection.ops.quote_name(Lesson._meta.db_table)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} "
+            f"(user_id, lesson_id, is_completed, last_watched_position, created_at, updated_at) "
+            f"SELECT %s, id, %s, 0, %s, %s FROM {lesson_table} WHERE id = %s "
+            f"ON CONFLICT (user_id, lesson_id) DO UPDATE SET "
+            f"is_completed = excluded.is_completed, updated_at = excluded.updated_at "
+            f"WHERE NOT {table}.is_completed",
+            [user_id, True, now, now, lesson_id],
+        )
+        return cursor.rowcount > 0
+
+
+def save_positions(positions):
+    """
+    Ghi vị trí xem {(user_id, lesson_id): seconds} vào DB (upsert theo lô, không đụng tới is_completed).
+    Cặp có lesson/user không tồn tại bị bỏ qua để không làm hỏng cả lô.
+    """
+    if not positions:
+        return 0
+
+    lesson_ids = set(Lesson.objects.filter(
+        pk__in={lesson_id for _, lesson_id in positions}
+    ).values_list('pk', flat=True))
+    user_ids = set(User.objects.filter(
+        pk__in={user_id for user_id, _ in positions}
+    ).values_list('pk', flat=True))
+
+    return upsert_progress([
+        (user_id, lesson_id, False, seconds)
+        for (user_id, lesson_id), seconds in positions.items()
+        if user_id in user_ids and lesson_id in lesson_ids
+    ])
+
+
+class ProgressBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Chỉ 1 lần flush tại 1 thời điểm: tránh lô cũ ghi đè lên lô mới hơn của cùng (user, lesson)
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def add(self, user_id, lesson_id, seconds):
+        with self._lock:
+            # Gộp: chỉ giữ vị trí cuối cùng của mỗi (user, lesson)
+            self._pending[(user_id, lesson_id)] = seconds
+            size = len(self._pending)
+
+        self._start_worker()
+        if size >= settings.PROGRESS_BUFFER_MAX_SIZE:
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+
+            try:
+                return save_positions(pending)
+            except Exception:
+                # Trả lại buffer để thử ở lần flush sau (không ghi đè giá trị mới hơn đã đến trong lúc flush)
+                with self._lock:
+                    for key, seconds in pending.items():
+                        self._pending.setdefault(key, seconds)
+                raise
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def shutdown(self):
+        self._stopped.set()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Could not flush progress buffer on shutdown")
+
+    def _start_worker(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='progress-buffer-flush', daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def _run(self):
+        while not self._stopped.wait(settings.PROGRESS_FLUSH_INTERVAL):
+            # Thread nền giữ connection riêng -> tuân theo CONN_MAX_AGE như 1 request bình thường
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Could not flush progress buffer")
+
+
+progress_buffer = ProgressBuffer()
+
+
+def record_position(user_id, lesson_id, seconds):
+    """Điểm vào duy nhất cho heartbeat: ghi vào buffer hoặc ghi thẳng DB nếu tắt buffer."""
+    if settings.PROGRESS_BUFFER_ENABLED:
+        progress_buffer.add(user_id, lesson_id, seconds)
+    else:
+        save_positions({(user_id, lesson_id): seconds})
+
+
+def course_progress_queryset(user):
+    """
+    Course kèm tiến độ của user, tính trong 1 câu SQL (subquery tương quan trên UserLessonProgress
+    JOIN Lesson/Module, dùng index (user, lesson) của bảng tiến độ):
+    total_lessons, completed_lessons, last_lesson_id/title, resume_position, last_watched_at.
+    Bài đã hoàn thành trong bảng lưu trữ (ArchivedLessonProgress) cũng được tính, bài học/mốc thời gian
+    lấy từ bảng lưu trữ khi user không còn tiến độ nào trong bảng chính.
+    """
+    progress = UserLessonProgress.objects.filter(
+        user_id=user.pk, lesson__module__course=OuterRef('pk'),
+    ).order_by()
+    latest = progress.order_by('-updated_at', '-id')
+    archived = ArchivedLessonProgress.objects.filter(user_id=user.pk, course=OuterRef('pk')).order_by()
+    # Bài đã lưu trữ nhưng user hoàn thành lại sau đó chỉ được đếm 1 lần
+    archived_only = archived.exclude(Exists(UserLessonProgress.objects.filter(
+        user_id=user.pk, lesson=OuterRef('lesson'), is_completed=True,
+    )))
+    latest_archived = archived.order_by('-completed_at', '-id')
+
+    # Query gốc là Course (model catalog) nhưng đọc tiến độ của user -> luôn chạy trên primary, không dùng replica
+    return Course.objects.using(DEFAULT_DB_ALIAS).annotate(
+        total_lessons=Coalesce(F('stats__lesson_count'), Value(0)),
+        completed_lessons=Coalesce(
+            Subquery(progress.filter(is_completed=True).values('user').annotate(c=Count('id')).values('c')),
+            Value(0),
+        ) + Coalesce(
+            Subquery(archived_only.values('user').annotate(c=Count('id')).values('c')),
+            Value(0),
+        ),
+        last_lesson_id=Coalesce(
+            Subquery(latest.values('lesson_id')[:1]), Subquery(latest_archived.values('lesson_id')[:1]),
+        ),
+        last_lesson_title=Coalesce(
+            Subquery(latest.values('lesson__title')[:1]), Subquery(latest_archived.values('lesson__title')[:1]),
+        ),
+        resume_position=Subquery(latest.values('last_watched_position')[:1]),
+        last_watched_at=Coalesce(
+            Subquery(latest.values('updated_at')[:1]), Subquery(latest_archived.values('completed_at')[:1]),
+        ),
+    )
+
+
+def archive_progress_batch(queryset, after_pk=0, batch_size=1000):
+    """
+    Chuyển tối đa batch_size dòng tiến độ (của queryset, có pk > after_pk) sang ArchivedLessonProgress
+    trong 1 transaction ngắn: bài đã hoàn thành được ghi vào bảng lưu trữ, mọi dòng được xóa khỏi bảng chính.
+    - Duyệt theo khóa chính (keyset) nên mỗi lô chỉ khóa đúng các dòng của nó, không khóa cả bảng.
+    - PostgreSQL: dòng đang bị request khác ghi (FOR UPDATE SKIP LOCKED) được bỏ qua, lần chạy sau sẽ xử lý.
+    Trả về (pk lớn nhất đã xét, số dòng đã xóa, số bài hoàn thành đã lưu trữ), hoặc None khi hết dữ liệu.
+    """
+    connection, _ = _progress_table()
+    with transaction.atomic(using=connection.alias):
+        rows = list(
+            queryset.using(connection.alias)
+                    .filter(pk__gt=after_pk)
+                    .order_by('pk')
+                    .only('pk', 'user_id', 'lesson_id', 'is_completed', 'updated_at')
+                    .annotate(archive_course_id=F('lesson__module__course_id'))
+                    .select_for_update(of=('self',), skip_locked=True)[:batch_size]
+        )
+        if not rows:
+            return None
+        archived = [
+            ArchivedLessonProgress(
+                user_id=row.user_id, course_id=row.archive_course_id, lesson_id=row.lesson_id,
+                completed_at=row.updated_at,
+            )
+            for row in rows if row.is_completed
+        ]
+        # Bài đã có trong bảng lưu trữ (lưu trữ lại sau khi user quay lại học) -> giữ bản cũ
+        ArchivedLessonProgress.objects.using(connection.alias).bulk_create(archived, ignore_conflicts=True)
+        deleted, _ = UserLessonProgress.objects.using(connection.alias).filter(
+            pk__in=[row.pk for row in rows]
+        ).delete()
+    return rows[-1].pk, deleted, len(archived)
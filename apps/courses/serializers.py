@@ -1,6 +1,7 @@
+from drf_spectacular.utils import extend_schema_field, inline_serializer
 from rest_framework import serializers
-from .models import Course, Module, Lesson, Category, Review, UserLessonProgress
-from apps.enrollments.models import Enrollment
+from .models import ArchivedLessonProgress, Course, CourseStats, Module, Lesson, Category, Review, UserLessonProgress
+from apps.enrollments.services import has_course_access
 
 # --- 1. Hỗ trợ Serializers (Category, Review) ---
 
@@ -16,6 +17,18 @@ class ReviewSerializer(serializers.ModelSerializer):
         model = Review
         fields = ['id', 'user', 'rating', 'comment', 'created_at']
 
+class SparseFieldsetMixin:
+    """
+    Chỉ giữ lại các field có trong context['fields'] (nếu có), VD: ?fields=id,title,slug.
+    Với many=True, context được truyền xuống child serializer nên mixin áp dụng cho từng phần tử.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 # --- 2. Lesson Serializer (Cấp nhỏ nhất) ---
 
 class LessonSerializer(serializers.ModelSerializer):
@@ -35,36 +48,35 @@ class LessonSerializer(serializers.ModelSerializer):
         Kiểm tra xem User đang login đã học xong bài này chưa.
         Lấy user từ context request.
         """
+        # Bản dùng chung cho mọi user (để lưu cache): trạng thái học được áp lại sau (apply_user_state)
+        if self.context.get('user_independent'):
+            return False
+
+        # Nếu View đã tính sẵn tập lesson đã hoàn thành (1 query cho cả khóa) -> tra cứu trong bộ nhớ
+        completed_lesson_ids = self.context.get('completed_lesson_ids')
+        if completed_lesson_ids is not None:
+            return obj.id in completed_lesson_ids
+
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            # Lưu ý: Cách query này đơn giản nhưng có thể gây chậm nếu danh sách quá dài (N+1 query).
-            # Ở phần Views, chúng ta sẽ tối ưu bằng prefetch_related sau.
-            return UserLessonProgress.objects.filter(user=request.user, lesson=obj, is_completed=True).exists()
+            # Fallback khi serializer được dùng lẻ (không có context tính sẵn): 1 query / lesson
+            if UserLessonProgress.objects.filter(user_id=request.user.pk, lesson=obj, is_completed=True).exists():
+                return True
+            return ArchivedLessonProgress.objects.filter(user_id=request.user.pk, lesson=obj).exists()
         return False
     
     def to_representation(self, instance):
         data = super().to_representation(instance)
+        if self.context.get('user_independent'):
+            # Giữ nguyên video_url: quyền xem được kiểm tra lại cho từng user trong apply_user_state
+            return data
+
         request = self.context.get('request')
-        
-        # Mặc định: Không cho xem link video
-        allow_access = False
-
-        if instance.is_preview:
-             allow_access = True
-        elif request and request.user.is_authenticated:
-            # Lấy User từ request
-            user = request.user
-            
-            # Logic tối ưu: Kiểm tra xem user có enrollment cho Course chứa lesson này không
-            # Lưu ý: instance.module.course truy cập ngược lên cha
-            # Để tránh query DB liên tục, nên cache enrollment vào request nếu có thể (Advanced)
-            # Nhưng ở mức MVP, query này chấp nhận được.
-            if Enrollment.objects.filter(user=user, course=instance.module.course).exists():
-                allow_access = True
-            
-            # Nếu user là admin/staff -> Cho xem luôn
-            if user.is_staff:
-                allow_access = True
+        # Dùng course_id thay vì instance.module.course để không phải load Course.
+        # Tập khóa học đã mua được tra trong cache + memo của request (apps.enrollments.services)
+        allow_access = instance.is_preview or (
+            request is not None and has_course_access(request.user, instance.module.course_id, request)
+        )
 
         if not allow_access:
             data.pop('video_url', None)
@@ -72,6 +84,21 @@ class LessonSerializer(serializers.ModelSerializer):
             
         return data
 
+def apply_user_state(data, user, enrolled_course_ids, completed_lesson_ids):
+    """
+    Áp phần dữ liệu theo từng user lên bản chi tiết khóa học dùng chung (đọc từ cache):
+    đánh dấu is_completed và ẩn video_url/video_source của bài học user chưa được xem.
+    Logic quyền giống LessonSerializer.to_representation.
+    """
+    allow_all = user.is_authenticated and (user.is_staff or data['id'] in enrolled_course_ids)
+    for module in data['modules']:
+        for lesson in module['lessons']:
+            lesson['is_completed'] = lesson['id'] in completed_lesson_ids
+            if not (allow_all or lesson['is_preview']):
+                lesson.pop('video_url', None)
+                lesson.pop('video_source', None)
+    return data
+
 # --- 3. Module Serializer (Chứa Lesson) ---
 
 class ModuleSerializer(serializers.ModelSerializer):
@@ -85,29 +112,41 @@ class ModuleSerializer(serializers.ModelSerializer):
 # --- 4. Course Serializers (Root) ---
 
 # Dùng cho trang chủ, trang danh sách (Load nhanh)
-class CourseListSerializer(serializers.ModelSerializer):
+class CourseListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     instructor = serializers.ReadOnlyField(source='instructor.username')
-    total_lessons = serializers.SerializerMethodField()
+    # Các số liệu dưới đây được annotate sẵn trong queryset của View (CourseViewSet.get_list_queryset)
+    total_lessons = serializers.IntegerField(read_only=True)
+    total_duration = serializers.DurationField(read_only=True)
+    enrollment_count = serializers.IntegerField(read_only=True)
+    average_rating = serializers.FloatField(read_only=True)
+    review_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Course
         fields = [
             'id', 'title', 'slug', 'price', 'old_price', 
             'thumbnail', 'level', 'category', 'instructor',
-            'status', 'total_lessons'
+            'status', 'total_lessons', 'total_duration',
+            'enrollment_count', 'average_rating', 'review_count'
         ]
-    
-    def get_total_lessons(self, obj) -> int:
-        # Đếm tổng số bài học qua các module
-        return Lesson.objects.filter(module__course=obj).count()
+
+class RatingSummarySerializer(serializers.Serializer):
+    """Tổng hợp đánh giá, đọc từ CourseStats (tính sẵn) thay vì đếm lại trên bảng Review."""
+    average = serializers.FloatField(source='average_rating', allow_null=True)
+    count = serializers.IntegerField(source='review_count')
+    histogram = serializers.DictField(source='rating_histogram', child=serializers.IntegerField())
 
 # Dùng cho trang chi tiết & trang học (Load đầy đủ)
 class CourseDetailSerializer(serializers.ModelSerializer):
+    # Số review mới nhất nhúng vào trang chi tiết, phần còn lại xem qua /api/courses/{slug}/reviews/
+    LATEST_REVIEWS = 5
+
     category = CategorySerializer(read_only=True)
     instructor = serializers.ReadOnlyField(source='instructor.username')
     modules = ModuleSerializer(many=True, read_only=True) # Nested quan trọng nhất
-    reviews = ReviewSerializer(many=True, read_only=True)
+    rating_summary = serializers.SerializerMethodField()
+    reviews = serializers.SerializerMethodField()
     
     # JSONField không cần khai báo đặc biệt, DRF tự hiểu
     
@@ -118,5 +157,63 @@ class CourseDetailSerializer(serializers.ModelSerializer):
             'what_will_learn', 'requirements', # JSON fields
             'price', 'old_price', 'thumbnail', 'trailer_url',
             'level', 'updated_at', 'category', 'instructor',
-            'modules', 'reviews'
-        ]
\ No newline at end of file
+            'modules', 'rating_summary', 'reviews'
+        ]
+
+    @extend_schema_field(RatingSummarySerializer)
+    def get_rating_summary(self, obj):
+        try:
+            stats = obj.stats
+        except CourseStats.DoesNotExist:
+            stats = CourseStats(course=obj)
+        return RatingSummarySerializer(stats).data
+
+    @extend_schema_field(ReviewSerializer(many=True))
+    def get_reviews(self, obj):
+        # View prefetch sẵn vào latest_reviews (CourseViewSet.get_detail_queryset), fallback: 1 query
+        reviews = getattr(obj, 'latest_reviews', None)
+        if reviews is None:
+            reviews = obj.reviews.select_related('user').order_by('-created_at', '-id')[:self.LATEST_REVIEWS]
+        return ReviewSerializer(reviews, many=True).data
+
+# --- 5. Course Progress (Tổng hợp tiến độ học) ---
+
+class CourseProgressSerializer(serializers.ModelSerializer):
+    # Các số liệu được annotate sẵn bởi progress.course_progress_queryset
+    total_lessons = serializers.IntegerField(read_only=True)
+    completed_lessons = serializers.IntegerField(read_only=True)
+    percent = serializers.SerializerMethodField()
+    last_lesson = serializers.SerializerMethodField()
+    resume_position = serializers.IntegerField(read_only=True)
+    last_watched_at = serializers.DateTimeField(read_only=True)
+
+    class Meta:
+        model = Course
+        fields = [
+            'id', 'title', 'slug', 'thumbnail',
+            'total_lessons', 'completed_lessons', 'percent',
+            'last_lesson', 'resume_position', 'last_watched_at'
+        ]
+
+    def get_percent(self, obj) -> float:
+        if not obj.total_lessons:
+            return 0.0
+        return round(obj.completed_lessons * 100 / obj.total_lessons, 1)
+
+    @extend_schema_field(inline_serializer(
+        name='LastLesson',
+        fields={'id': serializers.IntegerField(), 'title': serializers.CharField()},
+        allow_null=True,
+    ))
+    def get_last_lesson(self, obj):
+        if obj.last_lesson_id is None:
+            return None
+        return {'id': obj.last_lesson_id, 'title': obj.last_lesson_title}
+
+# --- 6. Progress Sync (Đồng bộ tiến độ theo lô từ client offline) ---
+
+class ProgressEventSerializer(serializers.Serializer):
+    lesson_id = serializers.IntegerField(min_value=1)
+    seconds = serializers.IntegerField(min_value=0)
+    completed = serializers.BooleanField(default=False)
+    client_ts = serializers.DateTimeField(required=False) # Thời điểm sự kiện xảy ra ở client, dùng để sắp thứ tự
@@ -1,3 +1,1267 @@
-from django.test import TestCase
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from apps.enrollments.models import Enrollment
+from apps.users.authentication import UserAccessToken, UserRefreshToken
+from .admin_tools import EstimatedCountPaginator
+from .cache import get_cache_stats
+from .models import ArchivedLessonProgress, Category, Course, CourseStats, Module, Lesson, Review, UserLessonProgress
+from .progress import ProgressBuffer, course_progress_queryset, mark_completed, record_position, upsert_progress
+from .serializers import CourseDetailSerializer, CourseListSerializer
+from .views import CourseViewSet
+
+
+def create_course(slug='python-co-ban', modules=1, lessons_per_module=3, **kwargs):
+    instructor, _ = User.objects.get_or_create(username='instructor')
+    category, _ = Category.objects.get_or_create(slug='lap-trinh', defaults={'title': 'Lập trình'})
+    course = Course.objects.create(
+        instructor=instructor,
+        category=kwargs.pop('category', category),
+        title=slug,
+        slug=slug,
+        description=kwargs.pop('description', 'Mô tả'),
+        about=kwargs.pop('about', 'Nội dung'),
+        thumbnail='courses/thumbnails/test.jpg',
+        status=kwargs.pop('status', 'published'),
+        **kwargs,
+    )
+    for m in range(modules):
+        module = Module.objects.create(course=course, title=f'Chương {m + 1}', order=m)
+        for n in range(lessons_per_module):
+            Lesson.objects.create(
+                module=module,
+                title=f'Bài {n + 1}',
+                slug=f'bai-{n + 1}',
+                order=n,
+                duration=timedelta(minutes=10),
+                is_preview=(n == 0),
+            )
+    return course
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class LessonCompletionTests(TestCase):
+    def setUp(self):
+        self.course = create_course()
+        self.lessons = list(Lesson.objects.filter(module__course=self.course).order_by('order'))
+        self.user = User.objects.create_user('hocvien', password='matkhau123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def complete(self, lesson_id):
+        return self.client.post(f'/api/lessons/{lesson_id}/complete/')
+
+    def test_complete_is_a_single_statement(self):
+        with self.assertNumQueries(1):
+            response = self.complete(self.lessons[0].pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'Marked as completed')
+        self.assertTrue(UserLessonProgress.objects.get(user=self.user, lesson=self.lessons[0]).is_completed)
+
+    def test_complete_twice_reports_already_completed(self):
+        self.complete(self.lessons[0].pk)
+        response = self.complete(self.lessons[0].pk)
+        self.assertEqual(response.data['status'], 'Already completed')
+        self.assertEqual(UserLessonProgress.objects.filter(user=self.user).count(), 1)
+
+    def test_complete_keeps_watch_position(self):
+        UserLessonProgress.objects.create(user=self.user, lesson=self.lessons[0], last_watched_position=42)
+        self.complete(self.lessons[0].pk)
+        progress = UserLessonProgress.objects.get(user=self.user, lesson=self.lessons[0])
+        self.assertTrue(progress.is_completed)
+        self.assertEqual(progress.last_watched_position, 42)
+
+    def test_complete_unknown_lesson_returns_404(self):
+        self.assertEqual(self.complete(999999).status_code, 404)
+        self.assertFalse(UserLessonProgress.objects.exists())
+
+    def test_position_upsert_never_regresses_completion(self):
+        mark_completed(self.user.pk, self.lessons[0].pk)
+        upsert_progress([(self.user.pk, self.lessons[0].pk, False, 120)])
+        progress = UserLessonProgress.objects.get(user=self.user, lesson=self.lessons[0])
+        self.assertTrue(progress.is_completed)
+        self.assertEqual(progress.last_watched_position, 120)
+
+
+@override_settings(PROGRESS_BUFFER_MAX_SIZE=100)
+class ProgressBufferTests(TestCase):
+    """Flush được gọi đồng bộ trong test, thread nền không được khởi động."""
+
+    def setUp(self):
+        patcher = mock.patch.object(ProgressBuffer, '_start_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.buffer = ProgressBuffer()
+        self.course = create_course()
+        self.lessons = list(Lesson.objects.filter(module__course=self.course).order_by('order'))
+        self.user = User.objects.create_user('hocvien', password='matkhau123')
+
+    def positions(self):
+        return dict(UserLessonProgress.objects.filter(user=self.user).values_list('lesson_id', 'last_watched_position'))
+
+    def test_repeated_positions_are_coalesced(self):
+        for seconds in (10, 20, 30):
+            self.buffer.add(self.user.pk, self.lessons[0].pk, seconds)
+        self.buffer.add(self.user.pk, self.lessons[1].pk, 5)
+        self.assertEqual(self.buffer.pending_count(), 2)
+        self.assertFalse(UserLessonProgress.objects.exists())
+
+        with self.assertNumQueries(3):
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.positions(), {self.lessons[0].pk: 30, self.lessons[1].pk: 5})
+        self.assertEqual(self.buffer.pending_count(), 0)
+
+    @override_settings(PROGRESS_BUFFER_MAX_SIZE=2)
+    def test_full_buffer_is_flushed_immediately(self):
+        self.buffer.add(self.user.pk, self.lessons[0].pk, 10)
+        self.assertFalse(UserLessonProgress.objects.exists())
+        self.buffer.add(self.user.pk, self.lessons[1].pk, 20)
+        self.assertEqual(self.buffer.pending_count(), 0)
+        self.assertEqual(self.positions(), {self.lessons[0].pk: 10, self.lessons[1].pk: 20})
+
+    def test_shutdown_flushes_pending_positions(self):
+        self.buffer.add(self.user.pk, self.lessons[0].pk, 42)
+        self.buffer.shutdown()
+        self.assertEqual(self.positions(), {self.lessons[0].pk: 42})
+
+    def test_unknown_users_and_lessons_are_skipped(self):
+        self.buffer.add(self.user.pk, 999999, 10)
+        self.buffer.add(999999, self.lessons[0].pk, 10)
+        self.buffer.add(self.user.pk, self.lessons[0].pk, 15)
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.positions(), {self.lessons[0].pk: 15})
+
+    def test_failed_flush_keeps_newer_positions(self):
+        self.buffer.add(self.user.pk, self.lessons[0].pk, 10)
+        with mock.patch('apps.courses.progress.save_positions', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+        self.buffer.add(self.user.pk, self.lessons[0].pk, 20)
+        self.buffer.flush()
+        self.assertEqual(self.positions(), {self.lessons[0].pk: 20})
+
+    def test_buffered_position_never_undoes_completion(self):
+        lesson = self.lessons[0]
+        self.buffer.add(self.user.pk, lesson.pk, 50)
+        # "complete" được ghi thẳng DB trong lúc vị trí xem còn nằm trong buffer
+        self.assertTrue(mark_completed(self.user.pk, lesson.pk))
+        self.buffer.flush()
+        progress = UserLessonProgress.objects.get(user=self.user, lesson=lesson)
+        self.assertTrue(progress.is_completed)
+        self.assertEqual(progress.last_watched_position, 50)
+
+    @override_settings(PROGRESS_BUFFER_ENABLED=False)
+    def test_record_position_writes_directly_when_disabled(self):
+        record_position(self.user.pk, self.lessons[0].pk, 12)
+        self.assertEqual(self.positions(), {self.lessons[0].pk: 12})
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ProgressSyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = create_course()
+        self.other = create_course('khoa-khac')
+        self.lessons = list(Lesson.objects.filter(module__course=self.course).order_by('order'))
+        self.other_lessons = list(Lesson.objects.filter(module__course=self.other).order_by('order'))
+        self.user = User.objects.create_user('hocvien', password='matkhau123')
+        Enrollment.objects.create(user=self.user, course=self.course)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, events):
+        response = self.client.post('/api/progress/sync/', events, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [result['status'] for result in response.data['results']]
+
+    def progress(self, lesson):
+        return UserLessonProgress.objects.filter(user=self.user, lesson=lesson) \
+                                         .values_list('is_completed', 'last_watched_position').first()
+
+    def test_status_per_event(self):
+        statuses = self.sync([
+            {'lesson_id': self.lessons[0].pk, 'seconds': 30},
+            {'lesson_id': self.lessons[1].pk, 'seconds': -1},
+            {'lesson_id': 999999, 'seconds': 10},
+            {'lesson_id': self.other_lessons[1].pk, 'seconds': 10},
+            # Bài học thử của khóa chưa đăng ký vẫn được ghi
+            {'lesson_id': self.other_lessons[0].pk, 'seconds': 10, 'completed': True},
+            'khong-phai-object',
+        ])
+        self.assertEqual(statuses, ['applied', 'invalid', 'not_found', 'forbidden', 'applied', 'invalid'])
+        self.assertEqual(self.progress(self.lessons[0]), (False, 30))
+        self.assertEqual(self.progress(self.other_lessons[0]), (True, 10))
+        self.assertIsNone(self.progress(self.other_lessons[1]))
+
+    def test_events_are_merged_by_client_ts(self):
+        lesson = self.lessons[0].pk
+        self.sync([
+            {'lesson_id': lesson, 'seconds': 300, 'client_ts': '2030-01-01T10:05:00Z'},
+            {'lesson_id': lesson, 'seconds': 100, 'client_ts': '2030-01-01T10:00:00Z', 'completed': True},
+            {'lesson_id': lesson, 'seconds': 200, 'client_ts': '2030-01-01T10:02:00Z'},
+        ])
+        self.assertEqual(self.progress(self.lessons[0]), (True, 300))
+
+    def test_events_without_client_ts_are_the_latest(self):
+        lesson = self.lessons[0].pk
+        statuses = self.sync([
+            {'lesson_id': lesson, 'seconds': 100, 'client_ts': '2030-01-01T10:00:00Z'},
+            {'lesson_id': lesson, 'seconds': 250},
+            {'lesson_id': lesson, 'seconds': 300, 'client_ts': '2030-01-01T10:05:00Z', 'completed': True},
+            {'lesson_id': lesson, 'seconds': 200, 'client_ts': '2030-01-01T10:02:00Z'},
+        ])
+        self.assertEqual(statuses, ['applied'] * 4)
+        self.assertEqual(self.progress(self.lessons[0]), (True, 250))
+
+    def test_old_offline_events_do_not_overwrite_newer_progress(self):
+        lesson = self.lessons[0]
+        upsert_progress([(self.user.pk, lesson.pk, False, 600)])
+        statuses = self.sync([
+            {'lesson_id': lesson.pk, 'seconds': 50, 'client_ts': '2020-01-01T10:00:00Z'},
+            {'lesson_id': lesson.pk, 'seconds': 60, 'client_ts': '2020-01-01T10:01:00Z', 'completed': True},
+        ])
+        self.assertEqual(statuses, ['stale', 'applied'])
+        self.assertEqual(self.progress(lesson), (True, 600))
+
+    def test_events_newer_than_stored_progress_or_without_client_ts_are_applied(self):
+        upsert_progress([(self.user.pk, self.lessons[0].pk, False, 600), (self.user.pk, self.lessons[1].pk, False, 600)])
+        future = (timezone.now() + timedelta(minutes=1)).isoformat()
+        statuses = self.sync([
+            {'lesson_id': self.lessons[0].pk, 'seconds': 700, 'client_ts': future},
+            {'lesson_id': self.lessons[1].pk, 'seconds': 10},
+        ])
+        self.assertEqual(statuses, ['applied', 'applied'])
+        self.assertEqual(self.progress(self.lessons[0]), (False, 700))
+        self.assertEqual(self.progress(self.lessons[1]), (False, 10))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ConcurrentCompletionTests(TransactionTestCase):
+    """Nhiều request song song cho cùng (user, lesson) không được gây lỗi trùng khóa unique."""
+
+    THREADS = 8
+
+    def test_parallel_complete_requests(self):
+        course = create_course()
+        lesson = Lesson.objects.filter(module__course=course).first()
+        user = User.objects.create_user('hocvien', password='matkhau123')
+
+        barrier = threading.Barrier(self.THREADS)
+        responses = []
+        errors = []
+
+        def tap():
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                barrier.wait()
+                responses.append(client.post(f'/api/lessons/{lesson.pk}/complete/'))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=tap) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual([r.status_code for r in responses], [200] * self.THREADS)
+        statuses = sorted(r.data['status'] for r in responses)
+        self.assertEqual(statuses.count('Marked as completed'), 1)
+        self.assertEqual(UserLessonProgress.objects.filter(user=user, lesson=lesson).count(), 1)
+
+
+class QueryPlanTests(TestCase):
+    """
+    Chạy EXPLAIN cho các query nóng (CourseViewSet, trạng thái học của LessonSerializer, kiểm tra enrollment)
+    trên dữ liệu mẫu và fail nếu planner phải quét tuần tự (sequential scan) cả bảng.
+    - SQLite: EXPLAIN QUERY PLAN không được có dòng "SCAN <bảng>" (không kèm index).
+    - PostgreSQL: tắt enable_seqscan, nếu plan vẫn còn "Seq Scan" nghĩa là không có index dùng được.
+    """
+    TABLE_PATTERN = re.compile(r'^(courses_|enrollments_|auth_user)')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.courses = [create_course(f'khoa-hoc-{i}', modules=3, lessons_per_module=5) for i in range(20)]
+        cls.course = cls.courses[0]
+        cls.user = User.objects.create_user('hocvien', password='matkhau123')
+        for course in cls.courses[:10]:
+            Enrollment.objects.create(user=cls.user, course=course)
+        for lesson in Lesson.objects.filter(module__course__in=cls.courses[:5]):
+            UserLessonProgress.objects.create(user=cls.user, lesson=lesson, is_completed=lesson.order % 2 == 0)
+
+    def view_queryset(self, action, url='/api/courses/', user=None):
+        request = APIRequestFactory().get(url)
+        if user is not None:
+            force_authenticate(request, user)
+        view = CourseViewSet(action_map={'get': action})
+        view.action = action
+        view.format_kwarg = None
+        view.kwargs = {}
+        view.request = view.initialize_request(request)
+        return view.filter_queryset(view.get_queryset())
+
+    def sequential_scans(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+            try:
+                plan = json.loads(queryset.explain(format='json'))
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET enable_seqscan = on')
+            scans = []
+            nodes = [plan[0]['Plan']]
+            while nodes:
+                node = nodes.pop()
+                if node['Node Type'] == 'Seq Scan':
+                    scans.append(node['Relation Name'])
+                nodes.extend(node.get('Plans', []))
+            return [table for table in scans if self.TABLE_PATTERN.match(table)]
+
+        scans = []
+        for line in queryset.explain().splitlines():
+            match = re.search(r'\bSCAN (\w+)(.*)', line)
+            if match and 'USING' not in match.group(2) and self.TABLE_PATTERN.match(match.group(1)):
+                scans.append(match.group(1))
+        return scans
+
+    def assertIndexOnly(self, queryset):
+        scans = self.sequential_scans(queryset)
+        self.assertEqual(scans, [], f"Sequential scan on {scans}:\n{queryset.explain()}")
+
+    def test_course_list(self):
+        self.assertIndexOnly(self.view_queryset('list')[:20])
+
+    def test_course_list_with_filters(self):
+        for params in (
+            'category=lap-trinh&level=beginner',
+            'is_featured=true',
+            'min_price=10&max_price=100',
+            'instructor=instructor',
+            'fields=id,title,slug&pagination=cursor',
+        ):
+            with self.subTest(params=params):
+                self.assertIndexOnly(self.view_queryset('list', f'/api/courses/?{params}')[:20])
+
+    def test_course_retrieve_lookup(self):
+        self.assertIndexOnly(self.view_queryset('retrieve').filter(slug=self.course.slug))
+
+    def test_course_detail_prefetch(self):
+        module_ids = list(self.course.modules.values_list('id', flat=True))
+        self.assertIndexOnly(Module.objects.filter(course__in=[self.course.pk]))
+        self.assertIndexOnly(Lesson.objects.filter(module__in=module_ids))
+
+    def test_course_reviews_page(self):
+        reviews = Review.objects.filter(course=self.course).order_by('-created_at', '-id')
+        self.assertIndexOnly(reviews[:20])
+        self.assertIndexOnly(reviews.filter(created_at__lt=timezone.now())[:20])
+
+    def test_completed_lessons_for_lesson_serializer(self):
+        self.assertIndexOnly(
+            UserLessonProgress.objects.filter(
+                user=self.user, is_completed=True, lesson__module__course=self.course,
+            ).values_list('lesson_id', 'updated_at')
+        )
+
+    def test_enrollment_checks(self):
+        self.assertIndexOnly(Enrollment.objects.filter(user=self.user).values_list('course_id', flat=True))
+        self.assertIndexOnly(Enrollment.objects.filter(user=self.user, course=self.course))
+
+    def test_progress_summary(self):
+        self.assertIndexOnly(course_progress_queryset(self.user).filter(enrollments__user=self.user))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CourseViewSetQuerysetTests(TestCase):
+    """Mỗi action của CourseViewSet chỉ đọc phần dữ liệu nó cần (xem CourseViewSet.get_queryset)."""
+
+    def setUp(self):
+        cache.clear()
+        self.course = create_course(modules=2, lessons_per_module=3)
+        self.user = User.objects.create_user('hocvien', password='matkhau123')
+        self.client = APIClient()
+
+    def capture(self, method, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url)
+        return response, [query['sql'] for query in ctx.captured_queries]
+
+    def test_enroll_reads_only_a_few_course_columns(self):
+        self.client.force_authenticate(self.user)
+        response, queries = self.capture('post', f'/api/courses/{self.course.slug}/enroll/')
+        self.assertEqual(response.status_code, 201)
+
+        selects = [sql for sql in queries if sql.startswith('SELECT') and 'FROM "courses_course"' in sql]
+        self.assertEqual(len(selects), 1)
+        columns = selects[0][len('SELECT '):selects[0].index(' FROM ')]
+        self.assertEqual(
+            columns, '"courses_course"."id", "courses_course"."price", "courses_course"."status"',
+        )
+        self.assertFalse([sql for sql in queries if 'courses_module' in sql or 'courses_lesson' in sql])
+
+    def test_list_does_not_prefetch_the_tree(self):
+        response, queries = self.capture('get', '/api/courses/')
+        self.assertEqual(response.status_code, 200)
+        for table in ('courses_module', 'courses_lesson', 'courses_review'):
+            self.assertFalse([sql for sql in queries if f'FROM "{table}"' in sql], table)
+
+    def test_retrieve_cold_cache_query_count_does_not_grow_with_tree(self):
+        def cold_retrieve(course):
+            cache.clear()
+            response, queries = self.capture('get', f'/api/courses/{course.slug}/')
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        big = create_course('khoa-hoc-lon', modules=5, lessons_per_module=10)
+        Review.objects.create(course=self.course, user=self.user, rating=5, comment='Hay')
+        Review.objects.create(course=big, user=self.user, rating=4, comment='Tốt')
+        self.assertEqual(cold_retrieve(self.course), cold_retrieve(big))
+
+    def test_retrieve_tree_is_ordered(self):
+        module = Module.objects.create(course=self.course, title='Chương đầu', order=0)
+        Lesson.objects.create(module=module, title='Sau', slug='sau', order=2)
+        Lesson.objects.create(module=module, title='Trước', slug='truoc', order=1)
+        other = User.objects.create_user('hocvien-2', password='matkhau123')
+        Review.objects.create(course=self.course, user=self.user, rating=5, comment='Cũ')
+        Review.objects.create(course=self.course, user=other, rating=4, comment='Mới')
+
+        data = self.client.get(f'/api/courses/{self.course.slug}/').data
+        orders = [(m['order'], m['id']) for m in data['modules']]
+        self.assertEqual(orders, sorted(orders))
+        first = next(m for m in data['modules'] if m['id'] == module.pk)
+        self.assertEqual([lesson['title'] for lesson in first['lessons']], ['Trước', 'Sau'])
+        self.assertEqual([review['comment'] for review in data['reviews']], ['Mới', 'Cũ'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CourseListPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        for index, price in enumerate([20, 10, 30, 10, 25]):
+            create_course(f'khoa-hoc-{index}', modules=0, price=price)
+
+    def walk(self, url):
+        results = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertNotIn('count', response.data)
+            results.extend(response.data['results'])
+            url = response.data['next']
+        return results
+
+    def test_fields_limits_payload(self):
+        data = self.client.get('/api/courses/?fields=id,slug,khong-ton-tai').data
+        self.assertEqual(data['count'], 5)
+        self.assertEqual({tuple(course) for course in data['results']}, {('id', 'slug')})
+
+        unknown = self.client.get('/api/courses/?fields=khong-ton-tai').data['results'][0]
+        self.assertEqual(list(unknown), CourseListSerializer.Meta.fields)
+
+    def test_cursor_pages_cover_every_course_once(self):
+        slugs = [course['slug'] for course in self.walk('/api/courses/?pagination=cursor&page_size=2')]
+        self.assertEqual(slugs, [f'khoa-hoc-{i}' for i in range(4, -1, -1)])
+
+    def test_cursor_keeps_requested_ordering(self):
+        courses = self.walk('/api/courses/?pagination=cursor&page_size=2&ordering=price&fields=slug,price')
+        self.assertEqual([float(course['price']) for course in courses], [10, 10, 20, 25, 30])
+        self.assertEqual([course['slug'] for course in courses[:2]], ['khoa-hoc-1', 'khoa-hoc-3'])
+
+        courses = self.walk('/api/courses/?pagination=cursor&page_size=2&ordering=-title')
+        self.assertEqual([course['slug'] for course in courses], [f'khoa-hoc-{i}' for i in range(4, -1, -1)])
+
+    def test_cursor_with_sparse_fields_selects_ordering_columns(self):
+        for ordering in ('', 'price', '-title', 'created_at'):
+            url = f'/api/courses/?pagination=cursor&page_size=2&fields=slug&ordering={ordering}'
+            while url:
+                # ETag (COUNT/MAX) + 1 trang; không có query nạp lười cột sắp xếp khi tạo con trỏ
+                with self.assertNumQueries(2):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200, ordering)
+                url = response.data['next']
+
+    def test_cursor_rejects_orderings_without_keyset(self):
+        for query in ('ordering=rating', 'ordering=-rating', 'q=khoa'):
+            response = self.client.get(f'/api/courses/?pagination=cursor&{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CourseFilterTests(TestCase):
+    """Kết quả lọc/tìm kiếm/sắp xếp của CourseFilterBackend (test chạy trên SQLite -> q dùng fallback icontains)."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        design = Category.objects.create(slug='thiet-ke', title='Thiết kế')
+        teacher = User.objects.create_user('giang-vien-2', password='matkhau123')
+        create_course('python', modules=0, price=10, level='beginner', description='Lập trình Python nhập môn')
+        create_course('django', modules=0, price=30, old_price=50, level='intermediate', is_featured=True,
+                      description='Xây dựng web với Python')
+        create_course('figma', modules=0, price=20, old_price=40, level='advanced', category=design,
+                      about='Thiết kế giao diện')
+        Course.objects.filter(slug='figma').update(instructor=teacher)
+        create_course('ban-nhap', modules=0, price=15, status='draft', description='Python')
+
+        reviewers = User.objects.bulk_create([User(username=f'nguoi-danh-gia-{i}') for i in range(2)])
+        for slug, ratings in (('python', [3, 4]), ('django', [5])):
+            course = Course.objects.get(slug=slug)
+            for user, rating in zip(reviewers, ratings):
+                Review.objects.create(course=course, user=user, rating=rating, comment='Nhận xét')
+
+    def slugs(self, query):
+        response = self.client.get(f'/api/courses/?fields=slug&{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        return [course['slug'] for course in response.data['results']]
+
+    def test_filters(self):
+        cases = {
+            'category=thiet-ke': {'figma'},
+            'category=lap-trinh': {'python', 'django'},
+            'level=beginner': {'python'},
+            'level=beginner,advanced': {'python', 'figma'},
+            'instructor=giang-vien-2': {'figma'},
+            'instructor=instructor': {'python', 'django'},
+            'is_featured=true': {'django'},
+            'is_featured=0': {'python', 'figma'},
+            'min_price=20': {'django', 'figma'},
+            'max_price=20': {'python', 'figma'},
+            'min_price=15&max_price=25': {'figma'},
+            'min_old_price=45': {'django'},
+            'max_old_price=45': {'figma'},
+            'category=lap-trinh&level=intermediate&max_price=30': {'django'},
+        }
+        for query, expected in cases.items():
+            self.assertEqual(set(self.slugs(query)), expected, query)
+
+    def test_invalid_values_return_400(self):
+        for query in ('is_featured=co', 'min_price=re', 'max_old_price=1,5', 'ordering=level'):
+            self.assertEqual(self.client.get(f'/api/courses/?{query}').status_code, 400, query)
+
+    def test_search_fallback_matches_every_term(self):
+        self.assertEqual(set(self.slugs('q=python')), {'python', 'django'})
+        self.assertEqual(self.slugs('q=PYTHON nhập'), ['python'])
+        self.assertEqual(self.slugs('q=giao diện'), ['figma'])
+        self.assertEqual(self.slugs('q=ruby'), [])
+        self.assertEqual(self.slugs('q=python&level=intermediate'), ['django'])
+
+    def test_ordering(self):
+        self.assertEqual(self.slugs('ordering=price'), ['python', 'figma', 'django'])
+        self.assertEqual(self.slugs('ordering=-price'), ['django', 'figma', 'python'])
+        self.assertEqual(self.slugs('ordering=title'), ['django', 'figma', 'python'])
+        self.assertEqual(self.slugs('ordering=-created_at'), ['figma', 'django', 'python'])
+        # Khóa học chưa có đánh giá luôn ở cuối, cả khi sắp tăng dần
+        self.assertEqual(self.slugs('ordering=-rating'), ['django', 'python', 'figma'])
+        self.assertEqual(self.slugs('ordering=rating'), ['python', 'django', 'figma'])
+        self.assertEqual(self.slugs('q=python&ordering=price'), ['python', 'django'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CurriculumTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = create_course(modules=3, lessons_per_module=4)
+        Lesson.objects.filter(module__course=self.course).update(video_url='https://example.com/video.mp4')
+        Module.objects.create(course=self.course, title='Chương trống', order=10)
+        self.user = User.objects.create_user('hocvien', password='matkhau123')
+        self.client = APIClient()
+
+    def curriculum(self, **headers):
+        response = self.client.get(f'/api/courses/{self.course.slug}/curriculum/', **headers)
+        if response.status_code != 200:
+            return response, None
+        self.assertTrue(response.streaming)
+        return response, json.loads(b''.join(response.streaming_content))
+
+    def test_matches_detail_modules(self):
+        for enrolled in (False, True):
+            with self.subTest(enrolled=enrolled):
+                if enrolled:
+                    Enrollment.objects.create(user=self.user, course=self.course)
+                    mark_completed(self.user.pk, Lesson.objects.filter(module__course=self.course).first().pk)
+                    self.client.force_authenticate(self.user)
+                detail = self.client.get(f'/api/courses/{self.course.slug}/').data
+                _, data = self.curriculum()
+                self.assertEqual((data['id'], data['slug']), (self.course.pk, self.course.slug))
+                self.assertEqual(data['modules'], json.loads(json.dumps(detail['modules'])))
+
+    def test_hides_video_url_without_access(self):
+        _, data = self.curriculum()
+        lessons = [lesson for module in data['modules'] for lesson in module['lessons']]
+        self.assertEqual(len(data['modules']), 4)
+        self.assertEqual(len(lessons), 12)
+        for lesson in lessons:
+            self.assertEqual('video_url' in lesson, lesson['is_preview'])
+
+    def test_query_count_does_not_grow_with_lessons(self):
+        with self.assertNumQueries(3):
+            self.curriculum()
+        module = Module.objects.create(course=self.course, title='Chương lớn', order=5)
+        Lesson.objects.bulk_create([
+            Lesson(module=module, title=f'Bài {n}', slug=f'bai-lon-{n}', order=n) for n in range(500)
+        ])
+        cache.clear()
+        with self.assertNumQueries(3):
+            response, data = self.curriculum()
+        self.assertEqual(sum(len(module['lessons']) for module in data['modules']), 512)
+
+    def test_large_curriculum_is_sent_in_chunks(self):
+        module = Module.objects.create(course=self.course, title='Chương lớn', order=5)
+        Lesson.objects.bulk_create([
+            Lesson(module=module, title=f'Bài {n}', slug=f'bai-lon-{n}', order=n) for n in range(500)
+        ])
+        response = self.client.get(f'/api/courses/{self.course.slug}/curriculum/')
+        self.assertGreater(len(list(response.streaming_content)), 1)
+
+    def test_conditional_get(self):
+        response, _ = self.curriculum()
+        response, _ = self.curriculum(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CourseReviewsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = create_course()
+        self.client = APIClient()
+
+    def add_reviews(self, count, start=0):
+        users = User.objects.bulk_create([User(username=f'nguoi-danh-gia-{start + i}') for i in range(count)])
+        for index, user in enumerate(users):
+            Review.objects.create(course=self.course, user=user, rating=index % 5 + 1, comment=f'Nhận xét {start + index}')
+
+    def test_detail_embeds_summary_and_latest_reviews_only(self):
+        self.add_reviews(12)
+        data = self.client.get(f'/api/courses/{self.course.slug}/').data
+        self.assertEqual(data['rating_summary'], {
+            'average': 33 / 12, 'count': 12, 'histogram': {'1': 3, '2': 3, '3': 2, '4': 2, '5': 2},
+        })
+        self.assertEqual(
+            [review['comment'] for review in data['reviews']],
+            [f'Nhận xét {i}' for i in range(11, 6, -1)],
+        )
+
+        cache.clear()
+        self.add_reviews(40, start=12)
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(f'/api/courses/{self.course.slug}/').data
+        self.assertEqual(len(data['reviews']), CourseDetailSerializer.LATEST_REVIEWS)
+        self.assertEqual(data['rating_summary']['count'], 52)
+        self.assertEqual(len([q for q in ctx.captured_queries if 'FROM "courses_review"' in q['sql']]), 2)
+
+    def test_histogram_follows_review_changes(self):
+        self.add_reviews(5)
+        review = Review.objects.get(comment='Nhận xét 0')
+        review.rating = 5
+        review.save()
+        Review.objects.get(comment='Nhận xét 1').delete()
+        stats = CourseStats.objects.get(course=self.course)
+        self.assertEqual(stats.rating_histogram, {'1': 0, '2': 0, '3': 1, '4': 1, '5': 2})
+        self.assertEqual((stats.review_count, stats.rating_sum), (4, 17))
+        call_command('rebuild_course_stats', '--check', stdout=StringIO())
+
+    def test_reviews_endpoint_uses_keyset_pagination(self):
+        self.add_reviews(45)
+        url = f'/api/courses/{self.course.slug}/reviews/'
+        comments = []
+        while url:
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            comments.extend(review['comment'] for review in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(comments, [f'Nhận xét {i}' for i in range(44, -1, -1)])
+        self.assertEqual(
+            self.client.get(f'/api/courses/{self.course.slug}/reviews/?page_size=1').data['results'][0]['user'],
+            'nguoi-danh-gia-44',
+        )
+
+    def test_reviews_of_draft_course_are_hidden(self):
+        draft = create_course('ban-nhap', status='draft')
+        self.assertEqual(self.client.get(f'/api/courses/{draft.slug}/reviews/').status_code, 404)
+
+
+class CourseStatsTests(TestCase):
+    def setUp(self):
+        self.source = create_course('khoa-nguon', lessons_per_module=3)
+        self.target = create_course('khoa-dich', lessons_per_module=1)
+
+    def lesson_counts(self):
+        stats = CourseStats.objects.in_bulk([self.source.pk, self.target.pk])
+        return stats[self.source.pk].lesson_count, stats[self.target.pk].lesson_count
+
+    def assertNoDrift(self):
+        call_command('rebuild_course_stats', '--check', stdout=StringIO())
+
+    def test_moving_a_module_refreshes_both_courses(self):
+        module = Module.objects.get(course=self.source)
+        module.course = self.target
+        module.save()
+        self.assertEqual(self.lesson_counts(), (0, 4))
+        self.assertNoDrift()
+
+    def test_moving_a_lesson_refreshes_both_courses(self):
+        lesson = Lesson.objects.get(module__course=self.source, slug='bai-3')
+        lesson.module = Module.objects.get(course=self.target)
+        lesson.save()
+        self.assertEqual(self.lesson_counts(), (2, 2))
+        self.assertNoDrift()
+
+    def test_moving_a_review_refreshes_both_courses(self):
+        review = Review.objects.create(
+            course=self.source, user=User.objects.create_user('nguoi-danh-gia'), rating=4, comment='Hay',
+        )
+        review.course = self.target
+        review.save()
+        stats = CourseStats.objects.in_bulk([self.source.pk, self.target.pk])
+        self.assertEqual((stats[self.source.pk].review_count, stats[self.target.pk].review_count), (0, 1))
+        self.assertNoDrift()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CourseDetailCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = create_course()
+        self.other = create_course('khoa-khac')
+        self.client = APIClient()
+
+    def detail(self, course=None):
+        response = self.client.get(f'/api/courses/{(course or self.course).slug}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def lesson_titles(self, course=None):
+        return [lesson['title'] for module in self.detail(course)['modules'] for lesson in module['lessons']]
+
+    def test_second_request_is_a_cache_hit(self):
+        first = self.detail()
+        with self.assertNumQueries(1):
+            second = self.detail()
+        self.assertEqual(first, second)
+        self.assertEqual((get_cache_stats()['hits'], get_cache_stats()['misses']), (1, 1))
+
+    def test_course_edit_invalidates(self):
+        self.detail()
+        self.course.title = 'Tiêu đề mới'
+        self.course.save()
+        self.assertEqual(self.detail()['title'], 'Tiêu đề mới')
+        self.assertEqual(get_cache_stats()['misses'], 2)
+
+    def test_module_edit_invalidates(self):
+        self.detail()
+        module = Module.objects.get(course=self.course)
+        module.title = 'Chương mới'
+        module.save()
+        self.assertEqual(self.detail()['modules'][0]['title'], 'Chương mới')
+
+    def test_lesson_edit_and_delete_invalidate(self):
+        self.detail()
+        lesson = Lesson.objects.get(module__course=self.course, slug='bai-1')
+        lesson.title = 'Bài mở đầu'
+        lesson.save()
+        self.assertEqual(self.lesson_titles(), ['Bài mở đầu', 'Bài 2', 'Bài 3'])
+        lesson.delete()
+        self.assertEqual(self.lesson_titles(), ['Bài 2', 'Bài 3'])
+
+    def test_category_edit_invalidates(self):
+        self.detail()
+        category = self.course.category
+        category.title = 'Danh mục mới'
+        category.save()
+        self.assertEqual(self.detail()['category']['title'], 'Danh mục mới')
+
+    def test_moving_a_lesson_invalidates_both_courses(self):
+        self.detail()
+        self.detail(self.other)
+        lesson = Lesson.objects.get(module__course=self.course, slug='bai-3')
+        lesson.module = Module.objects.get(course=self.other)
+        lesson.slug = 'bai-chuyen-sang'
+        lesson.save()
+        self.assertEqual(self.lesson_titles(), ['Bài 1', 'Bài 2'])
+        self.assertEqual(self.lesson_titles(self.other), ['Bài 1', 'Bài 2', 'Bài 3', 'Bài 3'])
+
+    def test_moving_a_module_invalidates_both_courses(self):
+        self.detail()
+        self.detail(self.other)
+        module = Module.objects.get(course=self.course)
+        module.course = self.other
+        module.order = 1
+        module.save()
+        self.assertEqual(self.detail()['modules'], [])
+        self.assertEqual(len(self.detail(self.other)['modules']), 2)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = create_course()
+        self.other = create_course('khoa-khac')
+        self.user = User.objects.create_user('hocvien', password='matkhau123')
+        self.client = APIClient()
+
+    def get(self, url, etag=None, **headers):
+        if etag is not None:
+            headers['HTTP_IF_NONE_MATCH'] = etag
+        return self.client.get(url, **headers)
+
+    def test_list_not_modified_until_the_list_changes(self):
+        response = self.get('/api/courses/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(self.get('/api/courses/', etag).status_code, 304)
+
+        Course.objects.filter(pk=self.other.pk).update(status='draft')
+        response = self.get('/api/courses/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([course['slug'] for course in response.data['results']], [self.course.slug])
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_changes_when_a_course_is_deleted(self):
+        etag = self.get('/api/courses/')['ETag']
+        self.other.delete()
+        self.assertEqual(self.get('/api/courses/', etag).status_code, 200)
+
+    def test_if_modified_since_alone_never_returns_304(self):
+        since = 'Fri, 01 Jan 2100 00:00:00 GMT'
+        self.assertEqual(self.get('/api/courses/', HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+        self.assertEqual(self.get(f'/api/courses/{self.course.slug}/', HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+
+    def test_detail_changes_after_enrolling(self):
+        self.client.force_authenticate(self.user)
+        url = f'/api/courses/{self.course.slug}/'
+        response = self.get(url)
+        self.assertNotIn('video_url', response.data['modules'][0]['lessons'][1])
+        etag = response['ETag']
+        self.assertEqual(self.get(url, etag).status_code, 304)
+
+        self.assertEqual(self.client.post(f'{url}enroll/').status_code, 201)
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('video_url', response.data['modules'][0]['lessons'][1])
+
+    def test_detail_changes_after_a_lesson_is_deleted(self):
+        url = f'/api/courses/{self.course.slug}/'
+        etag = self.get(url)['ETag']
+        Lesson.objects.filter(module__course=self.course, slug='bai-3').delete()
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['modules'][0]['lessons']), 2)
+
+    def test_detail_changes_after_completing_a_lesson(self):
+        self.client.force_authenticate(self.user)
+        url = f'/api/courses/{self.course.slug}/'
+        etag = self.get(url)['ETag']
+        mark_completed(self.user.pk, Lesson.objects.get(module__course=self.course, slug='bai-1').pk)
+        self.assertEqual(self.get(url, etag).status_code, 200)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ProgressArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = create_course()
+        self.lessons = list(Lesson.objects.filter(module__course=self.course).order_by('order'))
+        self.user = User.objects.create_user('hocvien', password='matkhau123')
+        Enrollment.objects.create(user=self.user, course=self.course)
+        mark_completed(self.user.pk, self.lessons[0].pk)
+        mark_completed(self.user.pk, self.lessons[1].pk)
+        upsert_progress([(self.user.pk, self.lessons[2].pk, False, 90)])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def archive(self, *args):
+        out = StringIO()
+        call_command('archive_progress', *args, stdout=out)
+        return out.getvalue()
+
+    def make_idle(self, days=400):
+        UserLessonProgress.objects.filter(user=self.user).update(updated_at=timezone.now() - timedelta(days=days))
+
+    def completed_flags(self):
+        response = self.client.get(f'/api/courses/{self.course.slug}/')
+        return [lesson['is_completed'] for lesson in response.data['modules'][0]['lessons']]
+
+    def test_idle_users_are_archived_in_batches(self):
+        self.make_idle()
+        active = User.objects.create_user('dang-hoc', password='matkhau123')
+        mark_completed(active.pk, self.lessons[0].pk)
+
+        output = self.archive('--inactive-days', '365', '--batch-size', '1')
+        self.assertIn('Archived 3 progress rows (2 completed lessons kept)', output)
+        self.assertFalse(UserLessonProgress.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            set(ArchivedLessonProgress.objects.filter(user=self.user).values_list('course_id', 'lesson_id')),
+            {(self.course.pk, self.lessons[0].pk), (self.course.pk, self.lessons[1].pk)},
+        )
+        self.assertTrue(UserLessonProgress.objects.filter(user=active).exists())
+
+    def test_archived_completion_is_still_reported(self):
+        self.make_idle()
+        self.archive('--inactive-days', '365')
+        self.assertEqual(self.completed_flags(), [True, True, False])
+
+        progress = self.client.get(f'/api/courses/{self.course.slug}/progress/').data
+        self.assertEqual((progress['completed_lessons'], progress['percent']), (2, 66.7))
+        self.assertEqual(progress['last_lesson']['id'], self.lessons[1].pk)
+        self.assertEqual(self.client.get('/api/me/progress/').data[0]['completed_lessons'], 2)
+
+    def test_completing_an_archived_lesson_again_is_counted_once(self):
+        self.make_idle()
+        self.archive('--inactive-days', '365')
+        mark_completed(self.user.pk, self.lessons[0].pk)
+        mark_completed(self.user.pk, self.lessons[2].pk)
+        self.assertEqual(self.completed_flags(), [True, True, True])
+        self.assertEqual(course_progress_queryset(self.user).get(pk=self.course.pk).completed_lessons, 3)
+
+    def test_archived_courses_and_deactivated_users(self):
+        other = create_course('khoa-cu', status='archived')
+        mark_completed(self.user.pk, Lesson.objects.filter(module__course=other).first().pk)
+        deactivated = User.objects.create_user('da-khoa', password='matkhau123', is_active=False)
+        mark_completed(deactivated.pk, self.lessons[0].pk)
+
+        self.assertIn('2 progress rows would be archived', self.archive('--dry-run'))
+        self.assertEqual(ArchivedLessonProgress.objects.count(), 0)
+
+        self.archive()
+        self.assertEqual(
+            set(ArchivedLessonProgress.objects.values_list('user_id', 'course_id')),
+            {(self.user.pk, other.pk), (deactivated.pk, self.course.pk)},
+        )
+        self.assertEqual(UserLessonProgress.objects.filter(user=self.user).count(), 3)
+
+    def test_recently_active_users_are_kept(self):
+        self.archive('--inactive-days', '365')
+        self.assertEqual(UserLessonProgress.objects.filter(user=self.user).count(), 3)
+        self.assertFalse(ArchivedLessonProgress.objects.exists())
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    # Trang admin cần static; manifest của whitenoise chỉ có sau collectstatic
+    STORAGES={**settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}},
+)
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.course = create_course()
+        self.other = create_course('khoa-khac')
+        self.student = User.objects.create_user('hocvien', password='matkhau123')
+        for lesson in Lesson.objects.all():
+            mark_completed(self.student.pk, lesson.pk)
+        self.client.force_login(User.objects.create_superuser('quantri', password='matkhau123'))
+
+    def test_course_filter_is_a_text_input(self):
+        response = self.client.get('/admin/courses/userlessonprogress/')
+        self.assertContains(response, 'name="course"')
+        # Không liệt kê các khóa học thành danh sách lựa chọn
+        self.assertNotContains(response, '?course=')
+
+    def test_course_filter_accepts_id_or_slug(self):
+        url = '/admin/courses/userlessonprogress/'
+        by_slug = self.client.get(url, {'course': 'khoa-khac', 'is_completed__exact': '1'})
+        by_id = self.client.get(url, {'course': self.other.pk})
+        for response in (by_slug, by_id):
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['cl'].result_count, 3)
+        self.assertContains(by_slug, 'name="is_completed__exact" value="1"')
+
+    def test_foreign_key_widgets_do_not_list_tables(self):
+        response = self.client.get('/admin/courses/userlessonprogress/add/')
+        self.assertContains(response, 'vForeignKeyRawIdAdminField')
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, f'<option value="{self.student.pk}">')
+        response = self.client.get('/admin/autocomplete/', {
+            'app_label': 'courses', 'model_name': 'lesson', 'field_name': 'module', 'term': 'Chương',
+        })
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_exact_count_is_capped(self):
+        class Paginator(EstimatedCountPaginator):
+            MAX_EXACT_COUNT = 4
+
+        paginator = Paginator(UserLessonProgress.objects.order_by('-pk'), 2)
+        self.assertIsNone(paginator.estimated_count())
+        self.assertEqual(paginator.count, 5)
+        self.assertEqual(paginator.num_pages, 3)
+
+
+def seed_catalog(courses=200, students=20, seed=1):
+    """Sinh bộ dữ liệu lớn bằng lệnh seed_data (bulk_create), trả về các khóa học vừa tạo theo thứ tự id."""
+    existing = set(Course.objects.values_list('id', flat=True))
+    call_command(
+        'seed_data', categories=3, courses=courses, modules=3, lessons=5, users=students,
+        enrollments=10, seed=seed, stdout=StringIO(),
+    )
+    return list(Course.objects.exclude(id__in=existing).order_by('id'))
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    PROGRESS_BUFFER_ENABLED=False,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    # Trang admin cần static; manifest của whitenoise chỉ có sau collectstatic
+    STORAGES={**settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}},
+)
+class EndpointBudgetTests(TestCase):
+    """
+    Ngân sách số query (và thời gian) cho mọi route trong backend/urls.py, với 3 vai trò:
+    anonymous, học viên đã đăng ký (enrolled) và staff.
+
+    Mỗi route được gọi 2 lần: trên bộ dữ liệu ban đầu và sau khi dữ liệu tăng thêm (thêm bài học, học viên,
+    review, tiến độ vào chính khóa học đang xem). Số query phải <= ngân sách và KHÔNG được tăng theo dữ liệu
+    -> bắt được N+1 trong serializer.
+    Mọi request chạy trong transaction bị rollback nên các route ghi (enroll, complete, register...) lặp lại được.
+
+    Đặt API_BUDGET_REPORT=1 để in bảng số query / thời gian của từng route.
+    Đặt API_LATENCY_BUDGET_MS=<ms> để fail nếu 1 request chậm hơn ngưỡng (mặc định không kiểm tra thời gian).
+    """
+    ROLES = ('anonymous', 'enrolled', 'staff')
+
+    # (tên, method, url, body, {vai trò: (status, số query tối đa)})
+    ROUTES = (
+        ('course-list', 'get', '/api/courses/', None,
+         {'anonymous': (200, 3), 'enrolled': (200, 3), 'staff': (200, 3)}),
+        ('course-list-cursor', 'get', '/api/courses/?pagination=cursor&fields=id,title,slug,price', None,
+         {'anonymous': (200, 2), 'enrolled': (200, 2), 'staff': (200, 2)}),
+        ('course-list-filtered', 'get', '/api/courses/?level=beginner&ordering=-rating&q=học', None,
+         {'anonymous': (200, 3), 'enrolled': (200, 3), 'staff': (200, 3)}),
+        ('course-detail', 'get', '/api/courses/{course}/', None,
+         {'anonymous': (200, 5), 'enrolled': (200, 7), 'staff': (200, 7)}),
+        ('course-curriculum', 'get', '/api/courses/{course}/curriculum/', None,
+         {'anonymous': (200, 3), 'enrolled': (200, 5), 'staff': (200, 5)}),
+        ('course-reviews', 'get', '/api/courses/{course}/reviews/', None,
+         {'anonymous': (200, 2), 'enrolled': (200, 2), 'staff': (200, 2)}),
+        ('course-progress', 'get', '/api/courses/{course}/progress/', None,
+         {'anonymous': (401, 0), 'enrolled': (200, 1), 'staff': (200, 1)}),
+        ('course-enroll', 'post', '/api/courses/{other_course}/enroll/', None,
+         {'anonymous': (401, 0), 'enrolled': (201, 3), 'staff': (201, 3)}),
+        ('course-cache-stats', 'get', '/api/courses/cache-stats/', None,
+         {'anonymous': (401, 0), 'enrolled': (403, 0), 'staff': (200, 0)}),
+        ('enrollments-bulk', 'post', '/api/enrollments/bulk/', '{bulk}',
+         {'anonymous': (401, 0), 'enrolled': (403, 0), 'staff': (200, 10)}),
+        ('lesson-complete', 'post', '/api/lessons/{lesson}/complete/', None,
+         {'anonymous': (401, 0), 'enrolled': (200, 1), 'staff': (200, 1)}),
+        ('lesson-update-progress', 'post', '/api/lessons/{lesson}/update-progress/', {'seconds': 90},
+         {'anonymous': (401, 0), 'enrolled': (200, 3), 'staff': (200, 3)}),
+        ('progress-sync', 'post', '/api/progress/sync/', '{sync}',
+         {'anonymous': (401, 0), 'enrolled': (200, 2), 'staff': (200, 2)}),
+        ('my-progress', 'get', '/api/me/progress/', None,
+         {'anonymous': (401, 0), 'enrolled': (200, 1), 'staff': (200, 1)}),
+        ('auth-register', 'post', '/api/auth/register/', {'username': 'moi', 'email': 'moi@example.com', 'password': 'matkhau123'},
+         {'anonymous': (201, 5), 'enrolled': (201, 5), 'staff': (201, 5)}),
+        ('auth-login', 'post', '/api/auth/login/', '{login}',
+         {'anonymous': (200, 1), 'enrolled': (200, 1), 'staff': (200, 1)}),
+        ('auth-refresh', 'post', '/api/auth/refresh/', '{refresh}',
+         {'anonymous': (200, 1), 'enrolled': (200, 1), 'staff': (200, 1)}),
+        ('auth-me', 'get', '/api/auth/me/', None,
+         {'anonymous': (401, 0), 'enrolled': (200, 1), 'staff': (200, 1)}),
+        ('metrics', 'get', '/api/metrics/', None,
+         {'anonymous': (401, 0), 'enrolled': (403, 0), 'staff': (200, 0)}),
+        ('api-schema', 'get', '/api/schema/', None,
+         {'anonymous': (200, 0), 'enrolled': (200, 0), 'staff': (200, 0)}),
+        ('api-docs', 'get', '/api/docs/', None,
+         {'anonymous': (200, 0), 'enrolled': (200, 0), 'staff': (200, 0)}),
+        ('api-redoc', 'get', '/api/redoc/', None,
+         {'anonymous': (200, 0), 'enrolled': (200, 0), 'staff': (200, 0)}),
+    )
+
+    # Trang admin dùng session (force_login) thay cho JWT
+    ADMIN_ROUTES = (
+        ('admin-index', '/admin/', {'anonymous': (302, 0), 'enrolled': (302, 2), 'staff': (200, 3)}),
+        ('admin-courses', '/admin/courses/course/', {'anonymous': (302, 0), 'enrolled': (302, 2), 'staff': (200, 6)}),
+        ('admin-modules', '/admin/courses/module/', {'anonymous': (302, 0), 'enrolled': (302, 2), 'staff': (200, 5)}),
+        ('admin-lessons', '/admin/courses/lesson/', {'anonymous': (302, 0), 'enrolled': (302, 2), 'staff': (200, 4)}),
+        ('admin-reviews', '/admin/courses/review/', {'anonymous': (302, 0), 'enrolled': (302, 2), 'staff': (200, 4)}),
+        ('admin-progress', '/admin/courses/userlessonprogress/', {'anonymous': (302, 0), 'enrolled': (302, 2), 'staff': (200, 4)}),
+        ('admin-enrollments', '/admin/enrollments/enrollment/', {'anonymous': (302, 0), 'enrolled': (302, 2), 'staff': (200, 4)}),
+    )
+
+    report = []
+
+    @classmethod
+    def setUpTestData(cls):
+        catalog = [course for course in seed_catalog() if course.status == 'published']
+        cls.course = catalog[0]
+        cls.other_course = catalog[-1]
+        # Dữ liệu ngẫu nhiên có thể để trống review -> prefetch bỏ qua query, số query ban đầu bị thấp giả
+        reviewer = User.objects.filter(username__startswith='hocvien-').first()
+        for course in (cls.course, cls.other_course):
+            Review.objects.get_or_create(user=reviewer, course=course, defaults={'rating': 5, 'comment': 'Hay'})
+        cls.lesson = Lesson.objects.filter(module__course=cls.course).order_by('module__order', 'order').first()
+        cls.users = {
+            'enrolled': User.objects.create_user('hocvien', password='matkhau123'),
+            'staff': User.objects.create_user('quantri', password='matkhau123', is_staff=True, is_superuser=True),
+        }
+        Enrollment.objects.create(user=cls.users['enrolled'], course=cls.course)
+        Enrollment.objects.create(user=cls.users['staff'], course=cls.course)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if os.environ.get('API_BUDGET_REPORT') and cls.report:
+            lines = [f"{'route':<26}{'role':<11}{'status':>7}{'queries':>9}{'budget':>8}{'ms':>9}"]
+            for name, role, status_code, queries, budget, ms in cls.report:
+                lines.append(f"{name:<26}{role:<11}{status_code:>7}{queries:>9}{budget:>8}{ms:>9.1f}")
+            print('\n' + '\n'.join(lines), file=sys.stderr)
+
+    def setUp(self):
+        cache.clear()
+
+    def grow_dataset(self):
+        """Thêm dữ liệu liên quan trực tiếp tới khóa học/học viên đang đo (và thêm khóa học mới)."""
+        seed_catalog(courses=30, students=5, seed=2)
+        module = Module.objects.create(course=self.course, title='Chương thêm', order=99)
+        for n in range(25):
+            Lesson.objects.create(
+                module=module, title=f'Bài thêm {n}', slug=f'bai-them-{n}', order=n,
+                duration=timedelta(minutes=5), video_url='https://example.com/video.mp4',
+            )
+        User.objects.bulk_create([User(username=f'hocvien-them-{i}') for i in range(15)])
+        for user in User.objects.filter(username__startswith='hocvien-them-'):
+            Enrollment.objects.get_or_create(user=user, course=self.course)
+            Review.objects.create(user=user, course=self.course, rating=4, comment='Tốt')
+        for user in self.users.values():
+            for lesson in module.lessons.all():
+                UserLessonProgress.objects.create(user=user, lesson=lesson, is_completed=True)
+        cache.clear()
+
+    def client_for(self, role, admin=False):
+        client = APIClient()
+        user = self.users.get(role)
+        if user is not None:
+            if admin:
+                client.force_login(user)
+            else:
+                client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserAccessToken.for_user(user)}')
+        return client
+
+    def resolve_body(self, body, role):
+        user = self.users.get(role, self.users['enrolled'])
+        if body == '{sync}':
+            return [{'lesson_id': self.lesson.pk, 'seconds': 45}, {'lesson_id': self.lesson.pk, 'completed': True}]
+        if body == '{bulk}':
+            return {'user_ids': [u.pk for u in self.users.values()], 'course_ids': [self.other_course.pk]}
+        if body == '{login}':
+            return {'username': user.username, 'password': 'matkhau123'}
+        if body == '{refresh}':
+            return {'refresh': str(UserRefreshToken.for_user(user))}
+        return body
+
+    def measure(self, client, method, url, body):
+        """Gọi 1 request trong transaction bị rollback, trả về (response, số query, ms)."""
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = getattr(client, method)(url, body, format='json') if method == 'post' else client.get(url)
+                if response.streaming:
+                    # Query của response stream chạy khi nội dung được đọc
+                    response.streamed_body = b''.join(response.streaming_content)
+                elapsed = (time.perf_counter() - started) * 1000
+            transaction.set_rollback(True)
+        return response, len(ctx.captured_queries), elapsed, ctx.captured_queries
+
+    def check(self, name, role, method, url, body, expected, admin=False):
+        expected_status, budget = expected
+        url = url.format(course=self.course.slug, other_course=self.other_course.slug, lesson=self.lesson.pk)
+        body = self.resolve_body(body, role)
+        client = self.client_for(role, admin=admin)
+        # Luôn đo đường "cache lạnh" (trường hợp xấu nhất), không phụ thuộc thứ tự chạy
+        cache.clear()
+
+        response, queries, ms, captured = self.measure(client, method, url, body)
+        self.assertEqual(response.status_code, expected_status, f"{name} [{role}]: {getattr(response, 'data', '')}")
+        self.assertLessEqual(queries, budget, f"{name} [{role}] vượt ngân sách query:\n" +
+                             '\n'.join(q['sql'] for q in captured))
+        latency_budget = float(os.environ.get('API_LATENCY_BUDGET_MS') or 0)
+        if latency_budget:
+            self.assertLessEqual(ms, latency_budget, f"{name} [{role}] chậm: {ms:.1f}ms")
+        self.report.append((name, role, response.status_code, queries, budget, ms))
+        return queries
+
+    def run_routes(self):
+        results = {}
+        for name, method, url, body, expected in self.ROUTES:
+            for role in self.ROLES:
+                with self.subTest(route=name, role=role):
+                    results[name, role] = self.check(name, role, method, url, body, expected[role])
+        for name, url, expected in self.ADMIN_ROUTES:
+            for role in self.ROLES:
+                with self.subTest(route=name, role=role):
+                    results[name, role] = self.check(name, role, 'get', url, None, expected[role], admin=True)
+        return results
+
+    def test_query_budget_does_not_grow_with_data(self):
+        before = self.run_routes()
+        self.grow_dataset()
+        after = self.run_routes()
+        for key, queries in before.items():
+            with self.subTest(route=key[0], role=key[1]):
+                self.assertEqual(after.get(key), queries, f"{key[0]} [{key[1]}]: số query tăng theo dữ liệu")
+
+
+class OpenApiSchemaTests(TestCase):
+    def test_schema_has_no_warnings(self):
+        # SerializerMethodField cần type hint hoặc @extend_schema_field, nếu không drf-spectacular cảnh báo (W001)
+        call_command('spectacular', '--fail-on-warn', '--file', os.devnull, stderr=StringIO())
+
+
+class SeedDataCommandTests(TestCase):
+    OPTIONS = dict(categories=2, courses=12, modules=2, lessons=3, users=8, enrollments=3, seed=7, stdout=StringIO())
+
+    def snapshot(self):
+        return (
+            list(Course.objects.order_by('slug').values_list('slug', 'title', 'price', 'level', 'status', 'category__slug')),
+            list(Enrollment.objects.order_by('user__username', 'course__slug').values_list('user__username', 'course__slug')),
+            list(UserLessonProgress.objects.order_by('user__username', 'lesson_id')
+                 .values_list('user__username', 'lesson__module__course__slug', 'is_completed', 'last_watched_position')),
+            list(Review.objects.order_by('user__username', 'course__slug').values_list('user__username', 'course__slug', 'rating')),
+        )
+
+    def test_generates_requested_volume_with_consistent_stats(self):
+        call_command('seed_data', **self.OPTIONS)
+        self.assertEqual(Course.objects.count(), 12)
+        self.assertEqual(Lesson.objects.count(), 12 * 2 * 3)
+        self.assertEqual(Enrollment.objects.count(), 8 * 3)
+        self.assertEqual(User.objects.filter(username__startswith='hocvien-', profile__isnull=False).count(), 8)
+        call_command('rebuild_course_stats', check=True, stdout=StringIO())
+
+    def test_same_seed_produces_same_data(self):
+        snapshots = []
+        for _ in range(2):
+            with transaction.atomic():
+                call_command('seed_data', **self.OPTIONS)
+                snapshots.append(self.snapshot())
+                transaction.set_rollback(True)
+        self.assertEqual(snapshots[0], snapshots[1])
+
+    def test_running_twice_appends_data(self):
+        call_command('seed_data', **self.OPTIONS)
+        call_command('seed_data', **self.OPTIONS)
+        self.assertEqual(Course.objects.count(), 24)
+        self.assertEqual(User.objects.filter(username__startswith='hocvien-').count(), 16)
@@ -1,11 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CourseViewSet, LessonViewSet
+from .views import CourseViewSet, LessonViewSet, ProgressViewSet, MyProgressView
 
 router = DefaultRouter()
 router.register(r'courses', CourseViewSet, basename='course')
 router.register(r'lessons', LessonViewSet, basename='lesson')
+router.register(r'progress', ProgressViewSet, basename='progress')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('me/progress/', MyProgressView.as_view(), name='my-progress'),
 ]
\ No newline at end of file
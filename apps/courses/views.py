@@ -1,14 +1,29 @@
-from django.shortcuts import get_object_or_404
-from django.db.models import Prefetch
+from datetime import timedelta
 
-from rest_framework import viewsets, status, permissions
+from django.db import DEFAULT_DB_ALIAS
+from django.http import Http404, StreamingHttpResponse
+from django.db.models import Prefetch, F, Value, ExpressionWrapper, FloatField, DateTimeField
+from django.db.models import OuterRef, Subquery, Count, Max
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from rest_framework import viewsets, generics, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
 
-from .models import Course, Lesson, Module, UserLessonProgress
-from apps.enrollments.models import Enrollment
-from .serializers import CourseListSerializer, CourseDetailSerializer, LessonSerializer
+from .models import ArchivedLessonProgress, Course, Lesson, Module, Review, UserLessonProgress
+from apps.enrollments.idempotency import idempotent
+from apps.enrollments.services import can_view_lesson, enroll_user, get_enrolled_course_ids
+from .serializers import CourseListSerializer, CourseDetailSerializer, LessonSerializer, apply_user_state
+from .serializers import ProgressEventSerializer, CourseProgressSerializer, ReviewSerializer
+from .progress import record_position, mark_completed, upsert_progress, course_progress_queryset
+from .pagination import CourseCursorPagination, ReviewCursorPagination
+from .filters import CourseFilterBackend
+from .cache import get_cached_course_detail, get_cache_stats, get_course_version
+from .conditional import latest, make_etag, not_modified_response, set_validators
+from .curriculum import chunked, iter_curriculum
 
 class CourseViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -18,14 +33,25 @@ class CourseViewSet(viewsets.ReadOnlyModelViewSet):
     """
     lookup_field = 'slug' # URL sẽ là /api/courses/hoc-python/ thay vì ID
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    filter_backends = [CourseFilterBackend] # Lọc/sắp xếp/tìm kiếm cho trang danh sách (xem filters.py)
 
     def get_queryset(self):
         """
-        Tối ưu hóa Query (Chống N+1 Query):
-        Sử dụng prefetch_related để lấy luôn dữ liệu Module và Lesson trong 1 lần gọi DB.
+        Tối ưu hóa Query (Chống N+1 Query) - mỗi action chỉ load đúng phần dữ liệu nó cần:
+        - list: không prefetch bài học, các số liệu thống kê được annotate trong cùng 1 câu SQL.
+        - retrieve: chỉ lấy dòng Course, cây module/lesson/review (get_detail_queryset) chỉ được load khi cache miss.
+        - curriculum: chỉ lấy dòng Course, module/lesson được đọc bằng values() khi stream (curriculum.py).
+        - progress: các số liệu tiến độ được annotate sẵn (progress.course_progress_queryset).
+        - Các action còn lại (enroll...): chỉ vài cột của Course, không JOIN/prefetch (get_write_queryset).
         """
-        queryset = Course.objects.select_related('category', 'instructor') \
-                                 .prefetch_related('modules__lessons')
+        if self.action == 'list':
+            queryset = self.get_list_queryset()
+        elif self.action in ('retrieve', 'curriculum'):
+            queryset = self.get_retrieve_queryset()
+        elif self.action == 'progress':
+            queryset = course_progress_queryset(self.request.user)
+        else:
+            queryset = self.get_write_queryset()
 
         # Nếu là Admin (Superuser) -> Thấy hết (kể cả bản nháp)
         if self.request.user.is_staff:
@@ -34,6 +60,132 @@ class CourseViewSet(viewsets.ReadOnlyModelViewSet):
         # Nếu là User thường -> Chỉ thấy khóa học đã Public
         return queryset.filter(status='published')
 
+    def get_retrieve_queryset(self):
+        """
+        Dòng Course kèm mốc thay đổi mới nhất của Module/Lesson/Review (subquery MAX, không load cây)
+        để tính ETag trước khi serialize.
+        """
+        def max_updated_at(queryset, course_field):
+            return Subquery(
+                queryset.filter(**{course_field: OuterRef('pk')}).order_by()
+                        .values(course_field).annotate(m=Max('updated_at')).values('m'),
+                output_field=DateTimeField(),
+            )
+
+        return Course.objects.defer('search_vector').annotate(
+            modules_updated_at=max_updated_at(Module.objects.all(), 'course'),
+            lessons_updated_at=max_updated_at(Lesson.objects.all(), 'module__course'),
+            reviews_updated_at=max_updated_at(Review.objects.all(), 'course'),
+        )
+
+    def get_detail_queryset(self):
+        """
+        Cả cây khóa học cho CourseDetailSerializer: 1 query Course (JOIN category/instructor/stats)
+        + 1 query cho mỗi cấp Module/Lesson, sắp xếp sẵn trong SQL
+        + 1 query cho vài review mới nhất (số review của khóa học không ảnh hưởng kích thước response).
+        Không đọc các cột serializer không dùng (search_vector, Lesson.content).
+        """
+        return Course.objects.defer('search_vector') \
+                             .select_related('category', 'instructor', 'stats') \
+                             .prefetch_related(
+                                 Prefetch('modules', queryset=Module.objects.order_by('order', 'id')),
+                                 Prefetch('modules__lessons', queryset=Lesson.objects.defer('content').order_by('order', 'id')),
+                                 Prefetch(
+                                     'reviews',
+                                     queryset=Review.objects.select_related('user').order_by('-created_at', '-id')
+                                                            [:CourseDetailSerializer.LATEST_REVIEWS],
+                                     to_attr='latest_reviews',
+                                 ),
+                             )
+
+    def get_write_queryset(self):
+        """Action ghi (enroll...) chỉ cần id/giá/trạng thái của Course (slug chỉ dùng trong WHERE)."""
+        return Course.objects.only('id', 'price', 'status')
+
+    def get_list_queryset(self):
+        """
+        Queryset cho trang danh sách: các số liệu thống kê được đọc từ bảng CourseStats
+        (tính sẵn, cập nhật tăng dần qua signal) -> chỉ cần 1 LEFT JOIN theo khóa chính,
+        không phải đếm lại trên Lesson/Enrollment/Review ở mỗi request.
+        Với ?fields=..., chỉ JOIN/annotate/SELECT những cột cần cho các field được yêu cầu.
+        """
+        fields = self.get_requested_fields()
+        sparse = fields is not None
+        if not sparse:
+            fields = CourseListSerializer.Meta.fields
+
+        queryset = Course.objects.order_by('-created_at', '-id')
+
+        related = [name for name in ('category', 'instructor') if name in fields]
+        if related:
+            queryset = queryset.select_related(*related)
+
+        annotations = self.get_stats_annotations()
+        queryset = queryset.annotate(**{name: annotations[name] for name in fields if name in annotations})
+
+        if not sparse:
+            # search_vector chỉ dùng trong WHERE khi tìm kiếm, không cần đọc về
+            queryset = queryset.defer('search_vector')
+        else:
+            columns = []
+            if isinstance(self.paginator, CourseCursorPagination):
+                # CursorPagination đọc các cột sắp xếp ở dòng đầu/cuối trang để tạo con trỏ -> phải SELECT
+                ordering = self.paginator.get_ordering(self.request, queryset, self)
+                columns.extend(name.lstrip('-') for name in ordering)
+            for name in fields:
+                if name in annotations:
+                    continue
+                columns.extend(self.LIST_RELATED_COLUMNS.get(name, [name]))
+            queryset = queryset.only(*columns)
+        return queryset
+
+    # Cột cần SELECT cho các field quan hệ của CourseListSerializer (dùng với only())
+    LIST_RELATED_COLUMNS = {
+        'category': ['category__id', 'category__title', 'category__slug', 'category__icon_url'],
+        'instructor': ['instructor__username'],
+    }
+
+    def get_stats_annotations(self):
+        return {
+            'total_lessons': Coalesce(F('stats__lesson_count'), Value(0)),
+            'total_duration': Coalesce(F('stats__total_duration'), Value(timedelta(0))),
+            'enrollment_count': Coalesce(F('stats__enrollment_count'), Value(0)),
+            'review_count': Coalesce(F('stats__review_count'), Value(0)),
+            'average_rating': ExpressionWrapper(
+                Cast('stats__rating_sum', FloatField()) / NullIf(F('stats__review_count'), Value(0)),
+                output_field=FloatField(),
+            ),
+        }
+
+    def get_requested_fields(self):
+        """
+        Sparse fieldset: ?fields=id,title,slug -> chỉ trả về (và chỉ SELECT) các field này.
+        Field không tồn tại bị bỏ qua. Trả về None nếu client không yêu cầu.
+        """
+        if self.action != 'list':
+            return None
+        raw = self.request.query_params.get('fields')
+        if not raw:
+            return None
+        requested = {name.strip() for name in raw.split(',')}
+        fields = [name for name in CourseListSerializer.Meta.fields if name in requested]
+        return fields or None
+
+    @property
+    def paginator(self):
+        """
+        Mặc định dùng PageNumberPagination (settings). Client infinite scroll dùng ?pagination=cursor
+        để chuyển sang phân trang theo con trỏ (không COUNT(*), không OFFSET).
+        """
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            # Các action khác (reviews...) dùng pagination_class khai báo trên @action
+            if self.action == 'list' and (params.get('pagination') == 'cursor' or 'cursor' in params):
+                self._paginator = CourseCursorPagination()
+            else:
+                return super().paginator
+        return self._paginator
+
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return CourseDetailSerializer
@@ -46,23 +198,174 @@ class CourseViewSet(viewsets.ReadOnlyModelViewSet):
         context = super().get_serializer_context()
         # Logic check xem user đã mua khóa học này chưa được đặt trong Serializer
         # nhưng chúng ta cần đảm bảo request user được truyền vào.
+        context['fields'] = self.get_requested_fields()
         return context
 
+    def get_learning_context(self, course):
+        """
+        Tính sẵn trạng thái học của user cho 1 khóa học (1 query + cache cho cả request):
+        - enrolled_course_ids: tập id các khóa học user đã đăng ký (apps.enrollments.services, có cache)
+        - completed_lesson_ids: tập id các bài học đã hoàn thành trong khóa này
+          (gồm cả tiến độ đã lưu trữ - ArchivedLessonProgress, đọc chung bằng UNION ALL trong cùng 1 query)
+        LessonSerializer sẽ tra cứu trong 2 tập này thay vì query theo từng bài học.
+        """
+        user = self.request.user
+        if not user.is_authenticated:
+            return {'enrolled_course_ids': frozenset(), 'completed_lesson_ids': set()}
+
+        enrolled_course_ids = get_enrolled_course_ids(user, self.request)
+        completed = UserLessonProgress.objects.filter(
+            user_id=user.pk,
+            is_completed=True,
+            lesson__module__course=course,
+        ).values_list('lesson_id', flat=True).union(
+            ArchivedLessonProgress.objects.filter(user_id=user.pk, course=course).values_list('lesson_id', flat=True),
+            all=True,
+        )
+        return {
+            'enrolled_course_ids': enrolled_course_ids,
+            'completed_lesson_ids': set(completed),
+        }
+
+    def list(self, request, *args, **kwargs):
+        """
+        Conditional GET: ETag được tính từ 1 câu aggregate trên queryset đã lọc
+        (số khóa học + mốc updated_at mới nhất của Course/CourseStats/Category).
+        Số khóa học nằm trong ETag -> khóa học bị xóa/ẩn khỏi danh sách cũng làm ETag thay đổi.
+        Nếu client đã có bản mới nhất -> 304, không chạy serializer.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        state = queryset.order_by().aggregate(
+            count=Count('pk'),
+            courses_updated_at=Max('updated_at'),
+            stats_updated_at=Max('stats__updated_at'),
+            categories_updated_at=Max('category__updated_at'),
+        )
+        updated_at = latest(
+            state['courses_updated_at'], state['stats_updated_at'], state['categories_updated_at'],
+        )
+        etag = make_etag(
+            'list', request.get_full_path(), request.user.is_staff,
+            state['count'], updated_at.isoformat() if updated_at else '',
+        )
+
+        response = not_modified_response(request, etag)
+        if response is not None:
+            return response
+        return set_validators(super().list(request, *args, **kwargs), etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Phần dữ liệu dùng chung của khóa học được lấy từ cache (xem apps/courses/cache.py),
+        cây module/lesson/review chỉ được serialize lại khi cache miss.
+        Trạng thái riêng của user được áp lên sau đó.
+        Hỗ trợ Conditional GET: trả 304 trước khi đọc cache nếu ETag khớp.
+        """
+        instance = self.get_object()
+        learning_context = self.get_learning_context(instance)
+
+        # Conditional GET: tính ETag trước khi đọc cache/serialize
+        etag = self.get_course_etag('detail', instance, learning_context)
+        response = not_modified_response(request, etag)
+        if response is not None:
+            return response
+
+        user = request.user
+
+        def build():
+            # Bản cache dùng chung cho mọi user -> đọc từ primary để không lưu lại dữ liệu cũ của read replica
+            course = self.get_detail_queryset().using(DEFAULT_DB_ALIAS).get(pk=instance.pk)
+            context = self.get_serializer_context()
+            context['user_independent'] = True
+            return CourseDetailSerializer(course, context=context).data
+
+        data = get_cached_course_detail(instance, build)
+        apply_user_state(
+            data,
+            user,
+            learning_context['enrolled_course_ids'],
+            learning_context['completed_lesson_ids'],
+        )
+        return set_validators(Response(data), etag)
+
+    def get_course_etag(self, kind, instance, learning_context):
+        """
+        ETag cho trang chi tiết/mục lục của 1 khóa học, tính từ mốc updated_at của Course/Module/
+        Lesson/Review (annotate trong get_retrieve_queryset) và trạng thái học của user, không cần serialize.
+        """
+        content_updated_at = latest(
+            instance.updated_at,
+            instance.modules_updated_at,
+            instance.lessons_updated_at,
+            instance.reviews_updated_at,
+        )
+        user = self.request.user
+        # Version cache thay đổi cả khi module/lesson/review bị xóa (MAX(updated_at) không bắt được)
+        etag = make_etag(
+            kind, instance.pk, get_course_version(instance.pk), content_updated_at.isoformat(),
+            user.pk if user.is_authenticated else 'anonymous', user.is_staff,
+            instance.pk in learning_context['enrolled_course_ids'],
+            ','.join(str(pk) for pk in sorted(learning_context['completed_lesson_ids'])),
+        )
+        return etag
+
+    # URL: GET /api/courses/{slug}/curriculum/ - Mục lục module/bài học, stream JSON (xem curriculum.py)
+    @extend_schema(responses={200: OpenApiTypes.OBJECT})
+    @action(detail=True, methods=['get'])
+    def curriculum(self, request, slug=None):
+        """
+        Dành cho khóa học rất lớn: không dựng cây serializer trong bộ nhớ, JSON được ghi dần khi đọc DB.
+        Cùng quy tắc ẩn video_url và Conditional GET với trang chi tiết.
+        """
+        instance = self.get_object()
+        learning_context = self.get_learning_context(instance)
+
+        etag = self.get_course_etag('curriculum', instance, learning_context)
+        response = not_modified_response(request, etag)
+        if response is not None:
+            return response
+
+        user = request.user
+        allow_all = user.is_authenticated and (user.is_staff or instance.pk in learning_context['enrolled_course_ids'])
+        response = StreamingHttpResponse(
+            chunked(iter_curriculum(instance, allow_all, learning_context['completed_lesson_ids'])),
+            content_type='application/json',
+        )
+        return set_validators(response, etag)
+
+    # URL: GET /api/courses/{slug}/reviews/?cursor=... - Toàn bộ review, phân trang keyset (mới nhất trước)
+    @extend_schema(responses=ReviewSerializer(many=True))
+    @action(detail=True, methods=['get'], pagination_class=ReviewCursorPagination)
+    def reviews(self, request, slug=None):
+        course = self.get_object()
+        queryset = Review.objects.filter(course_id=course.pk).select_related('user') \
+                                 .only('id', 'rating', 'comment', 'created_at', 'user__username')
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(ReviewSerializer(page, many=True).data)
+
+    # URL: GET /api/courses/{slug}/progress/ - Tiến độ của user trong khóa học (1 query)
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def progress(self, request, slug=None):
+        course = self.get_object()
+        return Response(CourseProgressSerializer(course, context=self.get_serializer_context()).data)
+
+    # URL: GET /api/courses/cache-stats/ (Chỉ Admin) - Theo dõi hiệu quả cache trang chi tiết
+    @action(detail=False, methods=['get'], url_path='cache-stats', permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        return Response(get_cache_stats())
+
     # --- ACTION 1: Đăng ký khóa học (Mua) ---
-    # URL: POST /api/courses/{slug}/enroll/
+    # URL: POST /api/courses/{slug}/enroll/ (hỗ trợ header Idempotency-Key)
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    @idempotent
     def enroll(self, request, slug=None):
+        """
+        Idempotent: gọi lại (double-click, retry) không tạo bản ghi trùng và không lỗi 500.
+        Chỉ load vài cột của Course (không load cây module/lesson) + 1 câu INSERT ... ON CONFLICT DO NOTHING.
+        """
         course = self.get_object()
-        user = request.user
-
-        # 1. Kiểm tra đã mua chưa
-        if Enrollment.objects.filter(user=user, course=course).exists():
-            return Response(
-                {"message": "Bạn đã đăng ký khóa học này rồi!"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
 
-        # 2. Xử lý thanh toán (Giả lập cho MVP)
+        # Xử lý thanh toán (Giả lập cho MVP)
         # Trong thực tế: Bạn sẽ check Webhook từ Stripe/Momo ở đây. 
         # Nếu khóa học FREE -> Cho qua luôn.
         if course.price > 0:
@@ -70,9 +373,9 @@ class CourseViewSet(viewsets.ReadOnlyModelViewSet):
             # return Response({"message": "Vui lòng thanh toán..."}, status=PAYMENT_REQUIRED)
             pass
 
-        # 3. Tạo Enrollment
-        Enrollment.objects.create(user=user, course=course)
-        
+        if not enroll_user(request.user.pk, course.pk):
+            return Response({"message": "Bạn đã đăng ký khóa học này rồi!"}, status=status.HTTP_200_OK)
+
         return Response(
             {"message": "Đăng ký thành công! Chúc bạn học tốt."}, 
             status=status.HTTP_201_CREATED
@@ -87,41 +390,163 @@ class LessonViewSet(viewsets.GenericViewSet):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     lookup_field = 'id'
+    lookup_url_kwarg = 'pk' # Các action bên dưới nhận tham số `pk`
     permission_classes = [IsAuthenticated]
 
     # --- ACTION 2: Đánh dấu hoàn thành bài học ---
     # URL: POST /api/lessons/{id}/complete/
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
-        lesson = get_object_or_404(Lesson, pk=pk)
-        
-        # Cập nhật hoặc tạo mới tiến độ
-        progress, created = UserLessonProgress.objects.get_or_create(
-            user=request.user,
-            lesson=lesson
-        )
+        """
+        Đánh dấu hoàn thành bằng 1 câu INSERT ... ON CONFLICT DO UPDATE (xem progress.mark_completed):
+        không có khoảng hở giữa get_or_create và save() -> bấm liên tục/song song không gây IntegrityError.
+        """
+        try:
+            lesson_id = int(pk)
+        except (TypeError, ValueError):
+            raise Http404
         
-        if not progress.is_completed:
-            progress.is_completed = True
-            progress.save()
+        if mark_completed(request.user.pk, lesson_id):
             return Response({"status": "Marked as completed"}, status=status.HTTP_200_OK)
-        
+
+        # Không có dòng nào thay đổi: bài đã hoàn thành từ trước, hoặc lesson không tồn tại
+        if not Lesson.objects.filter(pk=lesson_id).exists():
+            raise Http404
         return Response({"status": "Already completed"}, status=status.HTTP_200_OK)
 
     # --- ACTION 3: Cập nhật thời gian xem (Resume) ---
     # URL: POST /api/lessons/{id}/update-progress/
     # Body: { "seconds": 120 }
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], url_path='update-progress')
     def update_progress(self, request, pk=None):
-        lesson = get_object_or_404(Lesson, pk=pk)
-        seconds = request.data.get('seconds', 0)
-        
-        progress, created = UserLessonProgress.objects.get_or_create(
-            user=request.user, 
-            lesson=lesson
-        )
-        
-        progress.last_watched_position = int(seconds)
-        progress.save()
+        """
+        Heartbeat của trình phát video (vài giây/lần cho mỗi người xem).
+        Không query DB tại đây: vị trí được đưa vào ProgressBuffer và ghi theo lô định kỳ
+        (xem apps/courses/progress.py). Lesson không tồn tại sẽ bị bỏ qua khi flush.
+        """
+        try:
+            lesson_id = int(pk)
+            seconds = int(request.data.get('seconds', 0))
+        except (TypeError, ValueError):
+            return Response({"seconds": "Giá trị không hợp lệ."}, status=status.HTTP_400_BAD_REQUEST)
+        if seconds < 0:
+            return Response({"seconds": "Giá trị không hợp lệ."}, status=status.HTTP_400_BAD_REQUEST)
+
+        record_position(request.user.pk, lesson_id, seconds)
         
-        return Response({"status": "Progress updated"}, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response({"status": "Progress updated"}, status=status.HTTP_200_OK)
+
+
+class ProgressViewSet(viewsets.ViewSet):
+    """
+    Đồng bộ tiến độ học theo lô (client offline/gom sự kiện rồi gửi 1 lần).
+    """
+    permission_classes = [IsAuthenticated]
+    MAX_EVENTS = 1000
+
+    # URL: POST /api/progress/sync/
+    # Body: [{ "lesson_id": 1, "seconds": 120, "completed": false, "client_ts": "2025-01-01T10:00:00Z" }, ...]
+    @extend_schema(request=ProgressEventSerializer(many=True), responses={200: OpenApiTypes.OBJECT})
+    @action(detail=False, methods=['post'])
+    def sync(self, request):
+        """
+        Áp dụng cả lô sự kiện với số query cố định:
+        1 query lấy các lesson kèm tiến độ đang lưu của user (quyền tra trong tập khóa học đã mua, có cache)
+        + 1 câu upsert UserLessonProgress.
+        Sự kiện có client_ts cũ hơn tiến độ đang lưu trên server (VD: client offline gửi lại sự kiện cũ
+        sau khi đã học tiếp trên thiết bị khác) không ghi đè vị trí xem; nếu là sự kiện hoàn thành thì
+        trạng thái hoàn thành vẫn được ghi nhận. Sự kiện không có client_ts được coi là mới nhất (ghi đè).
+        Trả về trạng thái cho từng sự kiện theo đúng thứ tự gửi lên:
+        applied | stale | invalid | not_found | forbidden.
+        """
+        events = request.data
+        if not isinstance(events, list):
+            return Response({"detail": "Body phải là danh sách sự kiện."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(events) > self.MAX_EVENTS:
+            return Response(
+                {"detail": f"Tối đa {self.MAX_EVENTS} sự kiện mỗi lần đồng bộ."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # 1. Validate từng sự kiện (sự kiện lỗi không làm hỏng cả lô)
+        results = []
+        valid = []
+        for index, item in enumerate(events):
+            serializer = ProgressEventSerializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+                results.append({"lesson_id": serializer.validated_data['lesson_id'], "status": "applied"})
+            else:
+                lesson_id = item.get('lesson_id') if isinstance(item, dict) else None
+                results.append({"lesson_id": lesson_id, "status": "invalid", "errors": serializer.errors})
+
+        # 2. Kiểm tra quyền truy cập của mọi lesson: 1 query lấy lesson (kèm tiến độ đang lưu của user),
+        #    quyền tra trong tập khóa học đã mua (cache)
+        user = request.user
+        stored_progress = UserLessonProgress.objects.filter(user_id=user.pk, lesson=OuterRef('pk'))
+        lessons = Lesson.objects.filter(pk__in={event['lesson_id'] for _, event in valid}) \
+                                .annotate(
+                                    stored_at=Subquery(stored_progress.values('updated_at')[:1]),
+                                    stored_position=Subquery(stored_progress.values('last_watched_position')[:1]),
+                                ) \
+                                .values_list('pk', 'is_preview', 'module__course_id', 'stored_at', 'stored_position')
+        access = {}
+        stored = {}
+        for pk, is_preview, course_id, stored_at, stored_position in lessons:
+            access[pk] = can_view_lesson(user, course_id, is_preview, request)
+            if stored_at is not None:
+                stored[pk] = (stored_at, stored_position)
+
+        # 3. Gộp sự kiện theo lesson: vị trí lấy theo sự kiện mới nhất (client_ts), đã hoàn thành thì giữ nguyên
+        def event_order(item):
+            index, event = item
+            client_ts = event.get('client_ts')
+            # Theo thời gian ở client rồi theo thứ tự gửi; sự kiện không có client_ts xếp sau cùng (mới nhất)
+            return (client_ts is None, client_ts or '', index)
+
+        merged = {}
+        for index, event in sorted(valid, key=event_order):
+            lesson_id = event['lesson_id']
+            if lesson_id not in access:
+                results[index]['status'] = 'not_found'
+                continue
+            if not access[lesson_id]:
+                results[index]['status'] = 'forbidden'
+                continue
+            client_ts = event.get('client_ts')
+            stale = lesson_id in stored and client_ts is not None and client_ts < stored[lesson_id][0]
+            if stale and not event['completed']:
+                results[index]['status'] = 'stale'
+                continue
+            previous = merged.get(lesson_id)
+            if stale:
+                # Chỉ ghi nhận hoàn thành, giữ vị trí xem mới hơn (của sự kiện trước trong lô hoặc trên server)
+                position = previous[3] if previous is not None else stored[lesson_id][1]
+            else:
+                position = event['seconds']
+            merged[lesson_id] = (
+                user.pk,
+                lesson_id,
+                event['completed'] or (previous is not None and previous[2]),
+                position,
+            )
+
+        # 4. Upsert cả lô trong 1 câu lệnh (không bao giờ đưa is_completed từ True về False)
+        upsert_progress(list(merged.values()))
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+class MyProgressView(generics.ListAPIView):
+    """
+    Tiến độ của user đang đăng nhập trong tất cả khóa học đã đăng ký (dashboard "Học tiếp").
+    Toàn bộ danh sách được tính trong 1 câu SQL, không phụ thuộc số khóa học đã đăng ký.
+    """
+    serializer_class = CourseProgressSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        user = self.request.user
+        return course_progress_queryset(user).filter(enrollments__user_id=user.pk) \
+            .order_by(F('last_watched_at').desc(nulls_last=True), '-id')
@@ -1,8 +1,12 @@
 from django.contrib import admin
+from apps.courses.admin_tools import CourseFilter, LargeTableAdmin
 from .models import Enrollment
 
 @admin.register(Enrollment)
-class EnrollmentAdmin(admin.ModelAdmin):
+class EnrollmentAdmin(LargeTableAdmin):
     list_display = ['user', 'course', 'created_at']
-    list_filter = ['course', 'created_at']
-    search_fields = ['user__username', 'course__title']
\ No newline at end of file
+    list_filter = [CourseFilter, 'created_at']
+    list_select_related = ['user', 'course']
+    search_fields = ['user__username', 'course__title']
+    raw_id_fields = ['user']
+    autocomplete_fields = ['course']
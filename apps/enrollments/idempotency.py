@@ -0,0 +1,83 @@
+"""
+Hỗ trợ header Idempotency-Key cho các API ghi (đăng ký khóa học, đăng ký hàng loạt).
+
+Client gửi kèm 1 key duy nhất cho mỗi thao tác. Nếu request bị gửi lại (mất mạng, retry, double-click)
+với cùng key, response lần đầu được trả lại nguyên vẹn (kèm header Idempotent-Replayed: true)
+mà không thực thi lại thao tác.
+- Key gắn với user: 2 user dùng trùng key không ảnh hưởng nhau.
+- Cùng key nhưng khác method/path/body -> 422.
+- Request cùng key đang được xử lý -> 409, client thử lại sau.
+- Chỉ lưu response < 500 (lỗi server thì client được phép thử lại).
+"""
+import functools
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+KEY = 'idempotency:{user}:{key}'
+# Thời gian tối đa giữ "khóa" khi request đang xử lý (phòng trường hợp worker chết giữa chừng)
+IN_PROGRESS_TIMEOUT = 60
+
+
+def _fingerprint(request):
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.get_full_path().encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def idempotent(view_method):
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"detail": f"{HEADER} tối đa {MAX_KEY_LENGTH} ký tự."}, status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        user = request.user.pk if request.user.is_authenticated else 'anonymous'
+        cache_key = KEY.format(user=user, key=hashlib.sha256(key.encode()).hexdigest())
+        fingerprint = _fingerprint(request)
+
+        if not cache.add(cache_key, {'fingerprint': fingerprint, 'in_progress': True}, timeout=IN_PROGRESS_TIMEOUT):
+            stored = cache.get(cache_key)
+            if stored is not None:
+                if stored['fingerprint'] != fingerprint:
+                    return Response(
+                        {"detail": f"{HEADER} đã được dùng cho 1 request khác."},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    )
+                if stored.get('in_progress'):
+                    return Response(
+                        {"detail": "Request với key này đang được xử lý, vui lòng thử lại sau."},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                return Response(stored['data'], status=stored['status'], headers={'Idempotent-Replayed': 'true'})
+            # Bản ghi vừa hết hạn giữa add() và get() -> xử lý như request mới
+            cache.set(cache_key, {'fingerprint': fingerprint, 'in_progress': True}, timeout=IN_PROGRESS_TIMEOUT)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+
+        if response.status_code < 500:
+            cache.set(
+                cache_key,
+                {'fingerprint': fingerprint, 'status': response.status_code, 'data': response.data},
+                timeout=settings.IDEMPOTENCY_KEY_TIMEOUT,
+            )
+        else:
+            cache.delete(cache_key)
+        return response
+
+    return wrapper
@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 
 User = get_user_model()
 
@@ -18,3 +20,15 @@ class Enrollment(models.Model):
 
 	def __str__(self):
 		return f"{self.user} -> {self.course}"
+
+
+# Tập khóa học đã đăng ký được cache theo user (services.py).
+# Làm mới ngay (chính transaction này đọc lại thấy dữ liệu mới) và thêm 1 lần sau commit:
+# request khác đọc DB trước commit có thể đã ghi tập cũ vào version vừa tăng.
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def invalidate_user_enrollments(sender, instance, **kwargs):
+	from .services import invalidate_enrollments  # services.py import models.py -> import muộn tránh vòng lặp
+
+	invalidate_enrollments(instance.user_id)
+	transaction.on_commit(lambda: invalidate_enrollments(instance.user_id))
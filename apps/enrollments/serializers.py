@@ -0,0 +1,20 @@
+from rest_framework import serializers
+
+MAX_BULK_IDS = 10000
+MAX_BULK_PAIRS = 50000
+
+
+class BulkEnrollSerializer(serializers.Serializer):
+    """Đăng ký mọi user trong user_ids vào mọi khóa học trong course_ids."""
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=MAX_BULK_IDS,
+    )
+    course_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=MAX_BULK_IDS,
+    )
+
+    def validate(self, attrs):
+        pairs = len(set(attrs['user_ids'])) * len(set(attrs['course_ids']))
+        if pairs > MAX_BULK_PAIRS:
+            raise serializers.ValidationError(f"Tối đa {MAX_BULK_PAIRS} lượt đăng ký mỗi request (đang có {pairs}).")
+        return attrs
@@ -0,0 +1,170 @@
+"""
+Tra cứu quyền học (entitlement): tập id các khóa học user đã đăng ký.
+
+- Lưu trong cache theo từng user (settings.ENTITLEMENT_CACHE_TIMEOUT), kèm memo trên request:
+  mọi lần kiểm tra quyền trong cùng 1 request (serializer từng bài học, view...) chỉ là tra cứu bộ nhớ.
+  Cache locmem không dùng chung giữa các worker -> chỉ giữ settings.ENTITLEMENT_LOCAL_CACHE_TIMEOUT giây.
+- Key có version theo user. Khi Enrollment được lưu/xóa, version tăng ngay và tăng thêm 1 lần sau khi
+  transaction commit (signal trong models.py) -> request song song đọc dữ liệu cũ chỉ ghi vào key của
+  version cũ, không ghi đè được tập mới.
+- bulk_create/QuerySet.update/delete không chạy signal: phải tự gọi invalidate_enrollments().
+
+Ngoài ra module cung cấp thao tác đăng ký an toàn khi chạy song song: enroll_user (1 câu INSERT ... ON CONFLICT
+DO NOTHING) và bulk_enroll (bulk_create(ignore_conflicts=True) theo lô) cho Admin.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections, router
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .models import Enrollment
+
+VERSION_KEY = 'enrollments:version:{user_id}'
+COURSES_KEY = 'enrollments:courses:{user_id}:v{version}'
+MEMO_ATTR = '_enrolled_course_ids'
+
+
+def _get_version(user_id):
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        # Khởi tạo bằng timestamp: version bị evict rồi tạo lại vẫn lớn hơn mọi version cũ
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _entitlement_timeout():
+    if isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache):
+        return min(settings.ENTITLEMENT_CACHE_TIMEOUT, settings.ENTITLEMENT_LOCAL_CACHE_TIMEOUT)
+    return settings.ENTITLEMENT_CACHE_TIMEOUT
+
+
+def invalidate_enrollments(user_id):
+    key = VERSION_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def _memo_target(request):
+    # DRF Request bọc HttpRequest: memo đặt trên HttpRequest để view và middleware dùng chung
+    return getattr(request, '_request', request)
+
+
+def get_enrolled_course_ids(user, request=None):
+    """frozenset id các khóa học user đã đăng ký (rỗng với user chưa đăng nhập)."""
+    if not user.is_authenticated:
+        return frozenset()
+
+    target = _memo_target(request) if request is not None else None
+    memo = getattr(target, MEMO_ATTR, None)
+    if memo is not None and memo[0] == user.pk:
+        return memo[1]
+
+    key = COURSES_KEY.format(user_id=user.pk, version=_get_version(user.pk))
+    course_ids = cache.get(key)
+    if course_ids is None:
+        course_ids = frozenset(Enrollment.objects.filter(user_id=user.pk).values_list('course_id', flat=True))
+        cache.set(key, course_ids, timeout=_entitlement_timeout())
+
+    if target is not None:
+        setattr(target, MEMO_ATTR, (user.pk, course_ids))
+    return course_ids
+
+
+def is_enrolled(user, course_id, request=None):
+    return course_id in get_enrolled_course_ids(user, request)
+
+
+def has_course_access(user, course_id, request=None):
+    """Được xem toàn bộ nội dung khóa học: Admin/staff hoặc đã đăng ký."""
+    if not user.is_authenticated:
+        return False
+    return user.is_staff or is_enrolled(user, course_id, request)
+
+
+def can_view_lesson(user, course_id, is_preview, request=None):
+    """Quyền xem video của 1 bài học: bài học thử (preview) hoặc có quyền với cả khóa học."""
+    return is_preview or has_course_access(user, course_id, request)
+
+
+def enroll_user(user_id, course_id):
+    """
+    Đăng ký 1 khóa học bằng 1 câu INSERT ... ON CONFLICT DO NOTHING (nguyên tử phía DB):
+    nhiều request song song (double-click) không gây IntegrityError, chỉ 1 request tạo được bản ghi.
+    Trả về True nếu vừa tạo mới, False nếu đã đăng ký từ trước.
+    Cú pháp RETURNING dùng được cho PostgreSQL và SQLite (>= 3.35).
+    """
+    using = router.db_for_write(Enrollment)
+    connection = connections[using]
+    table = connection.ops.quote_name(Enrollment._meta.db_table)
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, course_id, created_at) VALUES (%s, %s, %s) "
+            f"ON CONFLICT (user_id, course_id) DO NOTHING RETURNING id",
+            [user_id, course_id, connection.ops.adapt_datetimefield_value(now)],
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return False
+
+    # SQL thuần không chạy signal -> gửi post_save như Model.save() để CourseStats/cache quyền học được cập nhật
+    instance = Enrollment(id=row[0], user_id=user_id, course_id=course_id, created_at=now)
+    post_save.send(sender=Enrollment, instance=instance, created=True, update_fields=None, raw=False, using=using)
+    return True
+
+
+def bulk_enroll(user_ids, course_ids, batch_size=1000):
+    """
+    Đăng ký mọi cặp (user, course) trong user_ids x course_ids bằng bulk_create(ignore_conflicts=True) theo lô.
+    Id không tồn tại bị bỏ qua. Sau đó tính lại enrollment_count của các khóa học và làm mới cache quyền học
+    của các user liên quan (bulk_create không chạy signal).
+    """
+    from apps.courses.models import Course, CourseStats
+
+    connection = connections[router.db_for_write(Enrollment)]
+    chunk = max(1, (connection.features.max_query_params or 2000) // 2)
+
+    user_ids, course_ids = sorted(set(user_ids)), sorted(set(course_ids))
+    valid_users, valid_courses, existing = set(), set(), set()
+    for start in range(0, len(user_ids), chunk):
+        valid_users.update(User.objects.filter(pk__in=user_ids[start:start + chunk]).values_list('pk', flat=True))
+    for start in range(0, len(course_ids), chunk):
+        valid_courses.update(Course.objects.filter(pk__in=course_ids[start:start + chunk]).values_list('pk', flat=True))
+
+    users, courses = sorted(valid_users), sorted(valid_courses)
+    # Chia lô theo phía user, course_ids thường ít (1 khóa cho hàng nghìn user) hoặc ngược lại
+    user_chunk = max(1, chunk - len(courses)) if len(courses) < chunk else 1
+    for start in range(0, len(users), user_chunk):
+        for course_start in range(0, len(courses), chunk):
+            existing.update(Enrollment.objects.filter(
+                user_id__in=users[start:start + user_chunk],
+                course_id__in=courses[course_start:course_start + chunk],
+            ).values_list('user_id', 'course_id'))
+
+    to_create = [
+        Enrollment(user_id=user_id, course_id=course_id)
+        for user_id in users for course_id in courses
+        if (user_id, course_id) not in existing
+    ]
+    Enrollment.objects.bulk_create(to_create, batch_size=batch_size, ignore_conflicts=True)
+
+    if to_create:
+        CourseStats.refresh_many(courses, fields=['enrollment_count'])
+        for user_id in {enrollment.user_id for enrollment in to_create}:
+            invalidate_enrollments(user_id)
+
+    return {
+        'created': len(to_create),
+        'already_enrolled': len(existing),
+        'invalid_user_ids': [pk for pk in user_ids if pk not in valid_users],
+        'invalid_course_ids': [pk for pk in course_ids if pk not in valid_courses],
+    }
@@ -1,3 +1,188 @@
-from django.test import TestCase
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.courses.models import CourseStats
+from apps.courses.tests import create_course
+from .models import Enrollment
+from .services import can_view_lesson, get_enrolled_course_ids, has_course_access, is_enrolled
+
+
+class EntitlementServiceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = create_course()
+        self.other = create_course('django-nang-cao')
+        self.user = User.objects.create_user('hocvien', password='matkhau123')
+        Enrollment.objects.create(user=self.user, course=self.course)
+
+    def test_enrolled_course_ids(self):
+        self.assertEqual(get_enrolled_course_ids(self.user), {self.course.pk})
+        self.assertTrue(is_enrolled(self.user, self.course.pk))
+        self.assertFalse(is_enrolled(self.user, self.other.pk))
+
+    def test_cached_between_requests(self):
+        get_enrolled_course_ids(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_enrolled_course_ids(self.user), {self.course.pk})
+
+    def test_request_memo_skips_cache(self):
+        request = RequestFactory().get('/')
+        get_enrolled_course_ids(self.user, request)
+        cache.clear()
+        with self.assertNumQueries(0):
+            self.assertTrue(is_enrolled(self.user, self.course.pk, request))
+
+    def test_invalidated_on_enroll_and_unenroll(self):
+        get_enrolled_course_ids(self.user)
+        enrollment = Enrollment.objects.create(user=self.user, course=self.other)
+        self.assertEqual(get_enrolled_course_ids(self.user), {self.course.pk, self.other.pk})
+        enrollment.delete()
+        self.assertEqual(get_enrolled_course_ids(self.user), {self.course.pk})
+
+    def test_local_cache_expires_within_seconds(self):
+        get_enrolled_course_ids(self.user)
+        # Đăng ký được ghi ở worker khác: invalidate không tới cache locmem của worker này
+        with mock.patch('apps.enrollments.services.invalidate_enrollments'):
+            Enrollment.objects.create(user=self.user, course=self.other)
+        self.assertEqual(get_enrolled_course_ids(self.user), {self.course.pk})
+
+        later = time.time() + settings.ENTITLEMENT_LOCAL_CACHE_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertEqual(get_enrolled_course_ids(self.user), {self.course.pk, self.other.pk})
+
+    def test_access_rules(self):
+        staff = User.objects.create_user('quantri', password='matkhau123', is_staff=True)
+        stranger = User.objects.create_user('khach', password='matkhau123')
+        with self.assertNumQueries(0):
+            self.assertTrue(has_course_access(staff, self.other.pk))
+        self.assertFalse(has_course_access(stranger, self.course.pk))
+        self.assertTrue(can_view_lesson(stranger, self.course.pk, is_preview=True))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class EnrollTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = create_course()
+        self.user = User.objects.create_user('hocvien', password='matkhau123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/courses/{self.course.slug}/enroll/'
+
+    def test_enroll_does_not_load_course_tree(self):
+        # SELECT course (vài cột) + INSERT ... ON CONFLICT + cập nhật CourseStats
+        with self.assertNumQueries(3):
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(is_enrolled(self.user, self.course.pk))
+        self.assertEqual(CourseStats.objects.get(course=self.course).enrollment_count, 1)
+
+    def test_enroll_twice_is_idempotent(self):
+        self.client.post(self.url)
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Enrollment.objects.filter(user=self.user, course=self.course).count(), 1)
+        self.assertEqual(CourseStats.objects.get(course=self.course).enrollment_count, 1)
+
+    def test_idempotency_key_replays_first_response(self):
+        first = self.client.post(self.url, HTTP_IDEMPOTENCY_KEY='mua-1')
+        second = self.client.post(self.url, HTTP_IDEMPOTENCY_KEY='mua-1')
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+
+    def test_idempotency_key_reused_for_other_request(self):
+        other = create_course('django-nang-cao')
+        self.client.post(self.url, HTTP_IDEMPOTENCY_KEY='mua-1')
+        response = self.client.post(f'/api/courses/{other.slug}/enroll/', HTTP_IDEMPOTENCY_KEY='mua-1')
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(Enrollment.objects.filter(user=self.user, course=other).exists())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ConcurrentEnrollTests(TransactionTestCase):
+    THREADS = 8
+
+    def test_parallel_enroll_requests(self):
+        course = create_course()
+        user = User.objects.create_user('hocvien', password='matkhau123')
+        barrier = threading.Barrier(self.THREADS)
+        responses, errors = [], []
+
+        def tap():
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                barrier.wait()
+                responses.append(client.post(f'/api/courses/{course.slug}/enroll/'))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=tap) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(r.status_code for r in responses), [200] * (self.THREADS - 1) + [201])
+        self.assertEqual(Enrollment.objects.filter(user=user, course=course).count(), 1)
+        self.assertEqual(CourseStats.objects.get(course=course).enrollment_count, 1)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BulkEnrollTests(TestCase):
+    url = '/api/enrollments/bulk/'
+
+    def setUp(self):
+        cache.clear()
+        self.course = create_course()
+        self.other = create_course('django-nang-cao')
+        self.students = [User.objects.create_user(f'hocvien{i}', password='matkhau123') for i in range(5)]
+        self.staff = User.objects.create_user('quantri', password='matkhau123', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(self.students[0])
+        response = self.client.post(self.url, {'user_ids': [1], 'course_ids': [self.course.pk]}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_many_users_into_one_course(self):
+        Enrollment.objects.create(user=self.students[0], course=self.course)
+        get_enrolled_course_ids(self.students[1])  # đã có trong cache -> phải được làm mới
+        response = self.client.post(self.url, {
+            'user_ids': [u.pk for u in self.students] + [999999],
+            'course_ids': [self.course.pk],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 4)
+        self.assertEqual(response.data['already_enrolled'], 1)
+        self.assertEqual(response.data['invalid_user_ids'], [999999])
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), 5)
+        self.assertEqual(CourseStats.objects.get(course=self.course).enrollment_count, 5)
+        self.assertTrue(is_enrolled(self.students[1], self.course.pk))
+
+    def test_one_user_into_many_courses(self):
+        response = self.client.post(self.url, {
+            'user_ids': [self.students[0].pk],
+            'course_ids': [self.course.pk, self.other.pk],
+        }, format='json')
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(get_enrolled_course_ids(self.students[0]), {self.course.pk, self.other.pk})
+
+    def test_rejects_too_many_pairs(self):
+        response = self.client.post(self.url, {
+            'user_ids': list(range(1, 1001)), 'course_ids': list(range(1, 101)),
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
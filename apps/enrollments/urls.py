@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .views import BulkEnrollView
+
+urlpatterns = [
+    path('bulk/', BulkEnrollView.as_view(), name='enrollment-bulk'),
+]
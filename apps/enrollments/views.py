@@ -1,3 +1,21 @@
-from django.shortcuts import render
+from rest_framework import generics, status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
 
-# Create your views here.
+from .idempotency import idempotent
+from .serializers import BulkEnrollSerializer
+from .services import bulk_enroll
+
+
+# URL: POST /api/enrollments/bulk/ (Chỉ Admin)
+# Body: { "user_ids": [1, 2, ...], "course_ids": [5] }  -> nhiều user vào 1 khóa học (hoặc ngược lại)
+class BulkEnrollView(generics.GenericAPIView):
+    permission_classes = [IsAdminUser]
+    serializer_class = BulkEnrollSerializer
+
+    @idempotent
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = bulk_enroll(serializer.validated_data['user_ids'], serializer.validated_data['course_ids'])
+        return Response(result, status=status.HTTP_200_OK)
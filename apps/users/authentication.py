@@ -0,0 +1,105 @@
+"""
+Xác thực JWT không cần query DB ở mỗi request.
+
+Token do hệ thống cấp (UserRefreshToken/UserAccessToken) mang sẵn các claim username, is_staff.
+ClaimsJWTAuthentication dựng ClaimsUser từ các claim này thay vì SELECT bảng auth_user như
+JWTAuthentication mặc định -> các request đọc nhiều (chi tiết khóa học, heartbeat tiến độ...) không tốn
+query xác thực nào.
+
+- Endpoint cần thêm thông tin (email, profile...) đọc thuộc tính trên ClaimsUser như User bình thường,
+  hoặc gọi get_full_user(): User đầy đủ (kèm Profile) được load 1 lần và lưu cache ngắn hạn
+  (settings.AUTH_USER_CACHE_TIMEOUT, 0 = không cache), cache bị xóa khi User/Profile được lưu.
+- Khi lọc ORM theo user, dùng user_id=user.pk (ClaimsUser không phải model instance).
+- Đổi quyền Admin/khóa tài khoản có hiệu lực khi access token hết hạn: lúc refresh, user được đọc lại từ DB
+  (kiểm tra is_active) và claim được ghi lại theo dữ liệu mới.
+- Token cũ không có claim (cấp trước khi bật tính năng) vẫn dùng được: fallback về query DB như trước.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+USER_CACHE_KEY = 'auth:user:{user_id}'
+CLAIMS = ('username', 'is_staff')
+
+
+def add_user_claims(token, user):
+    token['username'] = user.get_username()
+    token['is_staff'] = user.is_staff
+    return token
+
+
+class UserRefreshToken(RefreshToken):
+    """Refresh token kèm claim của user (access token tạo từ nó được copy các claim này)."""
+
+    @classmethod
+    def for_user(cls, user):
+        return add_user_claims(super().for_user(user), user)
+
+
+class UserAccessToken(AccessToken):
+    @classmethod
+    def for_user(cls, user):
+        return add_user_claims(super().for_user(user), user)
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(USER_CACHE_KEY.format(user_id=user_id))
+
+
+def load_user(user_id):
+    """User đầy đủ kèm Profile (1 query khi cache miss)."""
+    key = USER_CACHE_KEY.format(user_id=user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.select_related('profile').get(pk=user_id)
+        if settings.AUTH_USER_CACHE_TIMEOUT:
+            cache.set(key, user, timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+class ClaimsUser(TokenUser):
+    """
+    User dựng từ claim của access token: id, username, is_staff có sẵn không cần DB.
+    Thuộc tính khác (email, first_name, profile...) được đọc từ User đầy đủ (load_user) ở lần truy cập đầu.
+    """
+
+    @cached_property
+    def id(self):
+        return User._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def full_user(self):
+        return load_user(self.id)
+
+    def __str__(self):
+        return self.username
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return getattr(self.full_user, attr)
+
+
+def get_full_user(user):
+    """Model User tương ứng với request.user (không query lại nếu request.user đã là User)."""
+    if isinstance(user, ClaimsUser):
+        return user.full_user
+    return user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if all(claim in validated_token for claim in CLAIMS):
+            return ClaimsUser(validated_token)
+        return super().get_user(validated_token)
+
+
+class ClaimsJWTScheme(SimpleJWTScheme):
+    """Khai báo cho drf-spectacular: vẫn là Bearer JWT như JWTAuthentication"""
+    target_class = 'apps.users.authentication.ClaimsJWTAuthentication'
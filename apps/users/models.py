@@ -1,6 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 class Profile(models.Model):
@@ -19,4 +19,15 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+    instance.profile.save()
+
+# Xóa bản User đầy đủ trong cache xác thực (apps/users/authentication.py) khi User/Profile thay đổi
+@receiver([post_save, post_delete], sender=User)
+def invalidate_auth_cache_on_user_change(sender, instance, **kwargs):
+    from .authentication import invalidate_cached_user
+    invalidate_cached_user(instance.pk)
+
+@receiver([post_save, post_delete], sender=Profile)
+def invalidate_auth_cache_on_profile_change(sender, instance, **kwargs):
+    from .authentication import invalidate_cached_user
+    invalidate_cached_user(instance.user_id)
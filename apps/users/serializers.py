@@ -1,6 +1,11 @@
 # apps/users/serializers.py
 from django.contrib.auth.models import User
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import UserRefreshToken, add_user_claims
 
 class UserSerializer(serializers.ModelSerializer):
     avatar = serializers.ImageField(source='profile.avatar', read_only=True) # Lấy từ Profile
@@ -32,4 +37,40 @@ class RegisterSerializer(serializers.ModelSerializer):
             first_name=validated_data.get('first_name', ''),
             last_name=validated_data.get('last_name', '')
         )
-        return user
\ No newline at end of file
+        return user
+
+class LoginSerializer(TokenObtainPairSerializer):
+    """Đăng nhập: token được cấp kèm claim username/is_staff (xem authentication.py)"""
+    token_class = UserRefreshToken
+
+class TokenRefreshWithClaimsSerializer(TokenRefreshSerializer):
+    """
+    Refresh: đọc lại user từ DB (1 query) để chặn tài khoản đã bị khóa/xóa
+    và ghi lại claim username/is_staff theo dữ liệu mới nhất.
+    """
+    token_class = UserRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh.payload.get(api_settings.USER_ID_CLAIM)}
+        ).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        add_user_claims(refresh, user)
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    # App token_blacklist chưa được cài -> không có blacklist()
+                    pass
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data['refresh'] = str(refresh)
+        return data
@@ -1,3 +1,81 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from .authentication import ClaimsUser, UserAccessToken
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, AUTH_USER_CACHE_TIMEOUT=60)
+class ClaimsJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('hocvien', email='hocvien@example.com', password='matkhau123')
+        self.client = APIClient()
+
+    def login(self, username='hocvien'):
+        response = self.client.post('/api/auth/login/', {'username': username, 'password': 'matkhau123'})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def authorize(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_login_token_carries_user_claims(self):
+        token = AccessToken(self.login()['access'])
+        self.assertEqual(token['username'], 'hocvien')
+        self.assertIs(token['is_staff'], False)
+
+    def test_authentication_does_not_query_the_database(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.authorize(self.login()['access'])
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/courses/cache-stats/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_token_without_claims_falls_back_to_database(self):
+        self.authorize(AccessToken.for_user(self.user))
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/courses/cache-stats/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_full_user_is_loaded_once_and_cached(self):
+        self.authorize(UserAccessToken.for_user(self.user))
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/auth/me/')
+        self.assertEqual(response.data['email'], 'hocvien@example.com')
+        self.assertIsNone(response.data['avatar'])
+        with self.assertNumQueries(0):
+            self.client.get('/api/auth/me/')
+
+    def test_cached_user_is_invalidated_on_save(self):
+        self.authorize(UserAccessToken.for_user(self.user))
+        self.client.get('/api/auth/me/')
+        self.user.email = 'moi@example.com'
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth/me/').data['email'], 'moi@example.com')
+
+    def test_claims_user_reads_other_attributes_from_full_user(self):
+        user = ClaimsUser(UserAccessToken.for_user(self.user))
+        self.assertEqual((user.pk, user.username, user.is_staff), (self.user.pk, 'hocvien', False))
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'hocvien@example.com')
+            self.assertEqual(user.profile.user_id, self.user.pk)
+
+    def test_refresh_updates_claims(self):
+        refresh = self.login()['refresh']
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.post('/api/auth/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(AccessToken(response.data['access'])['is_staff'], True)
+
+    def test_refresh_rejects_inactive_or_deleted_user(self):
+        refresh = self.login()['refresh']
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.post('/api/auth/refresh/', {'refresh': refresh}).status_code, 401)
+        self.user.delete()
+        self.assertEqual(self.client.post('/api/auth/refresh/', {'refresh': refresh}).status_code, 401)
@@ -1,6 +1,7 @@
 # apps/users/views.py
 from rest_framework import generics, permissions
 from django.contrib.auth.models import User
+from .authentication import get_full_user
 from .serializers import RegisterSerializer, UserSerializer
 
 # 1. API Đăng ký
@@ -15,5 +16,5 @@ class UserProfileView(generics.RetrieveAPIView):
     serializer_class = UserSerializer
 
     def get_object(self):
-        # Trả về user đang thực hiện request
-        return self.request.user
\ No newline at end of file
+        # Trả về user đang thực hiện request (User đầy đủ kèm Profile, có cache ngắn hạn)
+        return get_full_user(self.request.user)
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+Chia tải đọc sang read replica (bật khi có DATABASE_REPLICA_URLS).
+
+- Chỉ các model của catalog (settings.DATABASE_REPLICA_MODELS: khóa học, module, bài học, review, thống kê...)
+  được đọc từ replica. Tiến độ học, enrollment, user... luôn đọc từ primary (cần dữ liệu mới nhất).
+- Mọi lệnh ghi đi vào primary ('default').
+- Read-your-writes (đọc lại được dữ liệu mình vừa ghi):
+  * Request không an toàn (POST/PUT/PATCH/DELETE) hoặc request đã ghi gì đó -> mọi lệnh đọc sau đó trong
+    request đi vào primary. Lệnh đọc bên trong transaction.atomic() của primary cũng vậy.
+  * Sau khi ghi, user bị "ghim" vào primary thêm settings.DATABASE_REPLICA_STICKY_SECONDS giây (lưu trong cache,
+    cần cache dùng chung giữa các worker, VD Redis) để bù độ trễ replication.
+- Ngoài request (management command, shell, job...) router không chọn replica: mọi thứ chạy trên primary.
+
+Replica được chọn ngẫu nhiên 1 lần cho mỗi request.
+"""
+import contextvars
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_KEY = 'db:pinned:{user_id}'
+
+_current = contextvars.ContextVar('replica_routing', default=None)
+
+
+def _user_id(request):
+    # DRF gán user đã xác thực (JWT) lên HttpRequest, Admin dùng user của session
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.pk
+    return None
+
+
+class RoutingState:
+    __slots__ = ('request', 'pinned', 'replica', '_user_checked')
+
+    def __init__(self, request):
+        self.request = request
+        self.pinned = request.method not in ('GET', 'HEAD', 'OPTIONS')
+        self.replica = random.choice(settings.DATABASE_REPLICAS)
+        self._user_checked = False
+
+    def use_primary(self):
+        if self.pinned or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return True
+        if not self._user_checked:
+            # Chỉ tra cache 1 lần mỗi request, khi có lệnh đọc catalog đầu tiên (lúc này user đã được xác thực)
+            user_id = _user_id(self.request)
+            if user_id is not None:
+                self._user_checked = True
+                self.pinned = bool(cache.get(PIN_KEY.format(user_id=user_id)))
+        return self.pinned
+
+    def record_write(self):
+        self.pinned = True
+        user_id = _user_id(self.request)
+        if user_id is not None and settings.DATABASE_REPLICA_STICKY_SECONDS:
+            cache.set(PIN_KEY.format(user_id=user_id), True, timeout=settings.DATABASE_REPLICA_STICKY_SECONDS)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if state is None or model._meta.label_lower not in settings.DATABASE_REPLICA_MODELS:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Quan hệ/prefetch đọc cùng DB với object cha (cả cây dữ liệu nhất quán)
+            return instance._state.db
+        if state.use_primary():
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            state.record_write()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primary và replica chứa cùng 1 dữ liệu
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Schema của replica đến từ replication, không migrate trực tiếp
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """Gắn trạng thái định tuyến cho từng request. Không làm gì khi chưa cấu hình replica."""
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _current.set(RoutingState(request))
+        try:
+            return self.get_response(request)
+        finally:
+            # Response dạng stream đọc DB sau khi middleware kết thúc -> các lệnh đó chạy trên primary
+            _current.reset(token)
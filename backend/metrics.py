@@ -0,0 +1,379 @@
+"""
+Đo thời gian xử lý từng request (tùy chọn, bật bằng REQUEST_METRICS_ENABLED).
+
+Với mỗi request được lấy mẫu (REQUEST_METRICS_SAMPLE_RATE), middleware ghi lại:
+- số query SQL và tổng thời gian DB (connection.execute_wrapper trên mọi database),
+- thời gian xác thực (APIView.perform_authentication, VD: JWT + lấy user),
+- thời gian serialize (BaseSerializer.data; đã bao gồm các query chạy lười trong serializer),
+- tổng thời gian xử lý.
+
+Kết quả được trả về client qua header Server-Timing, ghi log JSON (logger 'backend.metrics') và cộng dồn
+vào histogram theo route, xuất ở GET /api/metrics/ (chỉ Admin) theo định dạng text của Prometheus.
+Histogram là bộ đếm cộng dồn trong từng worker: cửa sổ trượt (5 phút, 1 giờ...) tính ở phía Prometheus
+bằng rate()/histogram_quantile(), mỗi worker là 1 target/instance riêng.
+
+Request không được lấy mẫu đi thẳng qua middleware, không tốn thêm chi phí.
+
+Kết nối DB (ConnectionMetrics, luôn bật kể cả khi REQUEST_METRICS_ENABLED=False) theo từng alias của worker:
+- db_connections_opened_total, db_connection_acquire_seconds: số lần mở kết nối/lấy kết nối từ pool và
+  thời gian chờ (bắt tay TCP/TLS + xác thực, hoặc chờ pool trả kết nối). Với CONN_MAX_AGE > 0 số này gần như
+  không tăng theo số request.
+- db_connections_open/in_use/idle: kết nối đang mở, đang được 1 request giữ, và đang rảnh chờ request sau.
+- db_pool_*: thống kê của psycopg_pool (pool_size, pool_available, requests_waiting, requests_wait_ms...)
+  khi bật DATABASE_POOL.
+"""
+import contextvars
+import functools
+import json
+import logging
+import random
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.http import HttpResponse
+from drf_spectacular.utils import extend_schema
+from rest_framework.permissions import IsAdminUser
+from rest_framework.serializers import BaseSerializer
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+CONNECT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'db', 'auth', 'serializer', '_phase')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.auth = 0.0
+        self.serializer = 0.0
+        self._phase = None
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+
+def _timed(phase, func):
+    """Cộng thời gian chạy func vào phase của request hiện tại (lời gọi lồng nhau chỉ tính 1 lần)."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        metrics = _current.get()
+        if metrics is None or metrics._phase == phase:
+            return func(*args, **kwargs)
+        previous, metrics._phase = metrics._phase, phase
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            setattr(metrics, phase, getattr(metrics, phase) + time.perf_counter() - started)
+            metrics._phase = previous
+
+    wrapper.__request_metrics__ = True
+    return wrapper
+
+
+def _install_hooks():
+    """Bọc các điểm đo của DRF (1 lần cho cả tiến trình). Không ảnh hưởng gì khi request không được lấy mẫu."""
+    if not getattr(APIView.perform_authentication, '__request_metrics__', False):
+        APIView.perform_authentication = _timed('auth', APIView.perform_authentication)
+    if not getattr(BaseSerializer.data.fget, '__request_metrics__', False):
+        BaseSerializer.data = property(_timed('serializer', BaseSerializer.data.fget))
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Histogram theo (method, route) của worker hiện tại."""
+
+    SERIES = (
+        ('http_request_duration_seconds', 'Total request processing time.', 'total', DURATION_BUCKETS),
+        ('http_request_db_seconds', 'Time spent executing SQL per request.', 'db', DURATION_BUCKETS),
+        ('http_request_auth_seconds', 'Time spent authenticating the request.', 'auth', DURATION_BUCKETS),
+        ('http_request_serializer_seconds', 'Time spent in DRF serializers per request.', 'serializer', DURATION_BUCKETS),
+        ('http_request_queries', 'SQL queries per request.', 'queries', QUERY_BUCKETS),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._responses = {}
+
+    def observe(self, method, route, status, values):
+        with self._lock:
+            for name, _, key, buckets in self.SERIES:
+                histogram = self._histograms.get((name, method, route))
+                if histogram is None:
+                    histogram = self._histograms[(name, method, route)] = Histogram(buckets)
+                histogram.observe(values[key])
+            key = (method, route, status)
+            self._responses[key] = self._responses.get(key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._responses.clear()
+
+    def render(self):
+        """Định dạng text exposition 0.0.4 của Prometheus."""
+        lines = []
+        with self._lock:
+            for name, help_text, _, _ in self.SERIES:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (series, method, route), histogram in sorted(self._histograms.items()):
+                    if series != name:
+                        continue
+                    labels = f'method="{method}",route="{_escape(route)}"'
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+            lines.append('# HELP http_requests_sampled_total Sampled requests by status code.')
+            lines.append('# TYPE http_requests_sampled_total counter')
+            for (method, route, status), count in sorted(self._responses.items()):
+                lines.append(
+                    f'http_requests_sampled_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}'
+                )
+
+        lines.append('# HELP http_request_sample_rate Fraction of requests that are instrumented.')
+        lines.append('# TYPE http_request_sample_rate gauge')
+        lines.append(f'http_request_sample_rate {settings.REQUEST_METRICS_SAMPLE_RATE}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+class ConnectionMetrics:
+    """Thống kê kết nối DB của worker hiện tại (theo alias)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._acquire = {}
+        # Các DatabaseWrapper (mỗi thread 1 bộ) đã từng mở kết nối; wrapper bị thu hồi khi thread kết thúc
+        self._wrappers = weakref.WeakSet()
+        # Thread đang xử lý request: kết nối của thread đó được tính là "in use"
+        self._active_threads = set()
+
+    def record_connect(self, wrapper, elapsed):
+        with self._lock:
+            histogram = self._acquire.get(wrapper.alias)
+            if histogram is None:
+                histogram = self._acquire[wrapper.alias] = Histogram(CONNECT_BUCKETS)
+            histogram.observe(elapsed)
+            self._wrappers.add(wrapper)
+
+    def request_started(self, **kwargs):
+        with self._lock:
+            self._active_threads.add(threading.get_ident())
+
+    def request_finished(self, **kwargs):
+        with self._lock:
+            self._active_threads.discard(threading.get_ident())
+
+    def reset(self):
+        with self._lock:
+            self._acquire.clear()
+
+    def snapshot(self):
+        """{alias: (open, in_use)} tại thời điểm gọi."""
+        counts = {alias: [0, 0] for alias in connections}
+        with self._lock:
+            for wrapper in list(self._wrappers):
+                if wrapper.connection is None:
+                    continue
+                count = counts.setdefault(wrapper.alias, [0, 0])
+                count[0] += 1
+                if wrapper._thread_ident in self._active_threads:
+                    count[1] += 1
+        return {alias: tuple(count) for alias, count in counts.items()}
+
+    def pool_stats(self):
+        """{alias: stats} của psycopg_pool (chỉ các alias bật OPTIONS['pool'])."""
+        stats = {}
+        for alias in connections:
+            if connections.settings[alias].get('OPTIONS', {}).get('pool'):
+                pool = getattr(connections[alias], 'pool', None)
+                if pool is not None:
+                    stats[alias] = pool.get_stats()
+        return stats
+
+    def render(self):
+        lines = [
+            '# HELP db_connections_opened_total New database connections (or pool checkouts) opened by this worker.',
+            '# TYPE db_connections_opened_total counter',
+        ]
+        with self._lock:
+            acquire = sorted((alias, histogram) for alias, histogram in self._acquire.items())
+            for alias, histogram in acquire:
+                lines.append(f'db_connections_opened_total{{alias="{alias}"}} {histogram.count}')
+            lines.append('# HELP db_connection_acquire_seconds Time spent opening a connection or waiting for the pool.')
+            lines.append('# TYPE db_connection_acquire_seconds histogram')
+            for alias, histogram in acquire:
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'db_connection_acquire_seconds_bucket{{alias="{alias}",le="{bound}"}} {cumulative}')
+                lines.append(f'db_connection_acquire_seconds_bucket{{alias="{alias}",le="+Inf"}} {histogram.count}')
+                lines.append(f'db_connection_acquire_seconds_sum{{alias="{alias}"}} {histogram.sum}')
+                lines.append(f'db_connection_acquire_seconds_count{{alias="{alias}"}} {histogram.count}')
+
+        snapshot = sorted(self.snapshot().items())
+        for name, help_text, value in (
+            ('db_connections_open', 'Open database connections held by this worker.', lambda o, u: o),
+            ('db_connections_in_use', 'Connections held by a request that is being processed.', lambda o, u: u),
+            ('db_connections_idle', 'Open connections waiting for the next request.', lambda o, u: o - u),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            for alias, (open_count, in_use) in snapshot:
+                lines.append(f'{name}{{alias="{alias}"}} {value(open_count, in_use)}')
+
+        for alias, stats in sorted(self.pool_stats().items()):
+            for key, value in sorted(stats.items()):
+                lines.append(f'db_pool_{key}{{alias="{alias}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+connection_metrics = ConnectionMetrics()
+
+
+def _install_connection_hooks():
+    """Đo thời gian mở kết nối của mọi backend DB (1 lần cho cả tiến trình)."""
+    if getattr(BaseDatabaseWrapper.connect, '__request_metrics__', False):
+        return
+    connect = BaseDatabaseWrapper.connect
+
+    @functools.wraps(connect)
+    def timed_connect(self):
+        started = time.perf_counter()
+        connect(self)
+        connection_metrics.record_connect(self, time.perf_counter() - started)
+
+    timed_connect.__request_metrics__ = True
+    BaseDatabaseWrapper.connect = timed_connect
+    request_started.connect(connection_metrics.request_started, dispatch_uid='connection_metrics_started')
+    request_finished.connect(connection_metrics.request_finished, dispatch_uid='connection_metrics_finished')
+
+
+def route_of(request):
+    """
+    Tên URL (VD: course-detail, admin:index) thay vì path thật, để số series không tăng theo dữ liệu.
+    URL không đặt tên -> dùng pattern của URL.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        _install_hooks()
+        # Thống kê kết nối DB được ghi cho mọi request, không theo REQUEST_METRICS_SAMPLE_RATE
+        # (chỉ tốn chi phí khi mở kết nối mới)
+        _install_connection_hooks()
+
+    def __call__(self, request):
+        if random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        wrappers = [connections[alias].execute_wrapper(metrics.record_query) for alias in connections]
+        started = time.perf_counter()
+        try:
+            for wrapper in wrappers:
+                wrapper.__enter__()
+            response = self.get_response(request)
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+            _current.reset(token)
+        total = time.perf_counter() - started
+
+        values = {
+            'total': total,
+            'db': metrics.db,
+            'auth': metrics.auth,
+            'serializer': metrics.serializer,
+            'queries': metrics.queries,
+        }
+        route = route_of(request)
+        registry.observe(request.method, route, response.status_code, values)
+
+        if settings.REQUEST_METRICS_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={metrics.db * 1000:.1f};desc="{metrics.queries} queries"',
+                f'auth;dur={metrics.auth * 1000:.1f}',
+                f'serializer;dur={metrics.serializer * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            ])
+
+        record = {
+            'method': request.method,
+            'route': route,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db * 1000, 2),
+            'auth_ms': round(metrics.auth * 1000, 2),
+            'serializer_ms': round(metrics.serializer * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+        }
+        logger.info(json.dumps(record), extra={'request_metrics': record})
+        return response
+
+
+class MetricsView(APIView):
+    """GET /api/metrics/ (chỉ Admin): histogram theo route và thống kê kết nối DB của worker đang xử lý request."""
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(exclude=True)
+    def get(self, request):
+        body = registry.render() + connection_metrics.render()
+        return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -7,6 +7,8 @@ from pathlib import Path
 import os
 from datetime import timedelta
 import environ
+import django
+from django.core.exceptions import ImproperlyConfigured
 
 # 1. Định nghĩa BASE_DIR (Đặt lên đầu tiên)
 # ------------------------------------------------------------------------------
@@ -57,12 +59,14 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'backend.metrics.RequestMetricsMiddleware', # Chỉ hoạt động khi REQUEST_METRICS_ENABLED=True
     'whitenoise.middleware.WhiteNoiseMiddleware', # [OPTIONAL] Thêm dòng này để serve static file khi deploy
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'backend.db_router.ReplicaRoutingMiddleware', # Chỉ hoạt động khi có DATABASE_REPLICA_URLS
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -93,6 +97,126 @@ DATABASES = {
     'default': env.db('DATABASE_URL', default=f'sqlite:///{BASE_DIR}/db.sqlite3')
 }
 
+# Giữ kết nối DB giữa các request thay vì mở/đóng ở mỗi request (tiết kiệm bắt tay TCP/TLS + xác thực).
+# - DATABASE_CONN_MAX_AGE: số giây giữ 1 kết nối trong mỗi worker (0 = đóng sau mỗi request như cũ).
+# - DATABASE_CONN_HEALTH_CHECKS: kiểm tra kết nối cũ còn sống trước khi dùng lại ở request mới
+#   (DB restart, failover, kết nối bị firewall/PgBouncer cắt...) thay vì trả lỗi 500.
+# - DATABASE_POOL=True: dùng connection pool của psycopg 3 (Django >= 5.1, cần cài `psycopg[pool]`)
+#   thay cho kết nối cố định: các thread trong worker dùng chung DATABASE_POOL_MIN_SIZE..MAX_SIZE kết nối,
+#   chờ tối đa DATABASE_POOL_TIMEOUT giây khi pool đã hết. Khi bật pool, CONN_MAX_AGE phải là 0.
+DATABASE_CONN_MAX_AGE = env.int('DATABASE_CONN_MAX_AGE', default=60)
+DATABASE_CONN_HEALTH_CHECKS = env.bool('DATABASE_CONN_HEALTH_CHECKS', default=True)
+DATABASE_POOL = env.bool('DATABASE_POOL', default=False)
+
+
+def _check_pool_support(config):
+    # Django < 5.1 / psycopg2 không hiểu OPTIONS['pool'] và truyền thẳng vào psycopg2.connect() -> mọi kết nối lỗi
+    if config['ENGINE'] != 'django.db.backends.postgresql':
+        raise ImproperlyConfigured('DATABASE_POOL chỉ dùng được với PostgreSQL.')
+    if django.VERSION < (5, 1):
+        raise ImproperlyConfigured('DATABASE_POOL cần Django >= 5.1, hãy dùng DATABASE_CONN_MAX_AGE.')
+    try:
+        import psycopg_pool  # noqa: F401 (cài cùng psycopg 3: pip install "psycopg[pool]")
+    except ImportError:
+        raise ImproperlyConfigured('DATABASE_POOL cần psycopg 3 và psycopg_pool: pip install "psycopg[pool]".')
+
+
+def configure_connection(config):
+    config['CONN_HEALTH_CHECKS'] = DATABASE_CONN_HEALTH_CHECKS
+    if DATABASE_POOL:
+        _check_pool_support(config)
+        config['CONN_MAX_AGE'] = 0
+        config.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': env.int('DATABASE_POOL_MIN_SIZE', default=2),
+            'max_size': env.int('DATABASE_POOL_MAX_SIZE', default=10),
+            'timeout': env.float('DATABASE_POOL_TIMEOUT', default=10.0),
+        }
+    else:
+        config['CONN_MAX_AGE'] = DATABASE_CONN_MAX_AGE
+    return config
+
+
+configure_connection(DATABASES['default'])
+
+# Read replica (tùy chọn), VD: DATABASE_REPLICA_URLS=postgres://...@replica-1/lms,postgres://...@replica-2/lms
+# Các lệnh đọc catalog được chia sang replica, mọi lệnh ghi vào 'default' (xem backend/db_router.py)
+DATABASE_REPLICA_URLS = env.list('DATABASE_REPLICA_URLS', default=[])
+DATABASE_REPLICAS = []
+for _index, _url in enumerate(DATABASE_REPLICA_URLS):
+    _alias = f'replica_{_index}'
+    # Khi chạy test, replica trỏ vào DB test của default
+    DATABASES[_alias] = configure_connection({**env.db_url_config(_url), 'TEST': {'MIRROR': 'default'}})
+    DATABASE_REPLICAS.append(_alias)
+
+DATABASE_ROUTERS = ['backend.db_router.ReplicaRouter']
+# Model được phép đọc từ replica (app_label.model_name)
+DATABASE_REPLICA_MODELS = {
+    'courses.category', 'courses.course', 'courses.module', 'courses.lesson',
+    'courses.review', 'courses.coursestats',
+}
+# Sau khi ghi, user được ghim vào primary trong khoảng này (giây) để bù độ trễ replication
+DATABASE_REPLICA_STICKY_SECONDS = env.int('DATABASE_REPLICA_STICKY_SECONDS', default=5)
+
+
+# 5.1 Cache
+# ------------------------------------------------------------------------------
+# Mặc định dùng bộ nhớ tiến trình (locmem). Production nên dùng Redis/Memcached để các worker
+# dùng chung cache, VD: CACHE_URL=redis://127.0.0.1:6379/1
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# Thời gian sống (giây) của cache trang chi tiết khóa học (apps/courses/cache.py)
+COURSE_DETAIL_CACHE_TIMEOUT = env.int('COURSE_DETAIL_CACHE_TIMEOUT', default=60 * 60)
+
+# Thời gian sống (giây) của tập khóa học đã đăng ký theo user (apps/enrollments/services.py)
+ENTITLEMENT_CACHE_TIMEOUT = env.int('ENTITLEMENT_CACHE_TIMEOUT', default=60 * 60)
+# Với cache locmem (mỗi worker 1 bản), invalidate sau enroll/unenroll chỉ tới worker xử lý request:
+# thời gian sống bị giới hạn ở giá trị này để worker khác thấy thay đổi sau vài giây
+ENTITLEMENT_LOCAL_CACHE_TIMEOUT = env.int('ENTITLEMENT_LOCAL_CACHE_TIMEOUT', default=5)
+
+# Thời gian giữ response theo header Idempotency-Key (apps/enrollments/idempotency.py)
+IDEMPOTENCY_KEY_TIMEOUT = env.int('IDEMPOTENCY_KEY_TIMEOUT', default=24 * 60 * 60)
+
+# Thời gian cache bản User đầy đủ khi endpoint cần thêm thông tin ngoài claim của JWT (apps/users/authentication.py)
+# 0 = không cache
+AUTH_USER_CACHE_TIMEOUT = env.int('AUTH_USER_CACHE_TIMEOUT', default=60)
+
+
+# Ghi tiến độ xem video theo lô (apps/courses/progress.py)
+PROGRESS_BUFFER_ENABLED = env.bool('PROGRESS_BUFFER_ENABLED', default=True)
+PROGRESS_FLUSH_INTERVAL = env.float('PROGRESS_FLUSH_INTERVAL', default=5.0)  # giây
+PROGRESS_BUFFER_MAX_SIZE = env.int('PROGRESS_BUFFER_MAX_SIZE', default=5000)  # flush ngay khi buffer đầy
+
+
+# 5.2 Request Metrics (backend/metrics.py)
+# ------------------------------------------------------------------------------
+# Đo số query, thời gian DB/xác thực/serializer của từng request -> header Server-Timing,
+# log JSON (logger 'backend.metrics') và histogram Prometheus tại /api/metrics/ (chỉ Admin)
+REQUEST_METRICS_ENABLED = env.bool('REQUEST_METRICS_ENABLED', default=False)
+REQUEST_METRICS_SAMPLE_RATE = env.float('REQUEST_METRICS_SAMPLE_RATE', default=0.1)  # 0..1
+# Server-Timing lộ thông tin nội bộ (số query, thời gian DB) cho mọi client, có thể tắt riêng
+REQUEST_METRICS_SERVER_TIMING = env.bool('REQUEST_METRICS_SERVER_TIMING', default=True)
+# Log JSON mặc định bị bỏ (dev/test không bị in ra console). Bật để ghi ra stderr cho log collector,
+# hoặc để deployment tự cấu hình handler cho logger 'backend.metrics'
+REQUEST_METRICS_LOG_CONSOLE = env.bool('REQUEST_METRICS_LOG_CONSOLE', default=False)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+        'null': {'class': 'logging.NullHandler'},
+    },
+    'loggers': {
+        'backend.metrics': {
+            'handlers': ['console' if REQUEST_METRICS_LOG_CONSOLE else 'null'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 
 # 6. Password Validation
 # ------------------------------------------------------------------------------
@@ -148,7 +272,8 @@ else:
 # ------------------------------------------------------------------------------
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Dựng user từ claim của token, không query DB mỗi request (xem apps/users/authentication.py)
+        'apps.users.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -164,6 +289,9 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_USER_CLASS': 'apps.users.authentication.ClaimsUser',
+    'TOKEN_OBTAIN_SERIALIZER': 'apps.users.serializers.LoginSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'apps.users.serializers.TokenRefreshWithClaimsSerializer',
 }
 
 
@@ -0,0 +1,235 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.courses.models import Course
+from apps.courses.tests import create_course
+from apps.users.authentication import UserAccessToken
+from .db_router import ReplicaRouter
+from .metrics import (
+    ConnectionMetrics, RequestMetricsMiddleware, _install_connection_hooks, connection_metrics, registry,
+)
+from .settings import _check_pool_support
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, REQUEST_METRICS_ENABLED=True, REQUEST_METRICS_SAMPLE_RATE=1.0)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        self.staff = User.objects.create_user('quantri', password='matkhau123', is_staff=True)
+        create_course()
+
+    def test_server_timing_header(self):
+        response = self.client.get('/api/courses/')
+        self.assertEqual(response.status_code, 200)
+        timing = dict(part.strip().split(';', 1) for part in response['Server-Timing'].split(','))
+        self.assertEqual(set(timing), {'db', 'auth', 'serializer', 'total'})
+        self.assertIn('desc="3 queries"', timing['db'])
+
+    def test_structured_log_line(self):
+        with self.assertLogs('backend.metrics', 'INFO') as logs:
+            self.client.get('/api/courses/')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['route'], 'course-list')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['queries'], 3)
+        self.assertGreater(record['total_ms'], 0)
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 401)
+        self.client.force_authenticate(User.objects.create_user('hocvien', password='matkhau123'))
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+    def test_prometheus_histograms_per_route(self):
+        for _ in range(3):
+            self.client.get('/api/courses/')
+        self.client.force_authenticate(self.staff)
+        body = self.client.get('/api/metrics/').content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="course-list"} 3', body)
+        self.assertIn('http_request_queries_bucket{method="GET",route="course-list",le="3"} 3', body)
+        self.assertIn('http_requests_sampled_total{method="GET",route="course-list",status="200"} 3', body)
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_not_instrumented(self):
+        response = self.client.get('/api/courses/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(registry.render().count('_count{'), 0)
+
+    @override_settings(REQUEST_METRICS_ENABLED=False)
+    def test_disabled_by_default_setting(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/courses/'))
+
+
+class ConnectionMetricsTests(TestCase):
+    def install_hooks(self):
+        # Gỡ hook sau test: BaseDatabaseWrapper.connect được khôi phục khi thoát patch
+        patcher = mock.patch.object(BaseDatabaseWrapper, 'connect', BaseDatabaseWrapper.connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        _install_connection_hooks()
+
+    def test_new_connections_are_timed_per_alias(self):
+        self.install_hooks()
+        connection_metrics.reset()
+        wrapper = connections.create_connection('default')
+        try:
+            wrapper.connect()
+            body = connection_metrics.render()
+        finally:
+            wrapper.close()
+        self.assertIn('db_connections_opened_total{alias="default"} 1', body)
+        self.assertIn('db_connection_acquire_seconds_count{alias="default"} 1', body)
+
+    def test_open_connections_are_split_into_in_use_and_idle(self):
+        metrics = ConnectionMetrics()
+        metrics.record_connect(connections['default'], 0.003)
+        metrics.request_started()
+        self.assertEqual(metrics.snapshot()['default'], (1, 1))
+        metrics.request_finished()
+        self.assertEqual(metrics.snapshot()['default'], (1, 0))
+        body = metrics.render()
+        self.assertIn('db_connections_open{alias="default"} 1', body)
+        self.assertIn('db_connections_idle{alias="default"} 1', body)
+        self.assertIn('db_connection_acquire_seconds_bucket{alias="default",le="0.005"} 1', body)
+
+    @override_settings(REQUEST_METRICS_ENABLED=False)
+    def test_hooks_are_not_installed_when_metrics_are_disabled(self):
+        with mock.patch.object(BaseDatabaseWrapper, 'connect', BaseDatabaseWrapper.connect):
+            original = BaseDatabaseWrapper.connect
+            with self.assertRaises(MiddlewareNotUsed):
+                RequestMetricsMiddleware(lambda request: None)
+            self.assertIs(BaseDatabaseWrapper.connect, original)
+
+    @override_settings(SECURE_SSL_REDIRECT=False)
+    def test_metrics_endpoint_includes_connection_stats(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('quantri', password='matkhau123', is_staff=True))
+        body = client.get('/api/metrics/').content.decode()
+        self.assertIn('# TYPE db_connections_in_use gauge', body)
+        self.assertIn('# TYPE db_connection_acquire_seconds histogram', body)
+
+    @unittest.skipIf(django.VERSION >= (5, 1), 'Django >= 5.1 hỗ trợ OPTIONS["pool"]')
+    def test_pool_requires_django_5_1(self):
+        with self.assertRaises(ImproperlyConfigured):
+            _check_pool_support({'ENGINE': 'django.db.backends.postgresql'})
+        with self.assertRaises(ImproperlyConfigured):
+            _check_pool_support({'ENGINE': 'django.db.backends.sqlite3'})
+
+    def test_persistent_connections_with_health_checks_by_default(self):
+        settings_dict = connections['default'].settings_dict
+        self.assertGreater(settings_dict['CONN_MAX_AGE'], 0)
+        self.assertIs(settings_dict['CONN_HEALTH_CHECKS'], True)
+
+
+REPLICA = 'replica_test'
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, DATABASE_REPLICAS=[REPLICA], DATABASE_REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Primary và replica là 2 file SQLite riêng (không có replication): replica chỉ chứa schema, không có dữ liệu.
+    Đọc ra khóa học nào nghĩa là request được định tuyến vào primary.
+    Dùng TransactionTestCase: lệnh đọc trong transaction của primary luôn đi vào primary.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Thêm alias sau setUpClass: replica không nằm trong `databases` nên không bị bọc transaction/chặn query
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        connections.settings[REPLICA] = {
+            **connections['default'].settings_dict,
+            'NAME': os.path.join(cls.tmpdir.name, 'replica.sqlite3'),
+            'TEST': {'MIRROR': None, 'NAME': None},
+        }
+        # allow_migrate chặn migrate vào replica -> tạo schema khi tắt router
+        with override_settings(DATABASE_ROUTERS=[]):
+            call_command('migrate', database=REPLICA, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        cls.tmpdir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.course = create_course()
+        self.user = User.objects.create_user('hocvien', password='matkhau123')
+        self.other = User.objects.create_user('hocvien-2', password='matkhau123')
+
+    def client_for(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserAccessToken.for_user(user)}')
+        return client
+
+    def listed(self, client):
+        return [course['slug'] for course in client.get('/api/courses/').data['results']]
+
+    def test_catalog_reads_go_to_replica(self):
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            self.assertEqual(self.listed(self.client_for()), [])
+            self.assertEqual(self.client_for().get(f'/api/courses/{self.course.slug}/').status_code, 404)
+        self.assertTrue(replica.captured_queries)
+
+    def test_writes_and_reads_in_unsafe_requests_use_primary(self):
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = self.client_for(self.user).post(f'/api/courses/{self.course.slug}/enroll/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(replica.captured_queries, [])
+        self.assertTrue(self.user.enrollments.filter(course=self.course).exists())
+
+    def test_user_is_pinned_to_primary_after_a_write(self):
+        client = self.client_for(self.user)
+        self.assertEqual(self.listed(client), [])
+        client.post(f'/api/courses/{self.course.slug}/enroll/')
+
+        # Chính user vừa ghi đọc được dữ liệu mới, user khác vẫn đọc replica
+        self.assertEqual(self.listed(client), [self.course.slug])
+        self.assertEqual(client.get(f'/api/courses/{self.course.slug}/').status_code, 200)
+        self.assertEqual(self.listed(self.client_for(self.other)), [])
+
+        # Hết thời gian ghim -> quay lại replica
+        cache.clear()
+        self.assertEqual(self.listed(client), [])
+
+    @override_settings(DATABASE_REPLICA_STICKY_SECONDS=0)
+    def test_pinning_can_be_disabled(self):
+        client = self.client_for(self.user)
+        client.post(f'/api/courses/{self.course.slug}/enroll/')
+        self.assertEqual(self.listed(client), [])
+
+    def test_non_catalog_models_and_code_outside_requests_use_primary(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Course))
+        self.assertFalse(router.allow_migrate(REPLICA, 'courses'))
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = self.client_for(self.user).get('/api/me/progress/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replica.captured_queries, [])
+
+    def test_reads_inside_atomic_block_use_primary(self):
+        client = self.client_for()
+        with transaction.atomic():
+            self.assertEqual(self.listed(client), [self.course.slug])
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_disabled_without_replicas(self):
+        self.assertEqual(self.listed(self.client_for()), [self.course.slug])
@@ -4,6 +4,8 @@ from django.urls import include, path
 from django.conf.urls.static import static
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
 
+from .metrics import MetricsView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     
@@ -15,6 +17,10 @@ urlpatterns = [
     # API Endpoints
     path('api/', include('apps.courses.urls')),
     path('api/auth/', include('apps.users.urls')),
+    path('api/enrollments/', include('apps.enrollments.urls')),
+
+    # Monitoring (Prometheus, chỉ Admin)
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
 ]
 
 # Serve media files locally in development (if not using Cloudinary)
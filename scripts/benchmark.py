@@ -0,0 +1,205 @@
+"""Load benchmark for the main API endpoints against a running server.
+
+Drives the catalog list, course detail, lesson `complete`, `update-progress`
+and login endpoints at a configurable concurrency and reports p50/p95/p99
+latency and throughput per scenario, so changes can be compared before
+deploying. Uses only the standard library.
+
+Typical run (server started with DJANGO_DEBUG=True so HTTPS redirect is off):
+
+    python manage.py seed_data --courses 2000 --users 2000 --seed 42
+    python manage.py runserver --noreload
+    python scripts/benchmark.py --concurrency 16 --requests 500 --json before.json
+    ...apply a change, restart the server...
+    python scripts/benchmark.py --concurrency 16 --requests 500 --compare before.json
+
+Users created by `seed_data` share the password `benchmark123`.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+SCENARIOS = ('list', 'detail', 'complete', 'update_progress', 'login')
+
+
+class Client:
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.token = None
+
+    def request(self, method, path, body=None, auth=True):
+        """Return (status, parsed body or None, elapsed seconds)."""
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        request.add_header('Accept', 'application/json')
+        if data is not None:
+            request.add_header('Content-Type', 'application/json')
+        if auth and self.token:
+            request.add_header('Authorization', f'Bearer {self.token}')
+
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status, payload = response.status, response.read()
+        except urllib.error.HTTPError as exc:
+            status, payload = exc.code, exc.read()
+        elapsed = time.perf_counter() - started
+        try:
+            parsed = json.loads(payload) if payload else None
+        except ValueError:
+            parsed = None
+        return status, parsed, elapsed
+
+    def login(self, username, password):
+        status, data, _ = self.request('POST', '/api/auth/login/', {'username': username, 'password': password}, auth=False)
+        if status != 200:
+            sys.exit(f"Login failed for {username!r} (HTTP {status}): {data}")
+        self.token = data['access']
+
+
+def discover_targets(client):
+    """Pick a course the benchmark user is enrolled in and its lesson ids."""
+    status, data, _ = client.request('GET', '/api/me/progress/')
+    slugs = [course['slug'] for course in data or []] if status == 200 else []
+    if not slugs:
+        status, data, _ = client.request('GET', '/api/courses/?pagination=cursor&fields=slug&page_size=1')
+        if status != 200 or not data['results']:
+            sys.exit("No published course found. Run `python manage.py seed_data` first.")
+        slugs = [data['results'][0]['slug']]
+        client.request('POST', f'/api/courses/{slugs[0]}/enroll/')
+
+    status, detail, _ = client.request('GET', f'/api/courses/{slugs[0]}/')
+    if status != 200:
+        sys.exit(f"Could not load course {slugs[0]!r} (HTTP {status}).")
+    lesson_ids = [lesson['id'] for module in detail['modules'] for lesson in module['lessons']]
+    if not lesson_ids:
+        sys.exit(f"Course {slugs[0]!r} has no lessons.")
+    return slugs, lesson_ids
+
+
+def build_request(scenario, args, slugs, lesson_ids, rng):
+    """Return (method, path, body, auth) for one request of the scenario."""
+    if scenario == 'list':
+        return 'GET', '/api/courses/', None, True
+    if scenario == 'detail':
+        return 'GET', f'/api/courses/{rng.choice(slugs)}/', None, True
+    if scenario == 'complete':
+        return 'POST', f'/api/lessons/{rng.choice(lesson_ids)}/complete/', None, True
+    if scenario == 'update_progress':
+        return 'POST', f'/api/lessons/{rng.choice(lesson_ids)}/update-progress/', {'seconds': rng.randint(0, 1800)}, True
+    if scenario == 'login':
+        return 'POST', '/api/auth/login/', {'username': args.username, 'password': args.password}, False
+    raise ValueError(scenario)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_scenario(scenario, client, args, slugs, lesson_ids):
+    rng = random.Random(args.seed)
+    rng_lock = threading.Lock()
+    latencies = []
+    errors = 0
+
+    def one(_):
+        with rng_lock:
+            method, path, body, auth = build_request(scenario, args, slugs, lesson_ids, rng)
+        return client.request(method, path, body, auth=auth)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one, range(min(args.warmup, args.requests))))
+
+        started = time.perf_counter()
+        for status, _, elapsed in pool.map(one, range(args.requests)):
+            latencies.append(elapsed)
+            if status >= 400:
+                errors += 1
+        wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'scenario': scenario,
+        'requests': args.requests,
+        'errors': errors,
+        'throughput': args.requests / wall if wall else 0.0,
+        'mean_ms': sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+
+def print_report(results, baseline=None):
+    header = f"{'scenario':<17}{'reqs':>7}{'errors':>8}{'req/s':>9}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    print('-' * len(header))
+    for row in results:
+        print(
+            f"{row['scenario']:<17}{row['requests']:>7}{row['errors']:>8}{row['throughput']:>9.1f}"
+            f"{row['mean_ms']:>9.1f}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}"
+        )
+        before = (baseline or {}).get(row['scenario'])
+        if before:
+            def delta(key):
+                return (row[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            print(
+                f"{'  vs baseline':<32}{delta('throughput'):>+8.0f}%"
+                f"{delta('mean_ms'):>+8.0f}%{delta('p50_ms'):>+8.0f}%{delta('p95_ms'):>+8.0f}%{delta('p99_ms'):>+8.0f}%"
+            )
+    print("Latencies in ms.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario.')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per scenario.')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument('--username', default='hocvien-0')
+    parser.add_argument('--password', default='benchmark123')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--json', dest='json_path', help='Write results to this JSON file.')
+    parser.add_argument('--compare', help='JSON file from a previous run to compare against.')
+    args = parser.parse_args(argv)
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    client = Client(args.base_url, args.timeout)
+    client.login(args.username, args.password)
+    slugs, lesson_ids = discover_targets(client)
+    print(f"Target {args.base_url} as {args.username}: {len(slugs)} course(s), {len(lesson_ids)} lesson(s), "
+          f"concurrency {args.concurrency}\n")
+
+    results = [run_scenario(scenario, client, args, slugs, lesson_ids) for scenario in scenarios]
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = {row['scenario']: row for row in json.load(fh)['results']}
+    print_report(results, baseline)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as fh:
+            json.dump({'base_url': args.base_url, 'concurrency': args.concurrency, 'results': results}, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()